@@ -1,4 +1,4 @@
-from typing import Optional, Literal
+from typing import Optional, Literal, Annotated
 from pydantic import BaseModel, Field, field_serializer, ConfigDict
 from pydantic.networks import IPvAnyAddress
 
@@ -82,6 +82,10 @@ class Params(BaseModel):
         Field(2, examples=[2], ge=1, title='collection diversity parameter based on collection types',
               description='adds penalty to collections with the same type as other collections\n'
                           'if null, then no penalty will be added')
+    deadline_ms: Optional[int] = Field(None, ge=1, title='time budget of the request in milliseconds',
+                                       description='if the budget runs out, the suggestions generated so far '
+                                                   'are returned and the response is marked as partial\n'
+                                                   'if null, then the default budget for the request mode is used')
 
 
 class GroupedParams(BaseModel):
@@ -90,6 +94,10 @@ class GroupedParams(BaseModel):
                       pattern=r'^(instant|domain_detail|full)$',
                       description='for /grouped_by_category endpoint this field will be prefixed with "grouped_"')
     metadata: bool = Field(True, title='return all the metadata in response')
+    deadline_ms: Optional[int] = Field(None, ge=1, title='time budget of the request in milliseconds',
+                                       description='if the budget runs out, the suggestions generated so far '
+                                                   'are returned and the response is marked as partial\n'
+                                                   'if null, then the default budget for the request mode is used')
 
 
 class OtherCategoriesParams(BaseModel):
@@ -187,6 +195,27 @@ class LabelRequest(BaseModel):
                                      description='includes all the parameters for all nodes of the pipeline')
 
 
+class BatchLabelRequest(BaseModel):
+    labels: list[Annotated[str, Field(pattern='^[^.]*$')]] = \
+        Field(title='input labels', min_length=1, max_length=100, examples=[['zeus', 'apollo']],
+              description='* labels cannot contain dots (.)'
+                          '\n* identical labels are generated only once'
+                          '\n* results are returned in the order of the labels')
+    metadata: bool = Field(True, title='return all the metadata in response')
+    sorter: str = Field('weighted-sampling', title='sorter algorithm',
+                        pattern=r'^(round-robin|count|length|weighted-sampling)$')
+    min_suggestions: int = Field(100, title='minimal number of suggestions to generate for each label',
+                                 ge=1, le=generator.config.generation.limit)
+    max_suggestions: int = Field(100, title='maximal number of suggestions to generate for each label',
+                                 ge=1)
+    min_primary_fraction: float = Field(0.1, title='minimal fraction of primary labels',
+                                        ge=0.0, le=1.0,
+                                        description='ensures at least `min_suggestions * min_primary_fraction` '
+                                                    'primary labels will be generated for each label')
+    params: Optional[Params] = Field(None, title='pipeline parameters',
+                                     description='includes all the parameters for all nodes of the pipeline')
+
+
 class Suggestion(BaseModel):
     label: str = Field(title="suggested similar label")
     tokenized_label: list[str] = Field(title="suggested tokenization of label")
@@ -194,6 +223,13 @@ class Suggestion(BaseModel):
                                          description="if metadata=False this key is absent")
 
 
+class TracedSuggestions(BaseModel):
+    suggestions: list[Suggestion] = Field(title='generated suggestions')
+    trace: dict = Field(title='span tree of the request',
+                        description='the response of `/` has this form only if the request has '
+                                    'the `X-Debug-Trace: true` header')
+
+
 class GroupingCategory(BaseModel):
     suggestions: list[Suggestion] = Field(title='generated suggestions belonging to the same category type')
     name: str = Field(title='category\'s fancy name',
@@ -221,3 +257,24 @@ class GroupedSuggestions(BaseModel):
         description='list of suggestions grouped by category type'
     )
     all_tokenizations: list[list[str]] = Field(title='all inferred tokenizations of input label')
+    partial: bool = Field(False, title='whether the time budget of the request ran out',
+                          description='if true, the response contains only the suggestions generated '
+                                      'before the deadline')
+    trace: Optional[dict] = Field(None, title='span tree of the request',
+                                  description='returned only if the request has the `X-Debug-Trace: true` header')
+
+
+class LabelSuggestions(BaseModel):
+    label: str = Field(title='input label')
+    suggestions: list[Suggestion] = Field(title='suggestions generated for the label')
+    processing_time_ms: float = Field(title='time spent on generating suggestions for the label')
+    partial: bool = Field(False, title='whether the time budget of the request ran out '
+                                       'before the suggestions for the label were generated')
+
+
+class BatchSuggestions(BaseModel):
+    results: list[LabelSuggestions] = Field(title='suggestions for each of the input labels',
+                                            description='in the same order as the input labels')
+    processing_time_ms: float = Field(title='time spent on processing the whole batch')
+    trace: Optional[dict] = Field(None, title='span tree of the request',
+                                  description='returned only if the request has the `X-Debug-Trace: true` header')
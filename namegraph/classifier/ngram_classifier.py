@@ -16,16 +16,30 @@ class NGramClassifier(Classifier):
     def classify(self, name: InputName):
         normalized_name = name.strip_eth_namehash_unicode_replace_invalid_long_name
         # take normalized name and tokenize
-        tokenizations = self.tokenizer.tokenize(normalized_name)
+        tokenizations = [tokenization for tokenization in self.tokenizer.tokenize(normalized_name) if tokenization]
+        self._add_interpretations(name, tokenizations, self.ngrams.sequence_probabilities(tokenizations))
 
+    def classify_batch(self, names: list[InputName]):
+        """
+        Classifies the names like `classify`, tokenizing all the labels and scoring all their tokenizations
+        in one call of the tokenizer and of the n-grams.
+        """
+        normalized_names = [name.strip_eth_namehash_unicode_replace_invalid_long_name for name in names]
+        all_tokenizations = [[tokenization for tokenization in tokenizations if tokenization]
+                             for tokenizations in self.tokenizer.tokenize_batch(normalized_names)]
+        probabilities = iter(self.ngrams.sequence_probabilities(
+            [tokenization for tokenizations in all_tokenizations for tokenization in tokenizations]))
+        for name, tokenizations in zip(names, all_tokenizations):
+            self._add_interpretations(name, tokenizations, [next(probabilities) for _ in tokenizations])
+
+    def _add_interpretations(self, name: InputName, tokenizations: list[tuple[str, ...]],
+                             probabilities: list[float]):
         # asses probability
         interpretations = []
-        for tokenization in tokenizations:
-            if tokenization:
-                probability = self.ngrams.sequence_probability(tokenization)
-                probability = max(probability, 1e-20)  # TODO
-                interpretation = Interpretation(self.TYPE, self.LANG, tokenization, probability)
-                interpretations.append(interpretation)
+        for tokenization, probability in zip(tokenizations, probabilities):
+            probability = max(probability, 1e-20)  # TODO
+            interpretation = Interpretation(self.TYPE, self.LANG, tokenization, probability)
+            interpretations.append(interpretation)
 
         # calculate type prob
 
@@ -1,13 +1,18 @@
 import csv
+import hashlib
 import logging
+import threading
 from pathlib import Path
 from typing import Set, Dict, Optional
 
 from namegraph.filtering.subname_filter import SubnameFilter
 from namegraph.filtering.valid_name_filter import ValidNameFilter
 from namegraph.generated_name import GeneratedName
+from namegraph.namehash_common.pickle_cache import CACHE_DIR
 from namegraph.normalization.strip_eth_normalizer import strip_eth
 from namegraph.utils import Singleton
+from namegraph.utils.snapshot import lock_path as snapshot_lock_path
+from namegraph.utils.status_store import StatusStore, StatusMapping, NameSet, VERSION as STORE_VERSION
 
 logger = logging.getLogger('namegraph')
 
@@ -18,38 +23,129 @@ class Domains(metaclass=Singleton):
     AVAILABLE = 'available'
     RECENTLY_RELEASED = 'recently_released'
 
+    # status bytes of the names in the store
+    NO_STATUS = 0
+    STATUS_CODES = {TAKEN: 1, ON_SALE: 2, AVAILABLE: 3}
+    _TAKEN_BIT = 1 << STATUS_CODES[TAKEN]
+    _ON_SALE_BIT = 1 << STATUS_CODES[ON_SALE]
+
     def __init__(self, config):
         logger.debug('Initing Domains')
         self.config = config
         self.subname_filter = SubnameFilter(config)
         self.validname_filter = ValidNameFilter(config)
 
-        self.taken, self.on_sale, self.available = self.read_csv_domains(
-            Path(config.filtering.root_path) / config.app.domains)
-        self.taken: Dict[
-            str, float]  # = self.read_csv(Path(config.filtering.root_path) / config.filtering.domains)
-        self.on_sale: Dict[str, float]  # = self.read_csv_with_prices(config.app.secondary_market_names)
-        # self.advertised: Dict[str, float] = self.read_csv_with_prices(config.app.advertised_names)
-        self.internet: Set[str] = self.read_csv(config.app.internet_domains)
-
-        # for k in self.advertised:
-        #     self.secondary_market.pop(k, None)
-        # self.registered -= self.secondary_market.keys()
-        # self.registered -= self.advertised.keys()
-
-        self.internet -= self.taken.keys()
-        self.internet -= self.on_sale.keys()
-        # self.internet -= self.advertised.keys()
-
-        self.internet = set(
-            n for n in self.internet
+        self._reload_lock = threading.Lock()
+        self.snapshot = self.snapshot_path() if config.app.domains_snapshot else None
+        self._swap_store(self.load_store(self.snapshot))
+        logger.debug('Inited Domains')
+
+    def _swap_store(self, store: StatusStore) -> None:
+        # names set in the process are kept
+        added = {attr: getattr(self, attr).added if hasattr(self, attr) else {}
+                 for attr in ('taken', 'on_sale', 'available', 'only_available')}
+
+        self.store = store
+        on_change = self._update_status if self.config.app.domains_status_dict else None
+        self.taken = StatusMapping(store, self.STATUS_CODES[self.TAKEN], on_change=on_change)
+        self.on_sale = StatusMapping(store, self.STATUS_CODES[self.ON_SALE], on_change=on_change)
+        self.available = StatusMapping(store, self.STATUS_CODES[self.AVAILABLE])
+        # valid available names, which are not subnames
+        self.only_available = StatusMapping(store, self.STATUS_CODES[self.AVAILABLE], subset='only_available')
+        # valid internet names, which are neither taken nor on sale
+        self.internet = NameSet(store, subset='internet')
+
+        for attr, names in added.items():
+            getattr(self, attr).added = names
+
+        # opt-in: a dict of the (much fewer) registered names answers the status lookups several times faster
+        # than the store, but every worker holds its own copy (hundreds of MB for millions of names)
+        self._statuses: Optional[Dict[str, str]] = None
+        if not self.config.app.domains_status_dict:
+            return
+        statuses = dict.fromkeys(store.names(store.group(self.STATUS_CODES[self.TAKEN])), self.TAKEN)
+        statuses.update(dict.fromkeys(self.taken.added, self.TAKEN))
+        statuses.update(dict.fromkeys(store.names(store.group(self.STATUS_CODES[self.ON_SALE])), self.ON_SALE))
+        statuses.update(dict.fromkeys(self.on_sale.added, self.ON_SALE))
+        self._statuses = statuses
+
+    def _update_status(self, name: str) -> None:
+        if name in self.on_sale:
+            self._statuses[name] = self.ON_SALE
+        elif name in self.taken:
+            self._statuses[name] = self.TAKEN
+        else:
+            self._statuses.pop(name, None)
+
+    def reload(self) -> bool:
+        """
+        Reads the domains files again into a new store, built next to the current one, and swaps it in.
+        Requests running meanwhile keep using the current store. Returns whether the files changed.
+        """
+        with self._reload_lock:
+            self.subname_filter = SubnameFilter(self.config)
+
+            snapshot = self.snapshot_path() if self.config.app.domains_snapshot else None
+            if snapshot is not None and snapshot == self.snapshot:
+                return False
+
+            store = self.load_store(snapshot)
+            previous, self.snapshot = self.snapshot, snapshot
+            self._swap_store(store)
+            logger.info(f'Reloaded domains: {len(self.taken)} taken, {len(self.on_sale)} on sale, '
+                        f'{len(self.available)} available')
+
+            if previous is not None:
+                # the processes still mapping the previous snapshot keep it until they reload
+                previous.unlink(missing_ok=True)
+                snapshot_lock_path(previous).unlink(missing_ok=True)
+            return True
+
+    def snapshot_path(self) -> Path:
+        """
+        The path of the compiled snapshot, named by the hash of the content of the files it is built from.
+        """
+        digest = hashlib.md5(f'{STORE_VERSION}'.encode())
+        for path in (Path(self.config.filtering.root_path) / self.config.app.domains,
+                     Path(self.config.app.internet_domains),
+                     Path(self.config.filtering.root_path) / self.config.filtering.subnames):
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+        return CACHE_DIR / f'domains-{digest.hexdigest()}.bin'
+
+    def load_store(self, snapshot: Optional[Path]) -> StatusStore:
+        """
+        Maps the snapshot (building it first if needed) or, without a snapshot, builds the store in memory.
+        """
+        if snapshot is None:
+            return StatusStore(self.build_store())
+        if not snapshot.exists():
+            logger.info(f'Building domains snapshot {snapshot}')
+        return StatusStore.load_or_build(snapshot, self.build_store)
+
+    def build_store(self) -> bytes:
+        taken, on_sale, available = self.read_csv_domains(
+            Path(self.config.filtering.root_path) / self.config.app.domains)
+        internet: Set[str] = self.read_csv(self.config.app.internet_domains)
+
+        internet -= taken.keys()
+        internet -= on_sale.keys()
+
+        entries = [(name, self.STATUS_CODES[status], sort_score)
+                   for status, names_scores in ((self.TAKEN, taken), (self.ON_SALE, on_sale), (self.AVAILABLE, available))
+                   for name, sort_score in names_scores.items()]
+        entries.extend((name, self.NO_STATUS, 0.0) for name in internet if name not in available)
+
+        only_available = [
+            (n, self.STATUS_CODES[self.AVAILABLE]) for n in available
             if self.validname_filter.filter_name(n) and self.subname_filter.filter_name(n)
-        )
-        self.only_available = {
-            n: v for n, v in self.available.items()
+        ]
+        internet = [
+            (n, self.STATUS_CODES[self.AVAILABLE] if n in available else self.NO_STATUS) for n in internet
             if self.validname_filter.filter_name(n) and self.subname_filter.filter_name(n)
-        }
-        logger.debug('Inited Domains')
+        ]
+        return StatusStore.build(entries, {'only_available': only_available, 'internet': internet})
 
     def read_csv(self, path: str) -> Set[str]:
         domains: Set[str] = set()
@@ -95,12 +191,20 @@ class Domains(metaclass=Singleton):
         return taken, on_sale, available
 
     def get_name_status(self, name: str) -> str:
-        if name in self.on_sale:
+        if self._statuses is not None:
+            return self._statuses.get(name, self.AVAILABLE)
+
+        if name in self.on_sale.added:
             return self.ON_SALE
-        elif name in self.taken:
+        if name in self.taken.added:
             return self.TAKEN
-        else:
-            return self.AVAILABLE
+
+        statuses = self.store.status_mask(name)
+        if statuses & self._ON_SALE_BIT:
+            return self.ON_SALE
+        if statuses & self._TAKEN_BIT:
+            return self.TAKEN
+        return self.AVAILABLE
 
     def get_sort_score(self, name: GeneratedName) -> Optional[float]:
         if name.status is None:
@@ -0,0 +1,123 @@
+import fcntl
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Optional
+
+logger = logging.getLogger('namegraph')
+
+
+class DomainsRefresher:
+    """
+    Reloads the domain statuses in the background when the domains file changes (`app.domains_reload`),
+    optionally downloading the file first. Every worker process runs its own refresher, but only one of them,
+    holding the lock next to the file, downloads it; the others reload when they see the file changed.
+    """
+
+    def __init__(self, generator):
+        self.generator = generator
+        self.config = generator.config
+        self.interval: float = self.config.app.domains_reload.interval
+        self.download_enabled: bool = self.config.app.domains_reload.download
+        self.path = Path(self.config.filtering.root_path) / self.config.app.domains
+        self.last_report: Optional[dict[str, Any]] = None
+
+        self._signature = self._file_signature()
+        self._lock_file = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _file_signature(self) -> Optional[tuple[int, int]]:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _file_digest(path) -> Optional[str]:
+        try:
+            with open(path, 'rb') as f:
+                digest = hashlib.md5()
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+                return digest.hexdigest()
+        except FileNotFoundError:
+            return None
+
+    def is_downloader(self) -> bool:
+        """
+        Whether this process downloads the file. The first process taking the lock keeps it while it runs,
+        so when it exits another one takes over.
+        """
+        if self._lock_file is None:
+            lock_file = open(self.path.with_name(self.path.name + '.lock'), 'w')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                return False
+            self._lock_file = lock_file
+        return True
+
+    def download(self) -> bool:
+        """
+        Downloads the domains file next to the current one and, if the content differs, renames it over,
+        so it is never read partially. An unchanged file is not touched, so the workers do not reload it.
+        Returns whether the file changed.
+        """
+        from namegraph.download_from_s3 import S3Downloader
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name, suffix='.tmp')
+        os.close(fd)
+        try:
+            S3Downloader().download_file(self.config.app.primary_url, tmp_path, override=True)
+            if self._file_digest(tmp_path) == self._file_digest(self.path):
+                return False
+            os.replace(tmp_path, self.path)
+            return True
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def check(self) -> Optional[dict[str, Any]]:
+        """
+        Reloads the domains if the file changed since the last check. Returns the report of the reload or `None`.
+        """
+        if self.download_enabled and self.is_downloader():
+            self.download()
+
+        signature = self._file_signature()
+        if signature is None or signature == self._signature:
+            return None
+
+        report = self.generator.reload_domains()
+        self._signature = signature
+        self.last_report = report
+        return report
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception('Reloading domains failed, serving the previous statuses')
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='domains-refresher', daemon=True)
+        self._thread.start()
+        logger.info(f'Checking {self.path} for changes every {self.interval}s')
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
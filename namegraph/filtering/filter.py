@@ -1,6 +1,9 @@
+from time import perf_counter
 from typing import List, Iterable, Any, Optional
 
 from namegraph.generated_name import GeneratedName
+from namegraph.utils.metrics import FILTER_SECONDS, SUGGESTIONS_FILTERED
+from namegraph.utils.tracing import current_span
 
 
 class Filter:
@@ -13,14 +16,30 @@ class Filter:
             tokenized_names: List[GeneratedName]
     ) -> List[GeneratedName]:
 
-        result = (tokenized_name for tokenized_name in tokenized_names if self.filter_name(str(tokenized_name)))
-        
-        def gen(result):
-            for name in result:
-                name.append_strategy_point(self.__class__.__name__)
-                yield name
-
-        return gen(result)
+        # the filters are applied lazily, so the span of the pipeline is captured when the chain is built
+        trace = current_span()
+
+        def gen(tokenized_names):
+            filter_name = self.__class__.__name__
+            elapsed = 0.0
+            filtered = 0
+            try:
+                for tokenized_name in tokenized_names:
+                    start = perf_counter()
+                    keep = self.filter_name(str(tokenized_name))
+                    elapsed += perf_counter() - start
+                    if keep:
+                        tokenized_name.append_strategy_point(filter_name)
+                        yield tokenized_name
+                    else:
+                        filtered += 1
+            finally:
+                FILTER_SECONDS.observe(elapsed, filter=filter_name)
+                SUGGESTIONS_FILTERED.inc(filtered, filter=filter_name)
+                if trace is not None:
+                    trace.aggregate('filter', filter=filter_name).add(elapsed)
+
+        return gen(tokenized_names)
 
     # todo add params argument here and for all filters when needed
     def filter_name(self, name: str) -> bool:
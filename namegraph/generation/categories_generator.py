@@ -58,6 +58,9 @@ class CategoriesGenerator(NameGenerator):
     Replace tokens using categories. Faster, single token version.
     """
 
+    cacheable = False  # random start index drawn from the per-request rng
+    uses_request_rng = True
+
     def __init__(self, config):
         super().__init__(config)
         self.categories = Categories(config)
@@ -38,6 +38,8 @@ class CollectionGenerator(NameGenerator):
     Searches for the collection given the entry name, and then yields other names from the collections
     """
 
+    cacheable = False  # depends on request params and Elasticsearch
+
     def __init__(self, config):
         super().__init__(config)
         self.collection_matcher = CollectionMatcherForGenerator(config)
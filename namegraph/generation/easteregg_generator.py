@@ -11,6 +11,9 @@ class EasterEggGenerator(NameGenerator):
     Return an EasterEgg message.
     """
 
+    cacheable = False  # messages shuffled with the per-request rng
+    uses_request_rng = True
+
     def __init__(self, config):
         super().__init__(config)
         self.messages = [
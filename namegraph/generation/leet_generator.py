@@ -5,6 +5,7 @@ import math
 
 from .name_generator import NameGenerator
 from ..input_name import InputName, Interpretation
+from ..thread_utils import get_deadline
 
 
 def get_replacement_combinations(replacements: dict[str, list[tuple[float, str]]]) -> Iterable[
@@ -72,8 +73,11 @@ class LeetGenerator(NameGenerator):
                                                              k in sequence_replaceables}
 
         # for all subsets of substitutions, make an alphabet
+        deadline = get_deadline()
         alphabets: list[tuple[float, dict[str, str], dict[str, str]]] = []
         for letter_map in get_replacement_combinations(letter_subs):
+            if deadline.expired():
+                break
             for sequence_map in get_replacement_combinations(sequence_subs):
                 if all(src == tgt for src, (_, tgt) in letter_map.items()) and all(
                         src == tgt for src, (_, tgt) in sequence_map.items()):
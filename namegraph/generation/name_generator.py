@@ -17,6 +17,14 @@ class NameGenerator:
     responsible for registering the applied generators.
     """
 
+    # whether the output depends only on the arguments returned by `prepare_arguments` (and thus on `hash`),
+    # so it can be shared between requests; generators using the random generators, request params
+    # or external services are not cacheable
+    cacheable = True
+    # whether the output is drawn from the per-request random generators (thread-local), so it has to be generated
+    # in the thread of the request, e.g. it is not warmed up in the background
+    uses_request_rng = False
+
     def __init__(self, config: DictConfig):
         self.config = config
         self.limit = config.generation.generator_limits.get(self.__class__.__name__, config.generation.limit)
@@ -40,6 +48,13 @@ class NameGenerator:
     def hash(self, name: InputName, interpretation: Interpretation):
         return str(self.prepare_arguments(name, interpretation))
 
+    def reload_domains(self) -> None:
+        """
+        Rebuilds the structures derived from `Domains` after its statuses were reloaded. The new structures must be
+        swapped in with a single assignment, so that the running requests see either the old or the new ones.
+        """
+        pass
+
     def _init_grouping_category(self):
         for category_type, gen_list in dictconfig_to_dict(self.config.generation.grouping_categories).items():
             if self.__class__.__name__ in list(gen_list):
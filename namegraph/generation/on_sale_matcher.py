@@ -1,11 +1,10 @@
 import collections
 from typing import List, Tuple, Iterable, Dict, Any, Iterator
 
-import wordninja
-
 from .name_generator import NameGenerator
 from ..domains import Domains
 from ..input_name import Interpretation, InputName
+from ..tokenization.wordninja_tokenizer import WordNinjaModel
 from ..utils import sort_by_value_under_key
 
 
@@ -17,21 +16,29 @@ class OnSaleMatchGenerator(NameGenerator):
     def __init__(self, config):
         super().__init__(config)
         self.domains = Domains(config)
-        self.tokenizer = wordninja.LanguageModel(config.tokenization.wordninja_dictionary)
+        self.tokenizer = WordNinjaModel(config)
+        self.index = self._build_index()
+
+    def _build_index(self) -> dict[str, dict[tuple[str, tuple[str, ...]], None]]:
         # index names
-        self.index = collections.defaultdict(dict)
-        for name in self.domains.on_sale:
-            tokenized = tuple(self.tokenizer.split(name))
+        index = collections.defaultdict(dict)
+        names = list(self.domains.on_sale)
+        for name, tokenized in zip(names, self.tokenizer.split_batch(names, cache=False)):
             for token in tokenized:
-                self.index[token][(name, tokenized)] = None
+                index[token][(name, tokenized)] = None
+        return dict(index)
+
+    def reload_domains(self) -> None:
+        self.index = self._build_index()
 
     def generate(self, tokens: Tuple[str, ...]) -> Iterator[Tuple[str, ...]]:
         if len(''.join(tokens)) == 0:
             return []
 
+        index = self.index
         result = []
         for token in tokens:
-            result.extend(self.index[token].keys())
+            result.extend(index.get(token, {}).keys())
         return (item[1] for item in sort_by_value_under_key(result, self.domains.on_sale, sort_key=0, reverse=True))
 
     def generate2(self, name: InputName, interpretation: Interpretation) -> Iterator[Tuple[str, ...]]:
@@ -20,6 +20,9 @@ class PersonNameGenerator(NameGenerator):
     Person name generator that uses affixes.
     """
 
+    cacheable = False  # affixes sampled with the per-request rng
+    uses_request_rng = True
+
     def __init__(self, config):
         super().__init__(config)
         self.affixes = json.load(open(config.generation.person_name_affixes_path))
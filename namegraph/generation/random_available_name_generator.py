@@ -25,29 +25,50 @@ class RandomAvailableNameGenerator(NameGenerator):
     Sample only available random names.
     """
 
+    cacheable = False  # names sampled with the per-request rng
+    uses_request_rng = True
+
     def __init__(self, config):
         super().__init__(config)
         self.domains = Domains(config)
+        self._sampling = self._build_sampling()
 
+    def _build_sampling(self) -> tuple[tuple[str, ...], list[float], list[float]]:
         if len(self.domains.only_available) < self.limit:
             logger.warning('the number of available (primary) domains for RandomAvailableNameGenerator is smaller than '
                            'the generation limit')
 
-        self.names, probabilities = list(zip(*self.domains.only_available.items()))
+        names, probabilities = list(zip(*self.domains.only_available.items()))
         # greatest value is 4.0, so that probability of sampling custom name is 20 times higher: exp(4) ~= 20 * exp(1)
         probabilities = np.clip(probabilities, 0.0, 4.0)
 
-        self.probabilities: list[float] = _softmax(probabilities).tolist()
-        self.accumulated_probabilities = list(accumulate(self.probabilities))
+        probabilities: list[float] = _softmax(probabilities).tolist()
+        return names, probabilities, list(accumulate(probabilities))
+
+    def reload_domains(self) -> None:
+        self._sampling = self._build_sampling()
+
+    @property
+    def names(self) -> tuple[str, ...]:
+        return self._sampling[0]
+
+    @property
+    def probabilities(self) -> list[float]:
+        return self._sampling[1]
+
+    @property
+    def accumulated_probabilities(self) -> list[float]:
+        return self._sampling[2]
 
     def generate(self, limit=None) -> List[Tuple[str, ...]]:
         if limit is None:
             limit = self.limit
         limit = min(limit * 2, self.limit)
-        if len(self.domains.only_available) >= limit:
-            result = get_random_rng().choices(self.names, cum_weights=self.accumulated_probabilities, k=limit)
+        names, _, accumulated_probabilities = self._sampling
+        if len(names) >= limit:
+            result = get_random_rng().choices(names, cum_weights=accumulated_probabilities, k=limit)
         else:
-            result = self.names
+            result = names
         return ((x,) for x in result)
 
     def generate2(self, name: InputName, interpretation: Interpretation) -> List[Tuple[str, ...]]:
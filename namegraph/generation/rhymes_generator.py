@@ -13,6 +13,9 @@ class RhymesGenerator(NameGenerator):
     Yields names rhyming with the name.
     """
 
+    cacheable = False  # rhymes shuffled with the per-request rng
+    uses_request_rng = True
+
     def __init__(self, config):
         super().__init__(config)
         with open(config.generation.suffix2rhymes_path, 'r', encoding='utf-8') as f:
@@ -1,10 +1,18 @@
+from array import array
 from operator import itemgetter
-from typing import List, Tuple, Iterable, Dict, Any, Iterator
-from itertools import islice, cycle
+from pathlib import Path
+from typing import List, Tuple, Iterable, Dict, Any, Iterator, Optional
+from itertools import chain, islice, cycle
 import hashlib
+import logging
 import re
 import os
+import shutil
 
+from namegraph.namehash_common.pickle_cache import CACHE_DIR
+from namegraph.utils.snapshot import lock_path as snapshot_lock_path
+from namegraph.utils.suffix_array import SuffixArray, VERSION as SUFFIX_ARRAY_VERSION
+from namegraph.utils.top_matches import TopMatches, VERSION as TOP_MATCHES_VERSION
 from namegraph.utils.unisuffixtree import UniSuffixTree, HAS_SUFFIX_TREE
 
 from .name_generator import NameGenerator
@@ -12,9 +20,14 @@ from ..domains import Domains
 from ..input_name import Interpretation, InputName
 from ..utils import sort_by_value
 
+logger = logging.getLogger('namegraph')
+
 CACHE_TREE_PATH = 'data/cache/substringmatchgenerator_tree.bin_'
 CACHE_TREE_HASH_PATH = 'data/cache/substringmatchgenerator_tree_hash.txt_'
 
+# patterns this short are contained in most of the names, scanning the names in the score order finds enough fastest
+SHORT_PATTERN_LENGTH = 1
+
 
 class ReImpl:
     def __init__(self, config):
@@ -22,11 +35,140 @@ class ReImpl:
         lines = sort_by_value(self.domains.taken.keys(), self.domains.taken, reverse=True)
         self.data = '\n' + '\n'.join(lines) + '\n'
 
+    @classmethod
+    def from_names(cls, names: List[str]) -> 'ReImpl':
+        impl = cls.__new__(cls)
+        impl.data = '\n' + '\n'.join(names) + '\n'
+        return impl
+
     def find(self, pattern: str) -> Iterable[str]:
         # strip \n from match
         return (name.group()[1:] for name in re.finditer(f'\n.*{re.escape(pattern)}.*', self.data))
 
 
+class TrigramImpl:
+    """
+    Inverted index of the trigrams of the taken names. The posting lists hold the indices of the names sorted
+    by the score, so the matches are found in the score order and the search stops as soon as enough are taken.
+    """
+
+    N = 3
+
+    def __init__(self, config):
+        self.domains = Domains(config)
+        self.names = sort_by_value(self.domains.taken.keys(), self.domains.taken, reverse=True)
+
+        postings: dict[str, array] = {}
+        for index, name in enumerate(self.names):
+            for trigram in {name[i:i + self.N] for i in range(len(name) - self.N + 1)}:
+                try:
+                    postings[trigram].append(index)
+                except KeyError:
+                    postings[trigram] = array('i', [index])
+
+        # all the posting lists in one array, the trigrams are mapped to their ranges
+        self.postings = array('i')
+        self.ranges: Dict[str, Tuple[int, int]] = {}
+        for trigram, indices in postings.items():
+            self.ranges[trigram] = (len(self.postings), len(self.postings) + len(indices))
+            self.postings.extend(indices)
+        self._postings = memoryview(self.postings)
+        # short patterns match many names, they are found by scanning the names in the score order
+        self.short_impl = ReImpl.from_names(self.names)
+
+    def find(self, pattern: str) -> Iterable[str]:
+        names = self.names
+        if len(pattern) < self.N:
+            return self.short_impl.find(pattern)
+
+        ranges = []
+        for i in range(len(pattern) - self.N + 1):
+            trigram_range = self.ranges.get(pattern[i:i + self.N])
+            if trigram_range is None:
+                return iter(())
+            ranges.append(trigram_range)
+
+        # the names containing the pattern are the intersection of the posting lists of all its trigrams,
+        # checking the pattern on the shortest list gives it directly (trigrams may not be adjacent in a name)
+        start, end = min(ranges, key=lambda r: r[1] - r[0])
+        return (names[index] for index in self._postings[start:end] if pattern in names[index])
+
+
+class SuffixArrayImpl:
+    """
+    Suffix array over the taken names sorted by the score, memory-mapped from `data/cache`, with the first matches
+    of the short and frequent patterns precomputed. Both are built next to the domains snapshot (named after it)
+    when missing, or in memory if the domains snapshot is disabled.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.domains = Domains(config)
+        self.path = self.cache_path()
+        if self.path is None:
+            self.suffix_array = SuffixArray.build(self.names())
+        else:
+            if not self.path.exists():
+                logger.info(f'Building suffix array {self.path}')
+            self.suffix_array = SuffixArray.load_or_build(self.path, self.names)
+
+        self.top_matches = None
+        self.top_matches_path = None
+        if config.generation.substring_match_top_matches.k > 0:
+            self.top_matches_path = self.top_matches_cache_path()
+            if self.top_matches_path is None:
+                self.top_matches = self.build_top_matches()
+            else:
+                if not self.top_matches_path.exists():
+                    logger.info(f'Building top matches {self.top_matches_path}')
+                self.top_matches = TopMatches.load_or_build(self.top_matches_path, self.build_top_matches)
+
+    def cache_path(self) -> Optional[Path]:
+        if self.domains.snapshot is None:
+            return None
+        return CACHE_DIR / f'substrings-{SUFFIX_ARRAY_VERSION}-{self.domains.snapshot.stem}'
+
+    def top_matches_cache_path(self) -> Optional[Path]:
+        if self.domains.snapshot is None:
+            return None
+        params = self.config.generation.substring_match_top_matches
+        digest = hashlib.md5(f'{params.k} {params.max_length}\n'.encode('utf-8'))
+        for pattern in self.frequent_patterns():
+            digest.update(f'{pattern}\n'.encode('utf-8'))
+        return CACHE_DIR / f'top-matches-{TOP_MATCHES_VERSION}-{self.domains.snapshot.stem}-{digest.hexdigest()[:12]}'
+
+    def names(self) -> List[str]:
+        return sort_by_value(self.domains.taken.keys(), self.domains.taken, reverse=True)
+
+    def frequent_patterns(self) -> List[str]:
+        params = self.config.generation.substring_match_top_matches
+        if params.frequent_patterns is None:
+            return []
+        with open(params.frequent_patterns, encoding='utf-8') as f:
+            return [line.strip() for line in islice(f, params.max_frequent_patterns) if line.strip()]
+
+    def build_top_matches(self) -> TopMatches:
+        params = self.config.generation.substring_match_top_matches
+        return TopMatches.build(self.suffix_array, params.k, params.max_length, self.frequent_patterns())
+
+    def remove_stale(self, current) -> None:
+        # the processes still mapping the files keep them until they reload
+        for path, current_path in ((self.path, getattr(current, 'path', None)),
+                                   (self.top_matches_path, getattr(current, 'top_matches_path', None))):
+            if path is not None and path != current_path:
+                shutil.rmtree(path, ignore_errors=True)
+                snapshot_lock_path(path).unlink(missing_ok=True)
+
+    def find(self, pattern: str) -> Iterable[str]:
+        if self.top_matches is not None and (indices := self.top_matches.get(pattern)) is not None:
+            # the rest is found only if more than the precomputed matches are taken
+            return chain((self.suffix_array.name(index) for index in indices),
+                         islice(self.suffix_array.find(pattern), self.top_matches.k, None))
+        if len(pattern) <= SHORT_PATTERN_LENGTH:
+            return self.suffix_array.scan(pattern)
+        return self.suffix_array.find(pattern)
+
+
 class SuffixTreeImpl:
     def __init__(self, config):
         self.domains = Domains(config)
@@ -54,8 +196,11 @@ class SuffixTreeImpl:
             self.tree = UniSuffixTree()
             # this is quite slow (over 2s)
             self.tree.deserialize(cache_tree_path)
+        self.short_impl = ReImpl.from_names(self.lines)
 
     def find(self, pattern: str) -> Iterable[str]:
+        if len(pattern) <= SHORT_PATTERN_LENGTH:
+            return self.short_impl.find(pattern)
         inds = self.tree.findStringIdx(pattern)
         return (self.lines[i] for i in inds)
 
@@ -76,23 +221,35 @@ def roundrobin(*iterables):
 
 
 class SubstringMatchGenerator(NameGenerator):
+    ENGINES = {
+        'suffix_array': SuffixArrayImpl,
+        'trigram': TrigramImpl,
+        'suffix_tree': SuffixTreeImpl,
+    }
+
     def __init__(self, config):
         super().__init__(config)
         self.domains = Domains(config)
-        self.short_heuristic = 1
-        self.suffix_tree_impl = SuffixTreeImpl(config) if HAS_SUFFIX_TREE else None
-        self.re_impl = ReImpl(config)
+        self.impl = self._create_impl()
+
+    def _create_impl(self):
+        engine = self.config.generation.substring_match_engine
+        if engine == 'suffix_tree' and not HAS_SUFFIX_TREE:
+            logger.warning('suffixtree is not installed, SubstringMatchGenerator uses the suffix array')
+            engine = 'suffix_array'
+        return self.ENGINES[engine](self.config)
+
+    def reload_domains(self) -> None:
+        previous, self.impl = self.impl, self._create_impl()
+        if isinstance(previous, SuffixArrayImpl):
+            previous.remove_stale(self.impl)
 
     def generate(self, tokens: Tuple[str, ...]) -> Iterator[Tuple[str, ...]]:
         if len(''.join(tokens)) == 0:
             return []
 
         pattern = ''.join(tokens)
-
-        if len(pattern) <= self.short_heuristic or self.suffix_tree_impl is None:
-            names = self.re_impl.find(pattern)
-        else:
-            names = self.suffix_tree_impl.find(pattern)
+        names = self.impl.find(pattern)
 
         # self.limit=100 #TODO set to request's max_suggestions
         # return single tokens
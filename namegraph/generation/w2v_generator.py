@@ -12,6 +12,7 @@ from .combination_limiter import CombinationLimiter, prod
 
 from .name_generator import NameGenerator
 from ..input_name import InputName, Interpretation
+from ..thread_utils import get_deadline
 
 logger = logging.getLogger('namegraph')
 
@@ -54,8 +55,11 @@ class W2VGenerator(NameGenerator):
 
         tokens_synsets = self.combination_limiter.limit(tokens_synsets)
 
+        deadline = get_deadline()
         result = []
-        for synset_tuple in itertools.product(*tokens_synsets):
+        for i, synset_tuple in enumerate(itertools.product(*tokens_synsets)):
+            if i % 1024 == 0 and deadline.expired():
+                break
             tokens = [t[0] for t in synset_tuple]
             distances = [t[1] for t in synset_tuple] #TODO speed up?
             result.append((tokens, prod(distances)))
@@ -114,8 +118,11 @@ class W2VGeneratorRocks(NameGenerator):
 
         tokens_synsets = self.combination_limiter.limit(tokens_synsets)
 
+        deadline = get_deadline()
         result = []
-        for synset_tuple in itertools.product(*tokens_synsets):
+        for i, synset_tuple in enumerate(itertools.product(*tokens_synsets)):
+            if i % 1024 == 0 and deadline.expired():
+                break
             tokens = [t[0] for t in synset_tuple]
             distances = [t[1] for t in synset_tuple] #TODO speed up?
             result.append((tokens, prod(distances)))
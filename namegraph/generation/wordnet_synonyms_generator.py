@@ -1,7 +1,6 @@
 import logging
 from operator import itemgetter
 
-from nltk.corpus import wordnet as wn
 from typing import List, Dict, Tuple, Any
 import itertools
 import collections
@@ -9,6 +8,7 @@ import collections
 from .combination_limiter import CombinationLimiter, prod
 from .name_generator import NameGenerator
 from ..input_name import InputName, Interpretation
+from ..wordnet_lemmas import WordnetLemmas
 
 logger = logging.getLogger('namegraph')
 
@@ -20,7 +20,7 @@ class WordnetSynonymsGenerator(NameGenerator):
 
     def __init__(self, config):
         super().__init__(config)
-        wn.synsets('dog')  # init wordnet
+        self.wordnet = WordnetLemmas(config)
         self.combination_limiter = CombinationLimiter(self.limit)
 
     def generate(self, tokens: Tuple[str, ...]) -> List[Tuple[str, ...]]:
@@ -46,15 +46,7 @@ class WordnetSynonymsGenerator(NameGenerator):
         return result
 
     def _get_lemmas_for_word(self, word: str) -> Dict[str, int]:
-        synsets = wn.synsets(word)
-        lemmas = []
-        for synset in synsets:
-            lemmas.extend([str(lemma.name()) for lemma in synset.lemmas()])
-        lemmas = [l for l in lemmas if '_' not in l]
-
-        stats = collections.defaultdict(int)
-        for l in lemmas:
-            stats[l] += 1
+        stats = collections.defaultdict(int, self.wordnet.lemma_counts(word))
 
         # keep the original token in the output
         stats[word] += 1
@@ -1,6 +1,9 @@
 import collections
+import copy
 from typing import Optional
 
+from namegraph.thread_utils import Deadline
+
 
 class Interpretation:
     def __init__(self, type: str, lang: str, tokenization, in_type_probability: float, features: Optional[dict] = None):
@@ -10,6 +13,10 @@ class Interpretation:
         self.in_type_probability = in_type_probability
         self.features = features or {}
 
+    def copy(self) -> 'Interpretation':
+        return Interpretation(self.type, self.lang, self.tokenization, self.in_type_probability,
+                              copy.deepcopy(self.features))
+
     def __str__(self):
         return f'Interpretation(type={self.type}, lang={self.lang}, tokenization={self.tokenization}'
 
@@ -21,9 +28,10 @@ class InputName:
     Stores everything related to one request.
     """
 
-    def __init__(self, input_name, params):
+    def __init__(self, input_name, params, deadline: Optional[Deadline] = None):
         self.input_name = input_name
         self.params = params
+        self.deadline = deadline if deadline is not None else Deadline()
 
         self.types_probabilities: dict[tuple[str, str], float] = {}
         self.interpretations: dict[tuple[str, str], list[Interpretation]] = {}
@@ -1,4 +1,6 @@
+import collections
 import logging
+from time import perf_counter
 from typing import Type, Callable
 from ens_normalize import is_ens_normalized
 
@@ -8,8 +10,16 @@ from namegraph.pipeline import Pipeline
 from namegraph.sampling import WeightedSorterWithOrder
 from namegraph.sampling.round_robin_sampler import RoundRobinSampler
 from namegraph.sampling.sampler import Sampler
-from namegraph.input_name import InputName
-from namegraph.thread_utils import init_seed_for_thread, get_random_rng
+from namegraph.input_name import InputName, Interpretation
+from namegraph.thread_utils import init_seed_for_thread, get_random_rng, deadline_for_thread
+from namegraph.thread_utils import BoundedExecutor, ExecutorSaturated
+from namegraph.utils.metrics import (
+    SAMPLING_SECONDS,
+    SUGGESTIONS_DEDUPLICATED,
+    SUGGESTIONS_NOT_ENS_NORMALIZED,
+    SUGGESTIONS_SAMPLED,
+)
+from namegraph.utils.tracing import current_span, span
 
 
 logger = logging.getLogger('namegraph')
@@ -56,10 +66,11 @@ class MetaSampler:
             case _:
                 raise ValueError(f'{sampler} is unavailable')
 
-    def __init__(self, config, pipelines: list[Pipeline]):
+    def __init__(self, config, pipelines: list[Pipeline], warmup_executor: BoundedExecutor | None = None):
         self.config = config
         self.domains = Domains(config)
         self.pipelines = pipelines
+        self.warmup_executor = warmup_executor if config.warmup.enabled else None
 
     def get_global_limits(self, mode: str, min_suggestions: int, category_limits: bool = False) -> dict[str, int]:
         """
@@ -80,6 +91,28 @@ class MetaSampler:
             global_limits[pipeline.pipeline_name] = limit
         return global_limits
 
+    def warm_up(
+            self,
+            name: InputName,
+            sorters: dict[Interpretation, Sampler],
+            global_limits: dict[str, int]
+    ) -> None:
+        """
+        Start generation of the first pipelines of the first pass of every interpretation in the background,
+        so that the slow generators (e.g. querying Elasticsearch or RocksDB) run in parallel with the sampling.
+        Only the generators not drawing from the per-request random generators (`uses_request_rng`)
+        are warmed up, so the sampled suggestions are the same as without the warm-up.
+        """
+        for interpretation, sorter in sorters.items():
+            for pipeline in getattr(sorter, 'first_pass', [])[:self.config.warmup.pipelines]:
+                if global_limits[pipeline.pipeline_name] == 0 or pipeline.generator.uses_request_rng:
+                    continue
+                try:
+                    pipeline.apply(name, interpretation).prefetch(self.warmup_executor, self.config.warmup.prefetch)
+                except ExecutorSaturated:
+                    logger.debug('Warm-up executor is saturated, skipping warm-up')
+                    return
+
     def sample(
             self,
             name: InputName,
@@ -89,6 +122,28 @@ class MetaSampler:
             min_available_fraction: float,
             category_endpoint: bool = False,
             is_already_sampled: Callable[[str], bool] = lambda x: False,
+    ) -> list[GeneratedName]:
+        """
+        Sample suggestions from the pipelines. If the deadline of the request expires,
+        the suggestions sampled so far are returned.
+        """
+        start = perf_counter()
+        with deadline_for_thread(name.deadline), span('sample', sorter=sorter_name):
+            # the generators may run in this thread
+            suggestions = self._sample(name, sorter_name, min_suggestions, max_suggestions, min_available_fraction,
+                                       category_endpoint, is_already_sampled)
+        SAMPLING_SECONDS.observe(perf_counter() - start, sorter=sorter_name)
+        return suggestions
+
+    def _sample(
+            self,
+            name: InputName,
+            sorter_name: str,
+            min_suggestions: int,
+            max_suggestions: int,
+            min_available_fraction: float,
+            category_endpoint: bool,
+            is_already_sampled: Callable[[str], bool],
     ) -> list[GeneratedName]:
         min_available_required = int(min_suggestions * min_available_fraction)
 
@@ -119,6 +174,9 @@ class MetaSampler:
                 sorters[interpretation] \
                     = self.get_sampler(sorter_name)(self.config, self.pipelines, weights)
 
+        if self.warmup_executor is not None:
+            self.warm_up(name, sorters, global_limits)
+
         available_added = 0
 
         all_suggestions = []
@@ -127,10 +185,29 @@ class MetaSampler:
 
         rng = get_random_rng()
 
+        # the iterations are traced only if the request is traced, summed per pipeline and interpretation
+        sample_span = current_span()
+        iteration_start = 0.0
+
+        def record_iteration():
+            sample_span.aggregate('iteration', pipeline=sampled_pipeline.pipeline_name,
+                                  interpretation=Pipeline._describe(sampled_interpretation)) \
+                .add(perf_counter() - iteration_start)
+
+        # metrics are updated once at the end, not for every suggestion
+        duplicates = 0
+        already_sampled = 0
+        not_normalized = collections.Counter()
+        sampled = collections.Counter()
+
         while True:
             if len(all_suggestions) >= max_suggestions or not types_lang_weights:
                 break
 
+            if name.deadline.expired():
+                logger.info(f'Deadline exceeded, returning {len(all_suggestions)} suggestions')
+                break
+
             # sample interpretation
             sampled_type_lang = rng.choices(
                 list(types_lang_weights.keys()),
@@ -147,10 +224,12 @@ class MetaSampler:
             while True:
                 try:
                     slots_left = max_suggestions - len(all_suggestions)
-                    if slots_left <= 0:
+                    if slots_left <= 0 or name.deadline.expired():
                         break
 
                     # sample and run pipeline
+                    if sample_span is not None:
+                        iteration_start = perf_counter()
                     sampled_pipeline = next(sorters[sampled_interpretation])
                     logger.debug(f'sampled_pipeline {sampled_pipeline.pipeline_name}')
 
@@ -174,6 +253,7 @@ class MetaSampler:
                             while str(suggestion) in all_suggestions_str or str(suggestion) == joined_input_name \
                                     or (suggestion.status != Domains.AVAILABLE
                                         and available_added + slots_left <= min_available_required):
+                                duplicates += str(suggestion) in all_suggestions_str
                                 logger.debug(
                                     f'suggestion is duplicated or the same as input (or unavailable): {suggestion}')
                                 suggestion = next(suggestions)
@@ -181,6 +261,7 @@ class MetaSampler:
                                     f'Pipeline: {sampled_pipeline.pipeline_name} sampled suggestion: {suggestion}')
                                 suggestion.status = self.domains.get_name_status(str(suggestion))
                             if not is_ens_normalized(str(suggestion)):
+                                not_normalized[sampled_pipeline.pipeline_name] += 1
                                 # log suggestions which are not ens normalized
                                 logger.warning(f"suggestion not ens-normalized: '{str(suggestion)}'; "
                                                f"metadata: {suggestion.dict()}")
@@ -189,6 +270,7 @@ class MetaSampler:
                                     f'Pipeline: {sampled_pipeline.pipeline_name} sampled suggestion: {suggestion}')
                                 suggestion.status = self.domains.get_name_status(str(suggestion))
                             elif is_already_sampled(str(suggestion)):
+                                already_sampled += 1
                                 logger.debug(
                                     f'suggestion is already sampled (in another sampler): {suggestion}')
                                 suggestion = next(suggestions)
@@ -202,6 +284,8 @@ class MetaSampler:
                         # and proceed to sample another non-empty pipeline
                         logger.debug(f'pipeline {sampled_pipeline.pipeline_name} is empty')
                         sorters[sampled_interpretation].pipeline_used(sampled_pipeline)
+                        if sample_span is not None:
+                            record_iteration()
                         continue
 
                     # on the other hand, if the suggestion is alright, then we add it to the list
@@ -211,8 +295,11 @@ class MetaSampler:
 
                     all_suggestions.append(suggestion)
                     all_suggestions_str.add(str(suggestion))
+                    sampled[sampled_pipeline.pipeline_name] += 1
                     if global_limits[sampled_pipeline.pipeline_name] is not None:
                         global_limits[sampled_pipeline.pipeline_name] -= 1
+                    if sample_span is not None:
+                        record_iteration()
                     break
 
                 except StopIteration:
@@ -224,4 +311,11 @@ class MetaSampler:
                         del types_lang_weights[sampled_type_lang]
                     break
 
+        SUGGESTIONS_DEDUPLICATED.inc(duplicates, reason='duplicate')
+        SUGGESTIONS_DEDUPLICATED.inc(already_sampled, reason='already_sampled')
+        for pipeline_name, count in not_normalized.items():
+            SUGGESTIONS_NOT_ENS_NORMALIZED.inc(count, pipeline=pipeline_name)
+        for pipeline_name, count in sampled.items():
+            SUGGESTIONS_SAMPLED.inc(count, pipeline=pipeline_name)
+
         return all_suggestions
@@ -1,5 +1,6 @@
 '''
-Executes all functions registered with pickled_property, generating cache.
+Executes all functions registered with pickled_property and builds the domains snapshot, the substring index,
+the WordNet lemma store and the n-gram model, generating cache.
 For each function, creates an instance of the function's class
 trying a default constructor first, then using the production config.
 '''
@@ -13,7 +14,11 @@ import namegraph.xgenerator
 import namegraph.namehash_common.ngrams
 
 import namegraph.namehash_common.pickle_cache as pickle_cache
+from namegraph.domains import Domains
+from namegraph.generation.substringmatch_generator import SuffixArrayImpl
+from namegraph.namehash_common.ngrams import Ngrams
 from namegraph.namehash_common.paths import PROJECT_ROOT
+from namegraph.wordnet_lemmas import WordnetLemmas
 
 
 if __name__ == '__main__':
@@ -35,3 +40,15 @@ if __name__ == '__main__':
             except TypeError:
                 # pass config
                 exec(f'{module}.{class_name}(config).{func_name}')
+
+        print('Generating domains snapshot')
+        Domains(config)
+
+        print('Generating substring index')
+        SuffixArrayImpl(config)
+
+        print('Generating WordNet lemma store')
+        WordnetLemmas(config)
+
+        print('Generating n-gram model')
+        Ngrams(config).model
@@ -1,11 +1,25 @@
 import csv
+import logging
 import math
+from array import array
+from functools import cached_property
 from typing import Optional
 
-from .pickle_cache import pickled_property
+import numpy as np
+
+from .pickle_cache import CACHE_DIR, _hash_deps
 from .utils import ln
+from ..utils.ngram_store import NgramStore, bigram_key, VERSION as STORE_VERSION
+from ..utils.snapshot import EMPTY
+
+logger = logging.getLogger('namegraph')
 
 ALPHA = 0.4
+# the bigrams of the sequences scored together are searched with numpy from that many
+BATCH_SEARCH_MIN_BIGRAMS = 64
+
+# keys of the config the compiled model is built from
+DEPENDENCIES = ('ngrams.unigrams', 'ngrams.bigrams', 'ngrams.custom_dictionary', 'ngrams.custom_token_frequency')
 
 
 def explode_gaps(words: list[str]) -> list[str]:
@@ -19,14 +33,18 @@ def explode_gaps(words: list[str]) -> list[str]:
 
 
 class Ngrams:
-    """Word probability of unigrams and bigrams."""
+    """
+    Word probability of unigrams and bigrams.
+    Served from a compiled model (`data/cache`): the words of the unigrams and bigrams with int ids, their counts
+    (-1 for the words only in the bigrams) and log probabilities, and the bigrams with their counts
+    and log probabilities. The words out of the model are scored on the fly.
+    """
 
     def __init__(self, config):
         self.config = config
 
         if not config.ngrams.lazy_loading:
-            self._unigrams_and_count
-            self._bigrams_and_count
+            self.model
 
     def _load_string_and_count(self, path: str) -> tuple[dict[str, int], int]:
         data: dict[str, int] = {}
@@ -41,8 +59,7 @@ class Ngrams:
                 data[word] = count
         return data, all_count
 
-    @pickled_property('ngrams.unigrams', 'ngrams.custom_dictionary', 'ngrams.custom_token_frequency')
-    def _unigrams_and_count(self) -> tuple[dict[str, int], int]:
+    def _load_unigrams_and_count(self) -> tuple[dict[str, int], int]:
         data, all_count = self._load_string_and_count(self.config.ngrams.unigrams)
         with open(self.config.ngrams.custom_dictionary) as f:
             for line in f:
@@ -50,31 +67,89 @@ class Ngrams:
                 if word not in data: data[word] = self.config.ngrams.custom_token_frequency
         return data, all_count
 
-    @pickled_property('ngrams.bigrams')
-    def _bigrams_and_count(self) -> tuple[dict[str, int], int]:
+    def _load_bigrams_and_count(self) -> tuple[dict[str, int], int]:
         return self._load_string_and_count(self.config.ngrams.bigrams)
 
-    @property
-    def unigrams(self) -> dict[str, int]:
-        return self._unigrams_and_count[0]
-
-    @property
-    def bigrams(self) -> dict[str, int]:
-        return self._bigrams_and_count[0]
+    @cached_property
+    def model(self) -> NgramStore:
+        path = CACHE_DIR / f'ngrams-{STORE_VERSION}-{_hash_deps(self.config, DEPENDENCIES)}.bin'
+        if not path.exists():
+            logger.info(f'Building n-gram model {path}')
+        model = NgramStore.load_or_build(path, self._build_model)
+        self._unigram_counts = model.word_columns['count']
+        self._word_log_probabilities = model.word_columns['log_probability']
+        self._backoff_log_probabilities = model.word_columns['backoff_log_probability']
+        self._bigram_counts = model.bigram_columns['count']
+        self._bigram_log_probabilities = model.bigram_columns['log_probability']
+        return model
+
+    def _build_model(self) -> bytes:
+        unigrams, all_unigrams_count = self._load_unigrams_and_count()
+        bigrams, all_bigrams_count = self._load_bigrams_and_count()
+
+        ids = {word: index for index, word in enumerate(unigrams)}
+        bigram_ids = []
+        bigram_counts = array('q')
+        for bigram, count in bigrams.items():
+            # the bigrams are looked up as f'{word1} {word2}', so a bigram with more spaces matches every split
+            for position, char in enumerate(bigram):
+                if char != ' ':
+                    continue
+                pair = []
+                for word in (bigram[:position], bigram[position + 1:]):
+                    if word not in ids:
+                        ids[word] = len(ids)
+                    pair.append(ids[word])
+                bigram_ids.append(tuple(pair))
+                bigram_counts.append(count)
+        words = list(ids)
+
+        def unigram_count(word: str) -> int:
+            return unigrams.get(word, self.oov_count(word))
+
+        def word_probability(word: str) -> float:
+            return unigram_count(word) / all_unigrams_count
+
+        word_counts = array('q', (unigrams.get(word, -1) for word in words))
+        word_log_probabilities = array('d', (ln(word_probability(word)) for word in words))
+        backoff_log_probabilities = array('d', (ln(ALPHA * word_probability(word)) for word in words))
+        bigram_log_probabilities = array('d', (ln(count / unigram_count(words[id1]))
+                                               for (id1, _), count in zip(bigram_ids, bigram_counts)))
+
+        return NgramStore.build(
+            words,
+            {'count': word_counts, 'log_probability': word_log_probabilities,
+             'backoff_log_probability': backoff_log_probabilities},
+            bigram_ids,
+            {'count': bigram_counts, 'log_probability': bigram_log_probabilities},
+            metadata={'all_unigrams_count': all_unigrams_count, 'all_bigrams_count': all_bigrams_count},
+        )
 
     @property
     def all_unigrams_count(self) -> int:
-        return self._unigrams_and_count[1]
+        return self.model.metadata['all_unigrams_count']
 
     @property
     def all_bigrams_count(self) -> int:
-        return self._bigrams_and_count[1]
+        return self.model.metadata['all_bigrams_count']
+
+    def _unigram_count(self, index: int, word: str) -> int:
+        if index != EMPTY and (count := self._unigram_counts[index]) >= 0:
+            return count
+        return self.oov_count(word)
 
     def unigram_count(self, word: str) -> int:
-        return self.unigrams.get(word, self.oov_count(word))
+        return self._unigram_count(self.model.find(word), word)
 
     def bigram_count(self, word: str) -> Optional[int]:
-        return self.bigrams.get(word, None)
+        model = self.model
+        for position, char in enumerate(word):
+            if char != ' ':
+                continue
+            id1, id2 = model.find(word[:position]), model.find(word[position + 1:])
+            if id1 != EMPTY and id2 != EMPTY and (index := model.find_bigram(id1, id2)) != EMPTY:
+                return self._bigram_counts[index]
+        return None
 
     def oov_count(self, word: str) -> int:
         return (1 / 100) ** (len(word))
@@ -83,17 +158,74 @@ class Ngrams:
         return self.unigram_count(word) / self.all_unigrams_count
 
     def bigram_probability(self, word1: str, word2: str) -> float:
-        bigram = f'{word1} {word2}'
-        bigram_count = self.bigram_count(bigram)
-        if bigram_count is not None:
-            return bigram_count / self.unigram_count(word1)
+        model = self.model
+        id1, id2 = model.find(word1), model.find(word2)
+        if id1 != EMPTY and id2 != EMPTY and (index := model.find_bigram(id1, id2)) != EMPTY:
+            return self._bigram_counts[index] / self._unigram_count(id1, word1)
         return ALPHA * self.word_probability(word2)
 
+    def _word_log_probability(self, index: int, word: str) -> float:
+        if index != EMPTY:
+            return self._word_log_probabilities[index]
+        return ln(self.word_probability(word))
+
+    def _backoff_log_probability(self, index: int, word: str) -> float:
+        if index != EMPTY:
+            return self._backoff_log_probabilities[index]
+        return ln(ALPHA * self.word_probability(word))
+
     def sequence_log_probability(self, words: list[str]) -> float:
+        model = self.model
         words = explode_gaps(words)
-        probs = [ln(self.word_probability(words[0]))] \
-                + [ln(self.bigram_probability(word1, word2)) for word1, word2 in zip(words, words[1:])]
+        ids = [model.find(word) for word in words]
+        probs = [self._word_log_probability(ids[0], words[0])]
+        for id1, id2, word2 in zip(ids, ids[1:], words[1:]):
+            index = model.find_bigram(id1, id2) if id1 != EMPTY and id2 != EMPTY else EMPTY
+            probs.append(self._bigram_log_probabilities[index] if index != EMPTY
+                         else self._backoff_log_probability(id2, word2))
         return sum(probs)
 
+    def sequence_log_probabilities(self, sequences: list[list[str]]) -> list[float]:
+        """
+        Log probabilities of the sequences (e.g. all the tokenizations of a name), scored together: every word
+        is looked up once and all the bigrams in one search of the model.
+        """
+        model = self.model
+        sequences = [explode_gaps(words) for words in sequences]
+        ids = {}
+        for words in sequences:
+            for word in words:
+                if word not in ids:
+                    ids[word] = model.find(word)
+
+        pairs = {}
+        for words in sequences:
+            for word1, word2 in zip(words, words[1:]):
+                id1, id2 = ids[word1], ids[word2]
+                if id1 != EMPTY and id2 != EMPTY:
+                    pairs.setdefault(bigram_key(id1, id2), None)
+        if len(pairs) < BATCH_SEARCH_MIN_BIGRAMS:
+            indices = [model.find_bigram(key >> 32, key & 0xFFFFFFFF) for key in pairs]
+        else:
+            indices = model.find_bigrams(np.fromiter(pairs, dtype=np.int64, count=len(pairs))).tolist()
+        log_probabilities = self._bigram_log_probabilities
+        for key, index in zip(pairs, indices):
+            pairs[key] = log_probabilities[index] if index != EMPTY else None
+
+        result = []
+        for words in sequences:
+            probs = [self._word_log_probability(ids[words[0]], words[0])]
+            for word1, word2 in zip(words, words[1:]):
+                id1, id2 = ids[word1], ids[word2]
+                log_probability = pairs[bigram_key(id1, id2)] if id1 != EMPTY and id2 != EMPTY else None
+                if log_probability is None:
+                    log_probability = self._backoff_log_probability(id2, word2)
+                probs.append(log_probability)
+            result.append(sum(probs))
+        return result
+
     def sequence_probability(self, words: list[str]) -> float:
         return math.exp(self.sequence_log_probability(words))
+
+    def sequence_probabilities(self, sequences: list[list[str]]) -> list[float]:
+        return [math.exp(log_probability) for log_probability in self.sequence_log_probabilities(sequences)]
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from itertools import islice
+from typing import Iterator, NamedTuple
+import copy
+import hashlib
+import logging
+import sys
+
+from omegaconf import DictConfig, OmegaConf
+
+from namegraph.generated_name import GeneratedName
+from namegraph.generation.name_generator import NameGenerator
+from namegraph.input_name import InputName, Interpretation
+from namegraph.utils import LRUCache, Singleton
+
+logger = logging.getLogger('namegraph')
+
+
+class CachedOutput(NamedTuple):
+    suggestions: tuple[GeneratedName, ...]
+    complete: bool
+    nbytes: int
+
+
+def estimate_size(suggestion: GeneratedName) -> int:
+    """
+    Rough estimate of the memory held by a cached suggestion.
+    """
+    return sys.getsizeof(suggestion) \
+        + sys.getsizeof(suggestion.tokens) + sum(sys.getsizeof(token) for token in suggestion.tokens) \
+        + sys.getsizeof(suggestion.applied_strategies) \
+        + sum(sys.getsizeof(strategy) for strategy in suggestion.applied_strategies)
+
+
+class GeneratorOutputCache(metaclass=Singleton):
+    """
+    Raw outputs of the generators shared between requests, keyed by the generator class and `NameGenerator.hash`.
+
+    Generators are consumed lazily, so only the prefix of an output consumed so far is stored. If a request
+    needs more suggestions than the cached prefix holds, the generator is run again and fast-forwarded
+    past the prefix. Only generators marked as `cacheable` are cached, so that the generators drawing
+    from the per-request random generators stay deterministic.
+    """
+
+    # a prefix is stored after that many suggestions are consumed and then every time its length doubles
+    MIN_PREFIX_LENGTH = 8
+
+    def __init__(self, config: DictConfig):
+        self.cache = LRUCache(maxsize=config.caches.generator_outputs.maxsize,
+                              maxbytes=config.caches.generator_outputs.maxbytes)
+
+    @staticmethod
+    def config_hash(config: DictConfig) -> str:
+        """
+        Generators built from different configs (e.g. with different data files) must not share outputs.
+        """
+        return hashlib.md5(OmegaConf.to_yaml(config).encode('utf-8')).hexdigest()
+
+    def apply(
+            self,
+            generator: NameGenerator,
+            name: InputName,
+            interpretation: Interpretation | None,
+            hash: str,
+            config_hash: str
+    ) -> Iterator[GeneratedName]:
+        if not generator.cacheable or self.cache.maxsize <= 0:
+            return iter(generator.apply(name, interpretation))
+        key = (generator.__class__.__name__, config_hash, hash)
+        return self._apply_cached(key, generator, name, interpretation)
+
+    def _apply_cached(
+            self,
+            key: tuple[str, str, str],
+            generator: NameGenerator,
+            name: InputName,
+            interpretation: Interpretation | None
+    ) -> Iterator[GeneratedName]:
+        cached: CachedOutput | None = self.cache.get(key)
+        if cached is not None:
+            logger.debug(f'Generator output cache hit: {key} ({len(cached.suggestions)} suggestions)')
+            for suggestion in cached.suggestions:
+                yield copy.deepcopy(suggestion)
+            if cached.complete:
+                return
+
+        recorded = list(cached.suggestions) if cached is not None else []
+        nbytes = cached.nbytes if cached is not None else 0
+        next_store = max(self.MIN_PREFIX_LENGTH, 2 * len(recorded))
+
+        for suggestion in islice(generator.apply(name, interpretation), len(recorded), None):
+            # copy before the filters modify the suggestion
+            recorded.append(copy.deepcopy(suggestion))
+            nbytes += estimate_size(suggestion)
+            yield suggestion
+
+            # the generators may cut their output short when the deadline of the request expires
+            if name.deadline.exceeded:
+                return
+
+            if len(recorded) >= next_store:
+                self.cache.put(key, CachedOutput(tuple(recorded), False, nbytes), nbytes=nbytes)
+                next_store *= 2
+
+        if not name.deadline.exceeded:
+            self.cache.put(key, CachedOutput(tuple(recorded), True, nbytes), nbytes=nbytes)
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self) -> dict:
+        per_generator = defaultdict(lambda: {'entries': 0, 'nbytes': 0})
+        for (generator_name, _, _), nbytes in self.cache.items_nbytes():
+            per_generator[generator_name]['entries'] += 1
+            per_generator[generator_name]['nbytes'] += nbytes
+        return {**self.cache.stats(), 'generators': dict(per_generator)}
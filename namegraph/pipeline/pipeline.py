@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 import time
-from typing import List
+from time import perf_counter
+from typing import List, Iterable, Iterator
 import logging
 import re
 
@@ -9,7 +10,9 @@ from omegaconf import DictConfig
 from omegaconf.errors import ConfigAttributeError
 
 from namegraph.pipeline.pipeline_results_iterator import PipelineResultsIterator
+from namegraph.pipeline.generator_output_cache import GeneratorOutputCache
 from namegraph.input_name import Interpretation, InputName
+from namegraph.thread_utils import until_deadline
 
 from namegraph.controlflow import *
 from namegraph.generation import *
@@ -26,6 +29,9 @@ from namegraph.generation.name_generator import NameGenerator
 from namegraph.filtering.filter import Filter
 
 from namegraph.utils import aggregate_duplicates
+from namegraph.utils.metrics import PIPELINE_SECONDS, SUGGESTIONS_PRODUCED
+from namegraph.utils.tracing import Span, current_span, span_for_thread
+from namegraph.generated_name import GeneratedName
 
 logger = logging.getLogger('namegraph')
 
@@ -67,6 +73,8 @@ class Pipeline:
         self.controlflow: List[ControlFlow] = []
         self.generators: List[NameGenerator] = []
         self.filters: List[Filter] = []
+        self.output_cache = GeneratorOutputCache(config)
+        self.config_hash = GeneratorOutputCache.config_hash(config)
 
         logger.info(f'Pipeline {self.pipeline_name} initing.')
         self._build()
@@ -101,12 +109,22 @@ class Pipeline:
                 else:
                     logger.debug(f'Pipeline {self.pipeline_name} suggestions generation on N {name.input_name}.')
                 start_time = time.time()
-                suggestions = self.generator.apply(name, interpretation)
+                suggestions = self.output_cache.apply(self.generator, name, interpretation, hash,
+                                                      self.config_hash)
+                suggestions = until_deadline(suggestions, name.deadline)
+                suggestions = self._count_produced(suggestions)
                 generator_time = 1000 * (time.time() - start_time)
                 logger.info(f'Pipeline {self.pipeline_name} suggestions generated. Time: {generator_time:.2f}')
 
-                for filter_ in self.filters:
-                    suggestions = filter_.apply(suggestions)
+                # all the applications of the pipeline to the interpretation are summed in one span
+                trace = current_span()
+                pipeline_span = trace.aggregate(
+                    'pipeline', pipeline=self.pipeline_name, generator=self.generator.__class__.__name__,
+                    interpretation=self._describe(interpretation)) if trace is not None else None
+
+                with span_for_thread(pipeline_span):  # filters record their spans under the pipeline
+                    for filter_ in self.filters:
+                        suggestions = filter_.apply(suggestions)
                 # remove input name from suggestions
                 input_word = re.sub(r'\.\w+$', '', name.strip_eth_namehash).replace(' ', '')  # TODO niewiadomo jaki jest input
                 suggestions = (s for s in suggestions if str(s) != input_word)
@@ -115,15 +133,29 @@ class Pipeline:
 
                 # TODO: add metadata about types and interpretation
                 def gen(suggestions):
-                    for s in suggestions:
-                        s.pipeline_name = self.pipeline_name
-                        s.interpretation = (
-                            interpretation.type if interpretation else None,
-                            interpretation.lang if interpretation else None,
-                            hash)  # TODO because of caching interpretation's type and lang might be wrong
-                        yield s
+                    # the suggestions are generated lazily, so the time is summed over all the iterations
+                    elapsed = 0.0
+                    start = perf_counter()
+                    try:
+                        for s in suggestions:
+                            s.pipeline_name = self.pipeline_name
+                            s.interpretation = (
+                                interpretation.type if interpretation else None,
+                                interpretation.lang if interpretation else None,
+                                hash)  # TODO because of caching interpretation's type and lang might be wrong
+                            elapsed += perf_counter() - start
+                            yield s
+                            start = perf_counter()
+                        elapsed += perf_counter() - start
+                    finally:
+                        PIPELINE_SECONDS.observe(elapsed, pipeline=self.pipeline_name,
+                                                 generator=self.generator.__class__.__name__)
+                        if pipeline_span is not None:
+                            pipeline_span.add(elapsed)
 
                 suggestions = gen(suggestions)
+                if pipeline_span is not None:
+                    suggestions = self._traced(suggestions, pipeline_span)
 
             else:
                 suggestions = []
@@ -131,6 +163,36 @@ class Pipeline:
             logger.debug(f'Pipeline {self.pipeline_name} suggestions cached.')
         return name.pipelines_cache[self.pipeline_name][hash]
 
+    @staticmethod
+    def _describe(interpretation: Interpretation | None) -> str:
+        if interpretation is None:
+            return 'none'
+        return f'{interpretation.type}/{interpretation.lang}/{" ".join(interpretation.tokenization)}'
+
+    @staticmethod
+    def _traced(suggestions: Iterator[GeneratedName], pipeline_span: Span) -> Iterator[GeneratedName]:
+        """
+        Records the spans of the lazily running generator (e.g. Elasticsearch queries) under the pipeline span,
+        whichever thread or sampler iterates over the suggestions.
+        """
+        while True:
+            with span_for_thread(pipeline_span):
+                try:
+                    suggestion = next(suggestions)
+                except StopIteration:
+                    return
+            yield suggestion
+
+    def _count_produced(self, suggestions: Iterable[GeneratedName]) -> Iterator[GeneratedName]:
+        produced = 0
+        try:
+            for suggestion in suggestions:
+                produced += 1
+                yield suggestion
+        finally:
+            SUGGESTIONS_PRODUCED.inc(produced, pipeline=self.pipeline_name,
+                                     generator=self.generator.__class__.__name__)
+
     def _build(self):
         # make control flow optional
         for controlflow_class in getattr(self.definition, 'controlflow', []):
@@ -1,4 +1,11 @@
+from __future__ import annotations
+
+from collections import deque
+from itertools import islice
+import concurrent.futures
+
 from namegraph.generated_name import GeneratedName
+from namegraph.thread_utils import BoundedExecutor, propagate_deadline
 
 
 class PipelineResultsIterator:
@@ -9,8 +16,42 @@ class PipelineResultsIterator:
     def __init__(self, suggestions: list[GeneratedName]):
         self.suggestions = iter(suggestions)
 
+        self.started = False
+        self.prefetched: deque[GeneratedName] = deque()
+        self.prefetch_future: concurrent.futures.Future | None = None
+        self.prefetch_error: Exception | None = None
+
     def __iter__(self):
         return self
 
+    def prefetch(self, executor: BoundedExecutor, n: int) -> None:
+        """
+        Start generating the first `n` suggestions in the background. The suggestions are returned
+        in the same order as without prefetching, `next` waits for the prefetching to finish.
+        May raise `ExecutorSaturated`.
+        """
+        if self.started:
+            return
+        self.prefetch_future = executor.submit(propagate_deadline(self._prefetch), n)
+        self.started = True
+
+    def _prefetch(self, n: int) -> None:
+        try:
+            self.prefetched.extend(islice(self.suggestions, n))
+        except Exception as e:
+            # raised after the suggestions generated before the error are returned
+            self.prefetch_error = e
+
     def __next__(self) -> GeneratedName:
+        self.started = True
+        if self.prefetch_future is not None:
+            self.prefetch_future.result()
+            self.prefetch_future = None
+
+        if self.prefetched:
+            return self.prefetched.popleft()
+        if self.prefetch_error is not None:
+            error, self.prefetch_error = self.prefetch_error, None
+            self.suggestions = iter(())
+            raise error
         return next(self.suggestions)
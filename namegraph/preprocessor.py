@@ -9,14 +9,46 @@ from namegraph.normalization import (
     QuotesNormalizer
 )
 from namegraph.input_name import InputName, Interpretation
+from namegraph.utils import LRUCache
+from namegraph.utils.cache import freeze
+from namegraph.utils.metrics import PREPROCESSING_CACHE_LOOKUPS
+from namegraph.utils.tracing import span
+
+from typing import NamedTuple
 
 from omegaconf import DictConfig
 
 
+class PreprocessedName(NamedTuple):
+    """
+    Outcome of the preprocessing of a label shared between requests: the values of `Preprocessor.NORMALIZED_ATTRIBUTES`,
+    the types probabilities and the interpretations (never handed out, only copied).
+    """
+    normalized: tuple
+    types_probabilities: tuple[tuple[tuple[str, str], float], ...]
+    interpretations: tuple[tuple[tuple[str, str], tuple[Interpretation, ...]], ...]
+
+
 class Preprocessor:
     """
     Perform few normalizations of input name, classify and tokenize input name. Return interpretations.
+    The outcome is cached per label, see `restore` and `store`.
     """
+    # request parameters read by the normalizers and the classifiers, they are a part of the cache key
+    CLASSIFICATION_PARAMS: tuple[str, ...] = ()
+    # attributes of the input name set by `normalize`
+    NORMALIZED_ATTRIBUTES = (
+        'is_pretokenized',
+        'strip_quotes_name',
+        'strip_eth_namehash',
+        'strip_eth_namehash_unicode',
+        'strip_eth_namehash_unicode_replace_invalid',
+        'strip_eth_namehash_unicode_replace_invalid_long_name',
+        'strip_eth_namehash_unicode_long_name',
+        'strip_eth_namehash_long_name',
+        'pretokenization',
+    )
+
     def __init__(self, config: DictConfig) -> None:
         self.strip_eth_normalizer = StripEthNormalizer(config)
         self.namehash_normalizer = NamehashNormalizer(config)
@@ -28,6 +60,8 @@ class Preprocessor:
         self.ngram_classifier = NGramClassifier(config)
         self.person_name_classifier = PersonNameClassifier(config)
 
+        self.cache = LRUCache(maxsize=config.caches.preprocessing.maxsize)
+
     def normalize(self, name: InputName) -> None:
         if name.input_name.strip().startswith('"') and name.input_name.strip().endswith('"'):
             name.is_pretokenized = True
@@ -53,8 +87,23 @@ class Preprocessor:
 
     def classify(self, name: InputName) -> None:
         if name.strip_eth_namehash:
-            self.ngram_classifier.classify(name)
-            self.person_name_classifier.classify(name)
+            with span('ngram_classifier'):
+                self.ngram_classifier.classify(name)
+            with span('person_name_classifier'):
+                self.person_name_classifier.classify(name)
+            self.add_other_type(name)
+
+    def classify_batch(self, names: list[InputName]) -> None:
+        """
+        Classifies the names like `classify`, but the n-gram classifier tokenizes and scores all the labels in one pass.
+        """
+        names = [name for name in names if name.strip_eth_namehash]
+        with span('ngram_classifier'):
+            self.ngram_classifier.classify_batch(names)
+        with span('person_name_classifier'):
+            for name in names:
+                self.person_name_classifier.classify(name)
+        for name in names:
             self.add_other_type(name)
 
     def add_other_type(self, name: InputName) -> None:
@@ -68,6 +117,43 @@ class Preprocessor:
         )  # TODO none?
         name.add_interpretation(interpretation)
 
+    def cache_key(self, name: InputName) -> tuple:
+        params = name.params or {}
+        return name.input_name, freeze({param: params.get(param) for param in self.CLASSIFICATION_PARAMS})
+
+    def restore(self, name: InputName) -> bool:
+        """
+        Sets the cached preprocessing outcome of the label on the input name. Returns whether it was cached.
+        """
+        preprocessed: PreprocessedName | None = self.cache.get(self.cache_key(name))
+        PREPROCESSING_CACHE_LOOKUPS.inc(result='hit' if preprocessed is not None else 'miss')
+        if preprocessed is None:
+            return False
+
+        for attribute, value in zip(self.NORMALIZED_ATTRIBUTES, preprocessed.normalized):
+            setattr(name, attribute, value)
+        name.types_probabilities = dict(preprocessed.types_probabilities)
+        name.interpretations = {type_lang: [interpretation.copy() for interpretation in interpretations]
+                                for type_lang, interpretations in preprocessed.interpretations}
+        return True
+
+    def store(self, name: InputName) -> None:
+        """
+        Caches the preprocessing outcome of the input name, unless the deadline of the request expired,
+        because the tokenizers of the classifiers may have cut their output short.
+        """
+        if name.deadline.exceeded:
+            return
+        self.cache.put(self.cache_key(name), PreprocessedName(
+            tuple(getattr(name, attribute) for attribute in self.NORMALIZED_ATTRIBUTES),
+            tuple(name.types_probabilities.items()),
+            tuple((type_lang, tuple(interpretation.copy() for interpretation in interpretations))
+                  for type_lang, interpretations in name.interpretations.items()),
+        ))
+
     def do(self, name: InputName) -> None:
+        if self.restore(name):
+            return
         self.normalize(name)
         self.classify(name)
+        self.store(name)
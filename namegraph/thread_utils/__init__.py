@@ -1,2 +1,4 @@
 from .thread_locals import thread_locals, init_seed_for_thread
 from .thread_random import get_random_rng, get_numpy_rng
+from .executors import BoundedExecutor, ExecutorSaturated
+from .deadline import Deadline, get_deadline, deadline_for_thread, propagate_deadline, until_deadline
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
+import logging
+import time
+
+from .thread_locals import thread_locals
+
+
+logger = logging.getLogger('namegraph')
+
+T = TypeVar('T')
+
+
+class Deadline:
+    """
+    Time budget of one request. Every component checking the deadline records that it has run out,
+    so that the request can mark its (partial) result.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        """
+        :param timeout: budget in seconds, counted from now; `None` means no deadline
+        """
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout if timeout is not None else None
+        self.exceeded = False
+
+    def remaining(self) -> Optional[float]:
+        """
+        Returns the remaining time in seconds (never negative) or `None` if there is no deadline.
+        """
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        if self.expires_at is None:
+            return False
+        if not self.exceeded and time.monotonic() >= self.expires_at:
+            logger.warning(f'Deadline of {self.timeout:.3f}s exceeded')
+            self.exceeded = True
+        return self.exceeded
+
+    def __repr__(self):
+        return f'Deadline(timeout={self.timeout}, remaining={self.remaining()})'
+
+
+NO_DEADLINE = Deadline()
+
+
+def until_deadline(iterable: Iterable[T], deadline: Deadline) -> Iterator[T]:
+    """
+    Stops the iteration when the deadline expires.
+    """
+    if deadline.expires_at is None:
+        yield from iterable
+        return
+
+    for item in iterable:
+        if deadline.expired():
+            return
+        yield item
+
+
+def get_deadline() -> Deadline:
+    """Returns the deadline of a request handled by the current thread."""
+    return getattr(thread_locals, 'deadline', NO_DEADLINE)
+
+
+@contextmanager
+def deadline_for_thread(deadline: Deadline):
+    """
+    Sets the deadline checked by the code without access to the request (e.g. the generators)
+    for the current thread. The previous deadline is restored at exit, so that it does not leak
+    into the next request handled by the thread.
+    """
+    previous = get_deadline()
+    thread_locals.deadline = deadline
+    try:
+        yield deadline
+    finally:
+        thread_locals.deadline = previous
+
+
+def propagate_deadline(fn: Callable[..., T]) -> Callable[..., T]:
+    """
+    Wraps a function submitted to another thread, so that it runs with the deadline of the current thread.
+    """
+    deadline = get_deadline()
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with deadline_for_thread(deadline):
+            return fn(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,113 @@
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from time import perf_counter
+from typing import Callable, TypeVar
+
+logger = logging.getLogger('namegraph')
+
+R = TypeVar('R')
+
+
+class ExecutorSaturated(RuntimeError):
+    """
+    Raised when a task is submitted to a `BoundedExecutor` whose queue is already full.
+    """
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a bounded number of waiting tasks.
+
+    Tasks submitted when `max_workers + max_queue_size` tasks are already in flight are rejected
+    with `ExecutorSaturated` instead of piling up or, if `block` is set, wait for a free slot
+    (for the pools used inside a request, which should not fail it). Queue depth and the time tasks wait
+    before being picked up by a worker are tracked and returned by `stats`.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue_size: int, block: bool = False):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.block = block
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue_size)
+        self._lock = threading.Lock()
+
+        self.queued = 0
+        self.active = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.blocked = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def submit(self, fn: Callable[..., R], *args, **kwargs) -> concurrent.futures.Future[R]:
+        enqueued_at = perf_counter()
+        if not self._slots.acquire(blocking=False):
+            if not self.block:
+                with self._lock:
+                    self.rejected += 1
+                raise ExecutorSaturated(f'Executor {self.name} is saturated')
+
+            with self._lock:
+                self.blocked += 1
+            self._slots.acquire()
+
+        with self._lock:
+            self.submitted += 1
+            self.queued += 1
+
+        def task():
+            wait_time = (perf_counter() - enqueued_at) * 1000
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+                self.total_wait_time += wait_time
+                self.max_wait_time = max(self.max_wait_time, wait_time)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+                self._slots.release()
+
+        try:
+            return self._executor.submit(task)
+        except RuntimeError:  # executor has been shut down
+            with self._lock:
+                self.queued -= 1
+            self._slots.release()
+            raise
+
+    async def run(self, fn: Callable[..., R], *args, **kwargs) -> R:
+        """
+        Run `fn` in the pool and await its result without blocking the event loop.
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> dict[str, int | float | str]:
+        with self._lock:
+            started = self.completed + self.active
+            return {
+                'name': self.name,
+                'max_workers': self.max_workers,
+                'max_queue_size': self.max_queue_size,
+                'queue_depth': self.queued,
+                'active': self.active,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'blocked': self.blocked,
+                'utilization': self.active / self.max_workers,
+                'mean_wait_time_ms': self.total_wait_time / started if started else 0.0,
+                'max_wait_time_ms': self.max_wait_time,
+            }
+
+    def shutdown(self, wait: bool = True):
+        logger.info(f'Shutting down executor {self.name}')
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
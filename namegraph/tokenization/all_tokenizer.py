@@ -1,8 +1,15 @@
 import collections
-from typing import Tuple, Iterable
+import heapq
+import itertools
+from typing import Tuple, Iterable, Iterator, Optional
 import ahocorasick
 
 from .tokenizer import Tokenizer
+from ..namehash_common.utils import ln
+from ..thread_utils import get_deadline
+
+# the deadline is checked every that many steps of the search
+DEADLINE_CHECK_STEPS = 256
 
 
 class Gap(str):
@@ -12,65 +19,216 @@ class Gap(str):
         return obj
 
 
-class DFS:
+class Lattice:
+    """
+    Graph of the tokens of a name: nodes are the positions in the name, edges are the dictionary words found by
+    the automaton and the gaps (non dictionary words) between them. A state is a position and whether the last
+    token was a gap (two gaps never follow each other). Dead ends are pruned once, so every path yields
+    a tokenization.
+    """
+
     def __init__(self, automaton, name, skip_non_words=False, with_gaps=False):
-        self.automaton = automaton
         self.name = name
         self.skip_non_words = skip_non_words
         self.with_gaps = with_gaps  # change non dictionary words into empty string
 
         # create graph
-        self.g_out = collections.defaultdict(list)
-        self.g_in = collections.defaultdict(list)
-        for end_index, value in self.automaton.iter(name):
+        g_out = collections.defaultdict(list)
+        ends = set()
+        for end_index, value in automaton.iter(name):
             start_index = end_index - len(value) + 1
             end_index += 1
-            self.g_out[start_index].append(end_index)
-            self.g_in[end_index].append(start_index)
-        self.g_out[len(name)] = []
-        self.result = []
-
-    def all_paths(self):
-        try:
-            for r in self.dfs(0, []):
-                t = []
-                for start, end, in_dictionary in r:
-                    if not in_dictionary and self.with_gaps:
-                        t.append(Gap(end - start))
-                    else:
-                        t.append(self.name[start:end])
-                yield tuple(t)
-        except RecursionError:
+            g_out[start_index].append(end_index)
+            ends.add(end_index)
+        length = len(name)
+
+        # gaps end at the starts of the words (in the order of finding them) or at the end of the name,
+        # never at the end of a word
+        gap_ends = [index for index in itertools.chain(g_out.keys(), [length]) if index not in ends]
+
+        # edges (start, end, in_dictionary) from every position, in the order of enumeration
+        self.words = {index: [(index, end, True) for end in sorted(g_out[index], reverse=True)] for index in g_out}
+        self.gaps = {}
+        if not skip_non_words:
+            for index in range(length):
+                found_next_token = bool(g_out.get(index))
+                gaps = []
+                for gap_end in gap_ends:
+                    if gap_end <= index: continue
+                    if gap_end == length and (index == 0 or found_next_token): continue
+                    found_next_token = True
+                    gaps.append((index, gap_end, False))
+                self.gaps[index] = gaps
+
+        # whether the end of the name can be reached from the state (position, gap before)
+        self.finishes = {(length, False): True, (length, True): True}
+        for index in range(length - 1, -1, -1):
+            by_word = any(self.finishes.get((end, False), False) for _, end, _ in self.words.get(index, ()))
+            by_gap = any(self.finishes.get((end, True), False) for _, end, _ in self.gaps.get(index, ()))
+            self.finishes[(index, True)] = by_word
+            self.finishes[(index, False)] = by_word or by_gap
+
+    def edges(self, index: int, gap_before: bool) -> Iterator[tuple[int, int, bool]]:
+        """
+        Yields the edges from the state which lead to the end of the name.
+        """
+        for edge in self.words.get(index, ()):
+            if self.finishes[(edge[1], False)]:
+                yield edge
+        if not gap_before:
+            for edge in self.gaps.get(index, ()):
+                if self.finishes[(edge[1], True)]:
+                    yield edge
+
+    def token(self, edge: tuple[int, int, bool]) -> str:
+        start, end, in_dictionary = edge
+        if not in_dictionary and self.with_gaps:
+            return Gap(end - start)
+        return self.name[start:end]
+
+    def tokens(self, edges: Iterable[tuple[int, int, bool]]) -> tuple[str, ...]:
+        return tuple(self.token(edge) for edge in edges)
+
+    def all_paths(self, max_steps: Optional[int] = None) -> Iterator[tuple[str, ...]]:
+        """
+        Yields the tokenizations in the depth-first order: longer words first, then the gaps.
+        Stops after `max_steps` edges or at the deadline.
+        """
+        if not self.name:
+            yield ()
             return
+        if not self.finishes[(0, False)]:
+            return
+        deadline = get_deadline()
+        length = len(self.name)
+        path = []
+        stack = [self.edges(0, False)]
+        for step in itertools.count():
+            if not stack or (max_steps is not None and step >= max_steps):
+                return
+            if step % DEADLINE_CHECK_STEPS == 0 and deadline.expired():
+                return
+
+            edge = next(stack[-1], None)
+            if edge is None:
+                stack.pop()
+                if path:
+                    path.pop()
+                continue
+
+            _, end, in_dictionary = edge
+            if end == length:
+                yield self.tokens(path + [edge])
+                continue
+            path.append(edge)
+            stack.append(self.edges(end, not in_dictionary))
 
-    def dfs(self, index, result, gap_before=False):
-        if index == len(self.name):
-            yield result
+    def best_paths(self, ngrams, k: Optional[int] = None, max_steps: Optional[int] = None) \
+            -> Iterator[tuple[tuple[str, ...], float]]:
+        """
+        Yields the tokenizations with their log probabilities under the n-grams, the most probable first
+        (at most `k`). The best completion of every state (position, gap before, last word) is computed once
+        backwards, so the best-first search expands only the paths leading to the yielded tokenizations.
+        Stops after `max_steps` expanded paths or at the deadline.
+        """
+        if k == 0:
             return
+        if not self.name:
+            yield (), 0.0
+            return
+        if not self.finishes[(0, False)]:
+            return
+        deadline = get_deadline()
+        length = len(self.name)
 
-        found_next_token = False
-        if index in self.g_out:
-            for end in sorted(self.g_out[index], reverse=True):
-                found_next_token = True
-                yield from self.dfs(end, result + [(index, end, True)])
-
-        if not self.skip_non_words and not gap_before:
-            for potential_index in self.g_out.keys():
-                if potential_index <= index: continue
-                if index == 0 and potential_index == len(self.name): continue
-                if found_next_token and potential_index == len(self.name): continue
-                if potential_index not in self.g_in:
-                    found_next_token = True
-                    yield from self.dfs(potential_index, result + [(index, potential_index, False)], gap_before=True)
+        def words(edge) -> list[str]:
+            start, end, in_dictionary = edge
+            if not in_dictionary and self.with_gaps:
+                return [''] * (end - start)
+            return [self.name[start:end]]
+
+        edge_costs = {}
+
+        def cost(last_word: Optional[str], edge) -> float:
+            # negative log probability of the words of the edge following the last word
+            key = (last_word, edge)
+            if key not in edge_costs:
+                total = 0.0
+                for word in words(edge):
+                    probability = ngrams.word_probability(word) if last_word is None \
+                        else ngrams.bigram_probability(last_word, word)
+                    total -= ln(probability)
+                    last_word = word
+                edge_costs[key] = total
+            return edge_costs[key]
+
+        # states reachable from the start, by position
+        states = collections.defaultdict(set)
+        start_state = (0, False, None)
+        queue = [start_state]
+        seen = {start_state}
+        while queue:
+            index, gap_before, last_word = queue.pop()
+            for edge in self.edges(index, gap_before):
+                state = (edge[1], not edge[2], words(edge)[-1])
+                if state not in seen:
+                    seen.add(state)
+                    states[edge[1]].add(state)
+                    queue.append(state)
+
+        # the cost of the best completion of every state
+        best = {}
+        for index in sorted(states, reverse=True):
+            for state in states[index]:
+                best[state] = 0.0 if index == length else min(
+                    cost(state[2], edge) + best[(edge[1], not edge[2], words(edge)[-1])]
+                    for edge in self.edges(index, state[1]))
+        best[start_state] = min(cost(None, edge) + best[(edge[1], not edge[2], words(edge)[-1])]
+                                for edge in self.edges(0, False))
+
+        # best-first search; the paths are linked lists (edge, previous), shared by the extended paths
+        counter = itertools.count()
+        heap = [(best[start_state], next(counter), 0.0, start_state, None)]
+        found = 0
+        for step in itertools.count():
+            if not heap or (max_steps is not None and step >= max_steps):
+                return
+            if step % DEADLINE_CHECK_STEPS == 0 and deadline.expired():
+                return
+
+            _, _, path_cost, (index, gap_before, last_word), path = heapq.heappop(heap)
+            if index == length:
+                edges = []
+                while path is not None:
+                    edge, path = path
+                    edges.append(edge)
+                yield self.tokens(reversed(edges)), -path_cost
+                found += 1
+                if k is not None and found >= k:
+                    return
+                continue
+
+            for edge in self.edges(index, gap_before):
+                state = (edge[1], not edge[2], words(edge)[-1])
+                next_cost = path_cost + cost(last_word, edge)
+                heapq.heappush(heap, (next_cost + best[state], next(counter), next_cost, state, (edge, path)))
 
 
 class AllTokenizer(Tokenizer):
-    """Return all tokenizations. It is a generator."""
+    """
+    Return all tokenizations. It is a generator.
+    With `tokenization.all_tokenizer_k_best` only the k most probable tokenizations (under the n-grams) are returned,
+    the most probable first. The search stops after `tokenization.all_tokenizer_max_steps` steps.
+    """
 
-    def __init__(self, config):
+    def __init__(self, config, ngrams=None):
         path = config.tokenization.dictionary
+        self.config = config
         self.skip_non_words = config.tokenization.skip_non_words
         self.with_gaps = config.tokenization.with_gaps
+        self.max_steps = config.tokenization.all_tokenizer_max_steps
+        self.k_best = config.tokenization.all_tokenizer_k_best
+        self._ngrams = ngrams
 
         self.automaton = ahocorasick.Automaton()
         skip_one_letter_words = config.tokenization.skip_one_letter_words
@@ -86,7 +244,20 @@ class AllTokenizer(Tokenizer):
 
         self.automaton.make_automaton()
 
+    @property
+    def ngrams(self):
+        if self._ngrams is None:
+            from ..namehash_common.ngrams import Ngrams
+            self._ngrams = Ngrams(self.config)
+        return self._ngrams
+
+    def lattice(self, name: str) -> Lattice:
+        return Lattice(self.automaton, name, self.skip_non_words, self.with_gaps)
+
     def tokenize(self, name: str) -> Iterable[Tuple[str, ...]]:
-        dfs = DFS(self.automaton, name, self.skip_non_words, self.with_gaps)
-        tokenizations = dfs.all_paths()
-        return tokenizations
+        if self.k_best is not None:
+            return self.tokenize_best(name, self.k_best)
+        return self.lattice(name).all_paths(self.max_steps)
+
+    def tokenize_best(self, name: str, k: Optional[int] = None) -> Iterator[Tuple[str, ...]]:
+        return (tokens for tokens, _ in self.lattice(name).best_paths(self.ngrams, k, self.max_steps))
@@ -1,7 +1,7 @@
-from nltk.corpus import wordnet as wn
 from itertools import chain
 
 from .tokenizer import Tokenizer
+from ..wordnet_lemmas import WordnetLemmas
 
 
 # todo: use custom dictionary?
@@ -11,20 +11,19 @@ class BigramLongestTokenizer(Tokenizer):
 
     def __init__(self, config):
         super().__init__()
-        wn.synsets('dog')
+        self.wordnet = WordnetLemmas(config)
         self.min_token_len = 3
 
     def get_tokenization(self, word: str) -> tuple[str, str] | None:
         if len(word) < 2 * self.min_token_len:
             return None
 
+        has_synsets = self.wordnet.has_synsets
         for i in self.generate_indices(word):
-            prefix_synsets = wn.synsets(word[:i])
-            suffix_synsets = wn.synsets(word[i:])
-            if prefix_synsets and suffix_synsets:
+            if has_synsets(word[:i]) and has_synsets(word[i:]):
                 return word[:i], word[i:]
 
-        if wn.synsets(word):
+        if has_synsets(word):
             return word, ''
         return None
 
@@ -1,9 +1,7 @@
 from typing import List, Tuple
 
-import nltk
-from nltk.corpus import wordnet as wn
-
 from .tokenizer import Tokenizer
+from ..wordnet_lemmas import WordnetLemmas
 
 
 class BigramWordnetTokenizer(Tokenizer):
@@ -11,18 +9,16 @@ class BigramWordnetTokenizer(Tokenizer):
 
     def __init__(self, config):
         super().__init__()
-        wn.synsets('dog')
+        self.wordnet = WordnetLemmas(config)
 
     def tokenize(self, word: str) -> List[Tuple[str, ...]]:
+        has_synsets = self.wordnet.has_synsets
         result = []
-        if wn.synsets(word):
+        if has_synsets(word):
             result.append((word,))
 
         for i in range(1, len(word)):
-            prefix_synsets = wn.synsets(word[:i])
-            suffix_synsets = wn.synsets(word[i:])
-
-            if prefix_synsets and suffix_synsets:
+            if has_synsets(word[:i]) and has_synsets(word[i:]):
                 result.append((word[:i], word[i:]))
 
         return result
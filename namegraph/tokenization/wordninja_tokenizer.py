@@ -1,14 +1,16 @@
 import re
-from typing import List, Tuple
-from functools import lru_cache
+from typing import Iterable, List, Tuple
 import wordninja
 import emoji
 from emoji import EmojiMatch
 
 from .tokenizer import Tokenizer
+from ..utils import LRUCache, Singleton
 
 _SPLIT_RE = re.compile("([a-zA-Z0-9']+|\d+)", re.UNICODE)
 _SIMPLE_RE = re.compile("^[a-zA-Z0-9']+$")
+# separators of the chunks split by wordninja
+_WORDNINJA_SPLIT_RE = re.compile("[^a-zA-Z0-9']+")
 
 def emoji_split(name: str) -> List[Tuple[str, bool]]:
     token = []
@@ -23,27 +25,102 @@ def emoji_split(name: str) -> List[Tuple[str, bool]]:
     if token:
         yield ''.join(token), False
 
-@lru_cache(64)
-def _tokenizer(name: str) -> List[Tuple[str, ...]]:
-    return [tuple(wordninja.split(name))]
+class WordNinjaModel(metaclass=Singleton):
+    """
+    Language model of wordninja shared by the tokenizers (and the indices built with it), with a size-bounded cache
+    of the tokenizations (`caches.tokenizations`). `split_batch` tokenizes many strings in one call, sharing
+    the splits of the chunks repeated across the strings.
+    """
 
+    def __init__(self, config):
+        self.model = wordninja.LanguageModel(config.tokenization.wordninja_dictionary)
+        wordninja.DEFAULT_LANGUAGE_MODEL = self.model
+        self.cache = LRUCache(maxsize=config.caches.tokenizations.maxsize)
 
-@lru_cache(64)
-def _improved_tokenizer(name: str) -> List[Tuple[str, ...]]:
-    tokens = []
-    for token, is_emoji in emoji_split(name):
-        if is_emoji:
-            tokens.append(token)
-        else:
-            split_name = _SPLIT_RE.split(token)
-            for token2 in split_name:
-                if not token2:
-                    continue
-                if _SIMPLE_RE.match(token2):
-                    tokens.extend(wordninja.split(token2))
-                else:
-                    tokens.append(token2)
-    return [tuple(tokens)]
+    def _split_chunk(self, s: str) -> list[str]:
+        """
+        Same as `wordninja.LanguageModel._split`, but the best match of every position is computed once.
+        """
+        wordcost, maxword = self.model._wordcost, self.model._maxword
+        lower = s.lower()
+        cost = [0]
+        lengths = [0]
+        for i in range(1, len(s) + 1):
+            # the shortest of the words with the minimal cost, as `min` of the (cost, length) pairs
+            best_cost, best_length = 9e999, 1
+            for j in range(i - 1, max(0, i - maxword) - 1, -1):
+                c = cost[j] + wordcost.get(lower[j:i], 9e999)
+                if c < best_cost:
+                    best_cost, best_length = c, i - j
+            cost.append(best_cost)
+            lengths.append(best_length)
+
+        # backtrack, re-attaching split 's and digits as wordninja does
+        out = []
+        i = len(s)
+        while i > 0:
+            k = lengths[i]
+            new_token = True
+            if not s[i - k:i] == "'":
+                if out and (out[-1] == "'s" or (s[i - 1].isdigit() and out[-1][0].isdigit())):
+                    out[-1] = s[i - k:i] + out[-1]
+                    new_token = False
+            if new_token:
+                out.append(s[i - k:i])
+            i -= k
+        out.reverse()
+        return out
+
+    def _split(self, s: str, chunks: dict[str, list[str]]) -> tuple[str, ...]:
+        tokens = []
+        for chunk in _WORDNINJA_SPLIT_RE.split(s):
+            if chunk not in chunks:
+                chunks[chunk] = self._split_chunk(chunk)
+            tokens.extend(chunks[chunk])
+        return tuple(tokens)
+
+    def _improved_split(self, s: str, chunks: dict[str, list[str]]) -> tuple[str, ...]:
+        tokens = []
+        for token, is_emoji in emoji_split(s):
+            if is_emoji:
+                tokens.append(token)
+            else:
+                split_name = _SPLIT_RE.split(token)
+                for token2 in split_name:
+                    if not token2:
+                        continue
+                    if _SIMPLE_RE.match(token2):
+                        tokens.extend(self._split(token2, chunks))
+                    else:
+                        tokens.append(token2)
+        return tuple(tokens)
+
+    def split(self, s: str, improved: bool = False) -> tuple[str, ...]:
+        key = (improved, s)
+        tokens = self.cache.get(key)
+        if tokens is None:
+            tokens = self._improved_split(s, {}) if improved else self._split(s, {})
+            self.cache.put(key, tokens)
+        return tokens
+
+    def split_batch(self, names: Iterable[str], improved: bool = False, cache: bool = True) -> list[tuple[str, ...]]:
+        """
+        Tokenizes the names like `split`. Without `cache` (e.g. building an index of many names) the cache
+        of the tokenizations is neither read nor filled.
+        """
+        chunks = {}
+        splits = {}
+        result = []
+        for name in names:
+            if name not in splits:
+                tokens = self.cache.get((improved, name)) if cache else None
+                if tokens is None:
+                    tokens = self._improved_split(name, chunks) if improved else self._split(name, chunks)
+                    if cache:
+                        self.cache.put((improved, name), tokens)
+                splits[name] = tokens
+            result.append(splits[name])
+        return result
 
 
 class WordNinjaTokenizer(Tokenizer):
@@ -51,10 +128,13 @@ class WordNinjaTokenizer(Tokenizer):
 
     def __init__(self, config):
         super().__init__()
-        wordninja.DEFAULT_LANGUAGE_MODEL = wordninja.LanguageModel(config.tokenization.wordninja_dictionary)
+        self.model = WordNinjaModel(config)
 
     def tokenize(self, name: str) -> List[Tuple[str, ...]]:
-        return _tokenizer(name)
+        return [self.model.split(name)]
+
+    def tokenize_batch(self, names: Iterable[str]) -> List[List[Tuple[str, ...]]]:
+        return [[tokens] for tokens in self.model.split_batch(names)]
 
 
 class ImprovedWordNinjaTokenizer(Tokenizer):
@@ -62,7 +142,10 @@ class ImprovedWordNinjaTokenizer(Tokenizer):
 
     def __init__(self, config):
         super().__init__()
-        wordninja.DEFAULT_LANGUAGE_MODEL = wordninja.LanguageModel(config.tokenization.wordninja_dictionary)
+        self.model = WordNinjaModel(config)
 
     def tokenize(self, name: str) -> List[Tuple[str, ...]]:
-        return _improved_tokenizer(name)
\ No newline at end of file
+        return [self.model.split(name, improved=True)]
+
+    def tokenize_batch(self, names: Iterable[str]) -> List[List[Tuple[str, ...]]]:
+        return [[tokens] for tokens in self.model.split_batch(names, improved=True)]
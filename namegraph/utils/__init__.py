@@ -3,3 +3,4 @@ from .itertools import sort_by_value, sort_by_value_under_key
 from .unicode_wrap import unicode_wrap
 from .singleton import Singleton
 from .ordered_set import OrderedSet
+from .cache import LRUCache
@@ -0,0 +1,109 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+import threading
+import time
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded LRU cache with an optional time-to-live of the entries.
+    If `maxbytes` is set, the entries are also evicted when the total of their declared sizes exceeds it.
+    Counts hits, misses and evictions, so that the cache efficiency can be monitored.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None, maxbytes: Optional[int] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+
+        self._data: OrderedDict[Hashable, tuple[float, Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                inserted_at, value, nbytes = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if self.ttl is not None and time.monotonic() - inserted_at > self.ttl:
+                del self._data[key]
+                self.nbytes -= nbytes
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, nbytes: int = 0) -> None:
+        if self.maxsize <= 0 or (self.maxbytes is not None and nbytes > self.maxbytes):
+            return
+
+        with self._lock:
+            if key in self._data:
+                self.nbytes -= self._data[key][2]
+            self._data[key] = (time.monotonic(), value, nbytes)
+            self._data.move_to_end(key)
+            self.nbytes += nbytes
+            while len(self._data) > self.maxsize or (self.maxbytes is not None and self.nbytes > self.maxbytes):
+                _, (_, _, evicted_nbytes) = self._data.popitem(last=False)
+                self.nbytes -= evicted_nbytes
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def items_nbytes(self) -> list[tuple[Hashable, int]]:
+        """
+        Returns keys of the cached entries together with their declared sizes.
+        """
+        with self._lock:
+            return [(key, nbytes) for key, (_, _, nbytes) in self._data.items()]
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'nbytes': self.nbytes,
+                'maxbytes': self.maxbytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+def freeze(value: Any) -> Hashable:
+    """
+    Convert (possibly nested) request parameters into a hashable value usable as a part of a cache key.
+    """
+    if hasattr(value, 'model_dump'):  # pydantic models
+        value = value.model_dump()
+    if isinstance(value, dict) or hasattr(value, 'items'):
+        return tuple(sorted((str(k), freeze(v)) for k, v in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return frozenset(freeze(v) for v in value)
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
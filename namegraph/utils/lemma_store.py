@@ -0,0 +1,129 @@
+"""
+Compiled store of the WordNet lemmas, memory-mapped from a binary snapshot, so that the serving processes look up
+the words without loading WordNet (nor importing NLTK) and share one copy of it in the page cache.
+
+The keys are the words having synsets (lowercase, as WordNet looks them up), including the inflected forms WordNet
+reduces to its lemmas. Every key has the lemma names of its synsets with counts, in the order of the synsets.
+
+Layout (see `snapshot`): JSON header with the key count and the sections:
+`strings` (UTF-8 keys followed by the lemma names which are not keys), `offsets` (uint32, strings + 1),
+`table` (int32 open addressing hash table of the key indices, keyed by CRC32 of the key, -1 is empty),
+`hashes` (uint32 CRC32 of the key in every slot), `lists` (uint32, keys + 1, ranges of the lemmas of every key),
+`lemmas` (uint32 indices of the strings) and `counts` (uint16).
+"""
+from __future__ import annotations
+
+import zlib
+from array import array
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+from namegraph.utils import snapshot
+from namegraph.utils.snapshot import EMPTY
+
+MAGIC = b'NGLS'
+VERSION = 1
+MAX_COUNT = 2 ** 16 - 1
+
+
+class LemmaStore:
+    def __init__(self, buffer):
+        self._buffer = buffer
+        self.header, sections = snapshot.unpack(buffer, MAGIC, VERSION, 'lemma store')
+        # slicing the buffer is faster than slicing the memoryview
+        self._strings_start = self.header['sections']['strings'][0]
+        self._offsets = sections['offsets']
+        self._table = sections['table']
+        self._hashes = sections['hashes']
+        self._mask = len(self._table) - 1
+        self._lists = sections['lists']
+        self._lemmas = sections['lemmas']
+        self._counts = sections['counts']
+
+    @staticmethod
+    def build(entries: Iterable[tuple[str, Iterable[tuple[str, int]]]], metadata: dict = None) -> bytes:
+        """
+        Compiles the entries (key, lemma counts) into a snapshot. The lemma counts are kept in the given order.
+        """
+        entries = [(key, list(lemma_counts)) for key, lemma_counts in entries]
+        keys = [key for key, _ in entries]
+        if len(set(keys)) != len(keys):
+            raise ValueError('duplicate keys in the lemma store')
+
+        index_of = {key: index for index, key in enumerate(keys)}
+        strings = list(keys)
+        lists = array('I', [0])
+        lemmas = array('I')
+        counts = array('H')
+        for _, lemma_counts in entries:
+            for lemma, count in lemma_counts:
+                if lemma not in index_of:
+                    index_of[lemma] = len(strings)
+                    strings.append(lemma)
+                lemmas.append(index_of[lemma])
+                counts.append(min(count, MAX_COUNT))
+            lists.append(len(lemmas))
+
+        encoded = [string.encode('utf-8') for string in strings]
+        data = b''.join(encoded)
+        if len(data) >= 2 ** 32:
+            raise ValueError('strings too long for the lemma store')
+        offsets = array('I', [0])
+        for string in encoded:
+            offsets.append(offsets[-1] + len(string))
+
+        table, hashes = snapshot.hash_table(encoded[:len(keys)])
+        section_data = [('strings', data, 'B'), ('offsets', offsets.tobytes(), 'I'), ('table', table.tobytes(), 'i'),
+                        ('hashes', hashes.tobytes(), 'I'), ('lists', lists.tobytes(), 'I'),
+                        ('lemmas', lemmas.tobytes(), 'I'), ('counts', counts.tobytes(), 'H')]
+        header = {'version': VERSION, 'keys': len(keys), 'metadata': metadata or {}}
+        return snapshot.pack(MAGIC, header, section_data)
+
+    @classmethod
+    def open(cls, path: Path) -> LemmaStore:
+        return cls(snapshot.open_mmap(path))
+
+    @classmethod
+    def load_or_build(cls, path: Path, build: Callable[[], bytes]) -> LemmaStore:
+        """
+        Maps the snapshot at `path`, building and writing it first if it does not exist.
+        """
+        return cls(snapshot.load_or_build(path, build))
+
+    def __len__(self) -> int:
+        return self.header['keys']
+
+    def find(self, key: str) -> int:
+        """
+        Returns the index of the key or -1.
+        """
+        encoded = key.encode('utf-8')
+        key_hash = zlib.crc32(encoded)
+        table, hashes, mask = self._table, self._hashes, self._mask
+        buffer, start, offsets = self._buffer, self._strings_start, self._offsets
+        slot = key_hash & mask
+        while (index := table[slot]) != EMPTY:
+            if hashes[slot] == key_hash and buffer[start + offsets[index]:start + offsets[index + 1]] == encoded:
+                return index
+            slot = (slot + 1) & mask
+        return EMPTY
+
+    def __contains__(self, key) -> bool:
+        return self.find(key) != EMPTY
+
+    def string(self, index: int) -> str:
+        start = self._strings_start
+        return str(self._buffer[start + self._offsets[index]:start + self._offsets[index + 1]], 'utf-8')
+
+    def lemma_counts(self, key: str) -> list[tuple[str, int]]:
+        """
+        Returns the lemma names of the synsets of the key with their counts, empty for a missing key.
+        """
+        index = self.find(key)
+        if index == EMPTY:
+            return []
+        lemmas, counts = self._lemmas, self._counts
+        return [(self.string(lemmas[i]), counts[i]) for i in range(self._lists[index], self._lists[index + 1])]
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.string(index) for index in range(len(self)))
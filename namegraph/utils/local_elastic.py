@@ -0,0 +1,436 @@
+"""
+In-process stand-in of the Elasticsearch client for the collection matchers, serving a JSON snapshot
+of the collections index. It answers the queries built by `ElasticsearchQueryBuilder` (bool, term, terms, ids,
+multi_match, query_string, rank_feature, sort, from/size, _source, fields, script_fields and count); the `sltr`
+rescore needs the LTR plugin and is ignored, so the relevance order differs from the cluster.
+Latency and failures are injected from a seeded random generator, so the runs are reproducible.
+"""
+from __future__ import annotations
+
+import json
+import math
+import random
+import re
+import threading
+import time
+from typing import Any, Iterator, Optional
+
+import elastic_transport
+import elasticsearch
+from omegaconf import DictConfig
+
+# sub-fields of the mapping, which have the values of the parent field
+SUBFIELDS = ('raw', 'exact', 'keyword')
+
+TOKEN_PATTERN = re.compile(r'\w+')
+QUERY_TERM_PATTERN = re.compile(r'(\S+?)(?:\^(\d+(?:\.\d+)?))?(?=\s|$)')
+
+SKIP_PATTERN = re.compile(r'\.skip\((\d+)\)')
+LIMIT_PATTERN = re.compile(r'\.limit\((\d+)\)')
+MAP_PATTERN = re.compile(r'\.map\(\s*\w+\s*->\s*\w+\.(\w+)\s*\)')
+
+
+def _values(document: dict[str, Any], path: str) -> list[Any]:
+    """
+    Returns the flattened values of a dotted field path, descending into the lists of objects as Elasticsearch does.
+    """
+    values = [document]
+    for key in path.split('.'):
+        next_values = []
+        for value in values:
+            if isinstance(value, dict) and key in value:
+                value = value[key]
+                next_values.extend(_flatten(value))
+        values = next_values
+    return values
+
+
+def _flatten(value: Any) -> Iterator[Any]:
+    if isinstance(value, list):
+        for item in value:
+            yield from _flatten(item)
+    elif value is not None:
+        yield value
+
+
+def _field_values(document: dict[str, Any], field: str) -> list[Any]:
+    values = _values(document, field)
+    if not values and field.rsplit('.', 1)[-1] in SUBFIELDS:
+        values = _values(document, field.rsplit('.', 1)[0])
+    return values
+
+
+def _filter_source(value: Any, includes: list[str]) -> Any:
+    """
+    Keeps only the included paths of the source, e.g. `template.top25_names.tokenized_name` keeps
+    the `tokenized_name` of every object in the `template.top25_names` list.
+    """
+    return _include(value, [path.split('.') for path in includes])
+
+
+def _include(value: Any, paths: list[list[str]]) -> Any:
+    if any(not path for path in paths):
+        return value
+    if isinstance(value, list):
+        return [included for item in value if (included := _include(item, paths)) is not None]
+    if isinstance(value, dict):
+        filtered = {}
+        for key, item in value.items():
+            subpaths = [path[1:] for path in paths if path[0] == key]
+            if subpaths and (included := _include(item, subpaths)) is not None:
+                filtered[key] = included
+        return filtered
+    return None
+
+
+def _tokens(value: Any) -> list[str]:
+    return TOKEN_PATTERN.findall(str(value).lower())
+
+
+def _parse_boost(field: str) -> tuple[str, float]:
+    name, _, boost = field.partition('^')
+    return name, float(boost) if boost else 1.0
+
+
+def _api_error(error_class: type, status: int, message: str) -> elasticsearch.ApiError:
+    meta = elastic_transport.ApiResponseMeta(
+        status=status, http_version='1.1', headers=elastic_transport.HttpHeaders(), duration=0.0,
+        node=elastic_transport.NodeConfig('http', 'localhost', 9200),
+    )
+    return error_class(message, meta, {'error': message, 'status': status})
+
+
+class LatencyModel:
+    """
+    Samples the latency of a request in seconds. Distributions: `constant` (`ms`), `uniform` (`ms` ± `spread`),
+    `normal` (mean `ms`, standard deviation `spread`), `lognormal` (median `ms`, `spread` is the sigma of the log)
+    and `exponential` (mean `ms`).
+    """
+
+    DISTRIBUTIONS = ('constant', 'uniform', 'normal', 'lognormal', 'exponential')
+
+    def __init__(self, distribution: str = 'constant', ms: float = 0.0, spread: float = 0.0):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f'unknown latency distribution: {distribution}')
+        self.distribution = distribution
+        self.ms = ms
+        self.spread = spread
+
+    def sample(self, rng: random.Random) -> float:
+        if self.ms <= 0:
+            return 0.0
+        if self.distribution == 'constant':
+            ms = self.ms
+        elif self.distribution == 'uniform':
+            ms = rng.uniform(self.ms - self.spread, self.ms + self.spread)
+        elif self.distribution == 'normal':
+            ms = rng.gauss(self.ms, self.spread)
+        elif self.distribution == 'lognormal':
+            ms = rng.lognormvariate(math.log(self.ms), self.spread)
+        else:
+            ms = rng.expovariate(1 / self.ms)
+        return max(ms, 0.0) / 1000
+
+
+class _Indices:
+    def __init__(self, client: LocalElasticsearch):
+        self._client = client
+
+    def exists(self, index: str, **kwargs) -> bool:
+        return self._client.index_name is None or index == self._client.index_name
+
+
+class LocalElasticsearch:
+    """
+    Implements the part of the `Elasticsearch` client used by the collection matchers.
+    `error_rate` of the requests fail with a connection error and `timeout_rate` time out (after the request timeout,
+    or after the sampled latency if there is no timeout); a request whose latency exceeds the request timeout
+    times out as well.
+    """
+
+    def __init__(
+            self,
+            documents: list[dict[str, Any]],
+            index_name: Optional[str] = None,
+            latency: Optional[LatencyModel] = None,
+            error_rate: float = 0.0,
+            timeout_rate: float = 0.0,
+            seed: int = 0,
+            request_timeout: Optional[float] = None,
+    ):
+        self.documents = documents
+        self.by_id = {document['_id']: document for document in documents}
+        self.index_name = index_name
+        self.latency = latency or LatencyModel()
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.request_timeout = request_timeout
+        self.indices = _Indices(self)
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._pivots: dict[str, float] = {}
+
+    @classmethod
+    def from_snapshot(cls, path: str, **kwargs) -> LocalElasticsearch:
+        """
+        Loads a snapshot: a list of documents (`_id` and `_source`) or a saved search response.
+        """
+        with open(path) as f:
+            snapshot = json.load(f)
+        if isinstance(snapshot, dict):
+            snapshot = snapshot['hits']['hits']
+        documents = [{'_id': str(hit['_id']), '_source': hit['_source']} for hit in snapshot]
+        return cls(documents, **kwargs)
+
+    @classmethod
+    def from_config(cls, config: DictConfig) -> LocalElasticsearch:
+        local = config.elasticsearch.local
+        return cls.from_snapshot(
+            local.snapshot,
+            index_name=config.elasticsearch.index,
+            latency=LatencyModel(local.latency.distribution, local.latency.ms, local.latency.spread),
+            error_rate=local.error_rate,
+            timeout_rate=local.timeout_rate,
+            seed=local.seed,
+        )
+
+    def options(self, request_timeout: Optional[float] = None, **kwargs) -> LocalElasticsearch:
+        """
+        Returns a client sharing the documents and the random generator with a different request timeout.
+        """
+        client = object.__new__(LocalElasticsearch)
+        client.__dict__.update(self.__dict__)
+        client.request_timeout = request_timeout if request_timeout is not None else self.request_timeout
+        client.indices = _Indices(client)
+        return client
+
+    def _simulate_request(self) -> float:
+        """
+        Waits for the sampled latency and raises the injected failures. Returns the latency in seconds.
+        """
+        with self._lock:
+            latency = self.latency.sample(self._rng)
+            failure = self._rng.random()
+
+        if failure < self.timeout_rate or (self.request_timeout is not None and latency > self.request_timeout):
+            waited = latency if self.request_timeout is None else self.request_timeout
+            time.sleep(waited)
+            raise elastic_transport.ConnectionTimeout(f'Connection timed out after {waited:.3f}s (injected)')
+
+        if latency > 0:
+            time.sleep(latency)
+        if failure < self.timeout_rate + self.error_rate:
+            raise elastic_transport.ConnectionError('Connection error (injected)')
+        return latency
+
+    def search(self, index: str = None, **params) -> dict[str, Any]:
+        latency = self._simulate_request()
+        scored = self._match(params.get('query', {'match_all': {}}))
+        total = len(scored)
+        scored = self._sort(scored, params.get('sort'))
+
+        offset = params.get('from_', params.get('from')) or 0
+        size = params.get('size', 10)
+        source = params.get('source', params.get('_source', True))
+
+        hits = [self._hit(document, score, source, params.get('fields'), params.get('script_fields'))
+                for score, document in scored[offset:offset + size]]
+        return {
+            'took': round(latency * 1000),
+            'timed_out': False,
+            'hits': {
+                'total': {'value': min(total, 10000), 'relation': 'eq' if total <= 10000 else 'gte'},
+                'max_score': max((hit['_score'] for hit in hits), default=None),
+                'hits': hits,
+            }
+        }
+
+    def count(self, index: str = None, query: dict = None, **params) -> dict[str, Any]:
+        self._simulate_request()
+        return {'count': len(self._match(query or {'match_all': {}}))}
+
+    def get(self, index: str, id: str, _source_includes: Optional[list[str]] = None, **params) -> dict[str, Any]:
+        self._simulate_request()
+        if id not in self.by_id:
+            raise _api_error(elasticsearch.NotFoundError, 404, f'document {id} not found')
+        document = self.by_id[id]
+        source = document['_source'] if _source_includes is None \
+            else _filter_source(document['_source'], _source_includes)
+        return {'_index': index, '_id': id, 'found': True, '_source': source}
+
+    def _match(self, query: dict[str, Any]) -> list[tuple[float, dict[str, Any]]]:
+        scored = []
+        for document in self.documents:
+            score = self._score(document, query)
+            if score is not None:
+                scored.append((score, document))
+        return scored
+
+    def _sort(
+            self,
+            scored: list[tuple[float, dict[str, Any]]],
+            sort: Optional[list]
+    ) -> list[tuple[float, dict[str, Any]]]:
+        if not sort:
+            return sorted(scored, key=lambda item: item[0], reverse=True)
+
+        # stable sorts from the least significant key
+        for key in reversed(sort):
+            if key == '_score':
+                scored = sorted(scored, key=lambda item: item[0], reverse=True)
+                continue
+            field, order = next(iter(key.items()))
+            order = order['order'] if isinstance(order, dict) else order
+            # documents without the field are last in both orders
+            present = [(item, _field_values(item[1]['_source'], field)) for item in scored]
+            missing = [item for item, values in present if not values]
+            present = sorted(((item, values) for item, values in present if values),
+                             key=lambda pair: pair[1][0], reverse=order == 'desc')
+            scored = [item for item, _ in present] + missing
+        return scored
+
+    def _score(self, document: dict[str, Any], query: dict[str, Any]) -> Optional[float]:
+        """
+        Returns the score of the document or `None` if the document does not match the query.
+        """
+        if not query:
+            return 1.0
+        (query_type, body), = query.items()
+        source = document['_source']
+
+        if query_type == 'match_all':
+            return 1.0
+        if query_type == 'bool':
+            return self._score_bool(document, body)
+        if query_type == 'ids':
+            return 1.0 if document['_id'] in body['values'] else None
+        if query_type in ('term', 'terms'):
+            (field, expected), = body.items()
+            if query_type == 'term':
+                expected = [expected['value'] if isinstance(expected, dict) else expected]
+            values = [document['_id']] if field == '_id' else _field_values(source, field)
+            return 1.0 if any(value in expected for value in values) else None
+        if query_type in ('multi_match', 'query_string'):
+            return self._score_text(source, body)
+        if query_type == 'rank_feature':
+            return self._score_rank_feature(source, body)
+        if query_type == 'sltr':  # learning to rank needs the plugin
+            return 0.0
+
+        raise _api_error(elasticsearch.BadRequestError, 400, f'unsupported query type: {query_type}')
+
+    def _score_bool(self, document: dict[str, Any], body: dict[str, Any]) -> Optional[float]:
+        score = 0.0
+        for clause in body.get('must', []):
+            clause_score = self._score(document, clause)
+            if clause_score is None:
+                return None
+            score += clause_score
+        for clause in body.get('filter', []):
+            if self._score(document, clause) is None:
+                return None
+        for clause in body.get('must_not', []):
+            if self._score(document, clause) is not None:
+                return None
+
+        should_scores = [self._score(document, clause) for clause in body.get('should', [])]
+        matched_should = [clause_score for clause_score in should_scores if clause_score is not None]
+        if should_scores and not matched_should and 'must' not in body and 'filter' not in body:
+            return None
+        return score + sum(matched_should)
+
+    def _score_text(self, source: dict[str, Any], body: dict[str, Any]) -> Optional[float]:
+        """
+        Simplified full-text scoring: every query term found in a field scores the product of the term and field boosts;
+        `most_fields` sums the fields, the other types take the best field.
+        """
+        terms = []
+        for term, boost in QUERY_TERM_PATTERN.findall(body['query']):
+            terms.extend((token, float(boost) if boost else 1.0) for token in _tokens(term))
+
+        field_scores = []
+        for field in body.get('fields', ['*']):
+            field, field_boost = _parse_boost(field)
+            field_tokens = {token for value in _field_values(source, field) for token in _tokens(value)}
+            field_score = sum(boost for token, boost in terms if token in field_tokens) * field_boost
+            if field_score:
+                field_scores.append(field_score)
+
+        if not field_scores:
+            return None
+        return sum(field_scores) if body.get('type') == 'most_fields' else max(field_scores)
+
+    def _score_rank_feature(self, source: dict[str, Any], body: dict[str, Any]) -> Optional[float]:
+        """
+        The saturation function of Elasticsearch, `value / (value + pivot)`, with the pivot approximated
+        by the geometric mean of the field values.
+        """
+        field = body['field']
+        values = [value for value in _field_values(source, field) if isinstance(value, (int, float)) and value > 0]
+        if not values:
+            return None
+        pivot = self._pivot(field)
+        return values[0] / (values[0] + pivot) * body.get('boost', 1.0)
+
+    def _pivot(self, field: str) -> float:
+        if field not in self._pivots:
+            logs = [math.log(value)
+                    for document in self.documents
+                    for value in _field_values(document['_source'], field)[:1]
+                    if isinstance(value, (int, float)) and value > 0]
+            self._pivots[field] = math.exp(sum(logs) / len(logs)) if logs else 1.0
+        return self._pivots[field]
+
+    def _hit(
+            self,
+            document: dict[str, Any],
+            score: float,
+            source: Any,
+            fields: Optional[list[str]],
+            script_fields: Optional[dict[str, Any]],
+    ) -> dict[str, Any]:
+        hit = {'_index': self.index_name, '_id': document['_id'], '_score': score}
+
+        if source is True or source is None:
+            hit['_source'] = document['_source']
+        elif isinstance(source, dict):
+            hit['_source'] = _filter_source(document['_source'], source.get('includes', []))
+        elif isinstance(source, list):
+            hit['_source'] = _filter_source(document['_source'], source)
+
+        hit_fields = {}
+        for field in fields or []:
+            values = _field_values(document['_source'], field)
+            if values:
+                hit_fields[field] = values
+        for name, script_field in (script_fields or {}).items():
+            hit_fields[name] = self._run_script(document['_source'], script_field['script'])
+        if hit_fields:
+            hit['fields'] = hit_fields
+        return hit
+
+    def _run_script(self, source: dict[str, Any], script: dict[str, Any]) -> list[Any]:
+        """
+        Emulates the painless scripts of the matchers, which stream `data.names` with skip, limit and map,
+        or sample `params.max_sample_size` tokenized names with `params.seed`.
+        """
+        code = script['source']
+        params = script.get('params', {})
+        names = source.get('data', {}).get('names', [])
+
+        if 'params.max_sample_size' in code:
+            max_sample_size = params['max_sample_size']
+            if len(names) > max_sample_size:
+                names = random.Random(params['seed']).sample(names, max_sample_size)
+            return [name['tokenized_name'] for name in names]
+
+        if 'data.names.stream()' not in code:
+            raise _api_error(elasticsearch.BadRequestError, 400, f'unsupported script: {code.strip()[:100]}')
+        if skip := SKIP_PATTERN.search(code):
+            names = names[int(skip.group(1)):]
+        if limit := LIMIT_PATTERN.search(code):
+            names = names[:int(limit.group(1))]
+        if mapping := MAP_PATTERN.search(code):
+            names = [name[mapping.group(1)] for name in names]
+        return names
@@ -0,0 +1,77 @@
+"""
+Resident memory of the process, for reporting the memory used by the long operations (e.g. reloading the domains).
+"""
+from __future__ import annotations
+
+import os
+import resource
+import sys
+import threading
+from typing import Optional
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def rss_bytes() -> Optional[int]:
+    """
+    Returns the current resident set size of the process or `None` where it is not available (non-Linux).
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def max_rss_bytes() -> int:
+    """
+    Returns the high-water mark of the resident set size over the whole life of the process.
+    """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+class PeakRss:
+    """
+    Samples the resident set size in a background thread while in the context, to find the peak of an operation
+    (the high-water mark of the process cannot be reset).
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.before: Optional[int] = None
+        self.after: Optional[int] = None
+        self.peak: Optional[int] = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            self._update(rss_bytes())
+
+    def _update(self, rss: Optional[int]):
+        if rss is not None:
+            self.peak = rss if self.peak is None else max(self.peak, rss)
+
+    def __enter__(self) -> PeakRss:
+        self.before = rss_bytes()
+        self._update(self.before)
+        if self.before is not None:
+            self._thread = threading.Thread(target=self._sample, name='peak-rss', daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.after = rss_bytes()
+        self._update(self.after)
+
+    def stats(self) -> dict[str, Optional[int]]:
+        return {
+            'rss_before_bytes': self.before,
+            'rss_after_bytes': self.after,
+            'rss_peak_bytes': self.peak,
+            'max_rss_bytes': max_rss_bytes(),
+        }
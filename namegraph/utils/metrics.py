@@ -0,0 +1,190 @@
+"""
+In-process metrics exposed in the Prometheus text format.
+
+Recording a value only updates a few numbers under a lock, the text is rendered only when the metrics
+are scraped. The metrics are per process, so every worker of a multi-process server exposes its own.
+"""
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import Iterable
+import math
+import threading
+
+
+# in seconds; from sub-millisecond generators up to the slowest requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames: tuple[str, ...], labelvalues: tuple[str, ...], extra: str = '') -> str:
+    labels = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 registry: MetricsRegistry | None = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 registry: MetricsRegistry | None = None):
+        super().__init__(name, documentation, labelnames, registry)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        if amount == 0:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS, registry: MetricsRegistry | None = None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        # per labels: non-cumulative counts of the buckets (the last one is +Inf), sum
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            try:
+                counts, total = self._values[key]
+            except KeyError:
+                counts, total = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            counts[index] += 1
+            total[0] += value
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            counts, _ = self._values.get(self._key(labels), ([], [0.0]))
+            return sum(counts)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            values = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self.metrics:
+            raise ValueError(f'Metric {metric.name} is already registered')
+        self.metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """
+        Returns all the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        for metric in self.metrics.values():
+            metric.clear()
+
+
+REGISTRY = MetricsRegistry()
+
+PREPROCESSING_SECONDS = Histogram(
+    'namegraph_preprocessing_seconds', 'Time of the preprocessing stages of the input label', ['stage'])
+PREPROCESSING_CACHE_LOOKUPS = Counter(
+    'namegraph_preprocessing_cache_lookups_total', 'Lookups of the preprocessing outcome of the input label',
+    ['result'])
+PIPELINE_SECONDS = Histogram(
+    'namegraph_pipeline_seconds', 'Time spent generating and filtering suggestions of one pipeline application',
+    ['pipeline', 'generator'])
+FILTER_SECONDS = Histogram(
+    'namegraph_filter_seconds', 'Time spent in a filter during one pipeline application', ['filter'])
+SAMPLING_SECONDS = Histogram(
+    'namegraph_sampling_seconds', 'Time of the sampling loop of the MetaSampler', ['sorter'])
+ELASTICSEARCH_SECONDS = Histogram(
+    'namegraph_elasticsearch_seconds', 'Elasticsearch round trip time', ['operation'])
+DOMAINS_RELOAD_SECONDS = Histogram(
+    'namegraph_domains_reload_seconds', 'Time of reloading the domains and the structures derived from them',
+    ['changed'], buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+
+SUGGESTIONS_PRODUCED = Counter(
+    'namegraph_suggestions_produced_total', 'Suggestions produced by the generators', ['pipeline', 'generator'])
+SUGGESTIONS_FILTERED = Counter(
+    'namegraph_suggestions_filtered_total', 'Suggestions removed by the filters', ['filter'])
+SUGGESTIONS_DEDUPLICATED = Counter(
+    'namegraph_suggestions_deduplicated_total',
+    'Suggestions skipped by the sampler as duplicates, within the sampler or already sampled by another one',
+    ['reason'])
+SUGGESTIONS_NOT_ENS_NORMALIZED = Counter(
+    'namegraph_suggestions_not_ens_normalized_total', 'Suggestions rejected by the sampler as not ENS-normalized',
+    ['pipeline'])
+SUGGESTIONS_SAMPLED = Counter(
+    'namegraph_suggestions_sampled_total', 'Suggestions returned by the sampler', ['pipeline'])
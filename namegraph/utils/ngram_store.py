@@ -0,0 +1,149 @@
+"""
+Compiled n-gram model, memory-mapped from a binary snapshot, so that the worker processes share one copy of it
+in the page cache and no Python object is created per n-gram.
+
+The words are mapped to int ids by a hash table; the bigrams are sorted int64 keys (`id1 << 32 | id2`).
+Both have columns of values (e.g. counts and precomputed log probabilities), one per named section.
+
+Layout (see `snapshot`): JSON header with the word and bigram counts, the columns and the metadata, and the sections:
+`words` (UTF-8 words concatenated), `offsets` (uint32, words + 1), `table` and `hashes` (the hash table of the word
+ids), `bigrams` (int64 sorted keys), then `word.{column}` and `bigram.{column}` sections.
+"""
+from __future__ import annotations
+
+import zlib
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Callable, Sequence
+
+import numpy as np
+
+from namegraph.utils import snapshot
+from namegraph.utils.snapshot import EMPTY
+
+MAGIC = b'NGNG'
+VERSION = 1
+
+
+def bigram_key(id1: int, id2: int) -> int:
+    return id1 << 32 | id2
+
+
+class NgramStore:
+    def __init__(self, buffer):
+        self._buffer = buffer
+        self.header, sections = snapshot.unpack(buffer, MAGIC, VERSION, 'n-gram store')
+        # slicing the buffer is faster than slicing the memoryview
+        self._words_start = self.header['sections']['words'][0]
+        self._offsets = sections['offsets']
+        self._table = sections['table']
+        self._hashes = sections['hashes']
+        self._mask = len(self._table) - 1
+        self.bigrams = sections['bigrams']
+        self.word_columns = {name[len('word.'):]: section for name, section in sections.items()
+                             if name.startswith('word.')}
+        self.bigram_columns = {name[len('bigram.'):]: section for name, section in sections.items()
+                               if name.startswith('bigram.')}
+        self._bigrams_array = np.frombuffer(self.bigrams, dtype=np.int64)
+
+    @staticmethod
+    def build(
+            words: Sequence[str],
+            word_columns: dict[str, array],
+            bigrams: Sequence[tuple[int, int]],
+            bigram_columns: dict[str, array],
+            metadata: dict = None,
+    ) -> bytes:
+        """
+        Compiles the words with the values of the columns (in the order of the words) and the bigrams (pairs of
+        indices of the words) with the values of the columns (in the order of the bigrams) into a snapshot.
+        """
+        encoded = [word.encode('utf-8') for word in words]
+        if len(set(encoded)) != len(encoded):
+            raise ValueError('duplicate words in the n-gram store')
+        data = b''.join(encoded)
+        if len(data) >= 2 ** 32 or len(words) >= 2 ** 31:
+            raise ValueError('too many words for the n-gram store')
+        offsets = array('I', [0])
+        for word in encoded:
+            offsets.append(offsets[-1] + len(word))
+        table, hashes = snapshot.hash_table(encoded)
+
+        keys = np.array([bigram_key(id1, id2) for id1, id2 in bigrams], dtype=np.int64)
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        if len(keys) > 1 and (keys[1:] == keys[:-1]).any():
+            raise ValueError('duplicate bigrams in the n-gram store')
+
+        section_data = [('words', data, 'B'), ('offsets', offsets.tobytes(), 'I'), ('table', table.tobytes(), 'i'),
+                        ('hashes', hashes.tobytes(), 'I'), ('bigrams', keys.tobytes(), 'q')]
+        for name, values in word_columns.items():
+            if len(values) != len(words):
+                raise ValueError(f'column {name} does not match the words')
+            section_data.append((f'word.{name}', values.tobytes(), values.typecode))
+        for name, values in bigram_columns.items():
+            if len(values) != len(bigrams):
+                raise ValueError(f'column {name} does not match the bigrams')
+            ordered = np.frombuffer(values.tobytes(), dtype=values.typecode)[order]
+            section_data.append((f'bigram.{name}', ordered.tobytes(), values.typecode))
+
+        header = {'version': VERSION, 'words': len(words), 'bigrams': len(keys), 'metadata': metadata or {}}
+        return snapshot.pack(MAGIC, header, section_data)
+
+    @classmethod
+    def open(cls, path: Path) -> NgramStore:
+        return cls(snapshot.open_mmap(path))
+
+    @classmethod
+    def load_or_build(cls, path: Path, build: Callable[[], bytes]) -> NgramStore:
+        """
+        Maps the snapshot at `path`, building and writing it first if it does not exist.
+        """
+        return cls(snapshot.load_or_build(path, build))
+
+    @property
+    def metadata(self) -> dict:
+        return self.header['metadata']
+
+    def __len__(self) -> int:
+        return self.header['words']
+
+    def find(self, word: str) -> int:
+        """
+        Returns the id of the word or -1.
+        """
+        encoded = word.encode('utf-8')
+        word_hash = zlib.crc32(encoded)
+        table, hashes, mask = self._table, self._hashes, self._mask
+        buffer, start, offsets = self._buffer, self._words_start, self._offsets
+        slot = word_hash & mask
+        while (index := table[slot]) != EMPTY:
+            if hashes[slot] == word_hash and buffer[start + offsets[index]:start + offsets[index + 1]] == encoded:
+                return index
+            slot = (slot + 1) & mask
+        return EMPTY
+
+    def word(self, index: int) -> str:
+        start = self._words_start
+        return str(self._buffer[start + self._offsets[index]:start + self._offsets[index + 1]], 'utf-8')
+
+    def find_bigram(self, id1: int, id2: int) -> int:
+        """
+        Returns the index of the bigram of the word ids or -1.
+        """
+        key = bigram_key(id1, id2)
+        position = bisect_left(self.bigrams, key)
+        if position < len(self.bigrams) and self.bigrams[position] == key:
+            return position
+        return EMPTY
+
+    def find_bigrams(self, keys: np.ndarray) -> np.ndarray:
+        """
+        Returns the indices of the bigrams of the int64 keys, -1 for the missing ones.
+        """
+        positions = np.searchsorted(self._bigrams_array, keys)
+        found = np.zeros(len(keys), dtype=bool)
+        inside = positions < len(self._bigrams_array)
+        found[inside] = self._bigrams_array[positions[inside]] == keys[inside]
+        return np.where(found, positions, EMPTY)
@@ -1,23 +1,72 @@
-import collections
-import copy
 import json
-import math
+from array import array
 from typing import Optional, Dict, List
 
+import numpy as np
 from omegaconf import DictConfig
 
+from namegraph.utils.snapshot import EMPTY
+
+
+class NameIndex:
+    """
+    Index of the first names or the last names with their statistics per country in flat arrays.
+    The names are mapped to ids (their positions in `names`). The entries of a name are `starts[id]:starts[id + 1]`
+    of `countries` (ids), `ratios` (count of the name to the count of all the names of the country), `probs`
+    (the ratios weighted by the Internet users of the country), `males` and `females` (counts, 1 if missing).
+    """
+
+    def __init__(self, names: Dict[str, Dict[str, Dict[str, int]]], country_ids: Dict[str, int],
+                 country_counts: Dict[str, int], country_weights: np.ndarray):
+        # the names in the countries without statistics are never scored
+        self.names = [name for name, name_stats in names.items()
+                      if any(country in country_ids for country in name_stats)]
+        self.ids = {name: index for index, name in enumerate(self.names)}
+
+        starts = array('q', [0])
+        countries, ratios, males, females = array('q'), array('d'), array('q'), array('q')
+        for name in self.names:
+            for country, gender_counts in names[name].items():
+                if country not in country_ids:
+                    continue
+                countries.append(country_ids[country])
+                ratios.append(sum(gender_counts.values()) / country_counts[country])
+                males.append(gender_counts.get('M', 1))
+                females.append(gender_counts.get('F', 1))
+            starts.append(len(countries))
+        self.starts = starts
+        self.countries = np.frombuffer(countries, dtype=np.int64)
+        self.ratios = np.frombuffer(ratios, dtype=np.float64)
+        self.males = np.frombuffer(males, dtype=np.int64)
+        self.females = np.frombuffer(females, dtype=np.int64)
+        self.probs = self.ratios * country_weights[self.countries]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def find(self, name: str) -> int:
+        """
+        Returns the id of the name or -1.
+        """
+        return self.ids.get(name, EMPTY)
+
+    def __contains__(self, name) -> bool:
+        return name in self.ids
+
+    def entries(self, index: int) -> slice:
+        return slice(self.starts[index], self.starts[index + 1])
+
 
 class PersonNames:
     """
-    For each interpretation (tokenization) calculates probability of a person existence with given name per country. 
+    For each interpretation (tokenization) calculates probability of a person existence with given name per country.
     It is weighted by number of Internet users.
     We want also tokenizer - should it be the highest prob or sum of probs for given interpretation.
+    The names are compiled into indices (see `NameIndex`) and the probabilities of an interpretation are computed
+    for all its countries at once.
     """
 
     def __init__(self, config):
-        self.firstnames = json.load(
-            open(config.person_names.firstnames_path))  # json.load(open('s_firstnames_10k.json'))
-        self.lastnames = json.load(open(config.person_names.lastnames_path))  # json.load(open('s_lastnames_10k.json'))
         other = json.load(open(config.person_names.other_path))  # json.load(open('s_other_10k.json'))
         self.countries: Dict[str, int] = other['all']
         self.firstname_initials: Dict[str, Dict[str, int]] = other['firstname_initials']
@@ -31,6 +80,19 @@ class PersonNames:
         self.country_bonus = config.person_names.country_bonus  # if user country is provided then its score is multiplied by this value
         self.allow_cross_country = False
 
+        # countries with the names counts and the Internet users
+        self.country_names = [country for country in self.countries if country in self.country_stats]
+        self.country_ids = {country: index for index, country in enumerate(self.country_names)}
+        self._country_counts = np.array([self.countries[country] for country in self.country_names], dtype=np.int64)
+        self._weights = np.array([self.get_internet_users_weight(country) for country in self.country_names],
+                                 dtype=np.float64)
+        self._initial_counts_cache: Dict[tuple[bool, str], np.ndarray] = {}
+
+        self.firstnames = NameIndex(json.load(open(config.person_names.firstnames_path)), self.country_ids,
+                                    self.countries, self._weights)  # json.load(open('s_firstnames_10k.json'))
+        self.lastnames = NameIndex(json.load(open(config.person_names.lastnames_path)), self.country_ids,
+                                   self.countries, self._weights)  # json.load(open('s_lastnames_10k.json'))
+
     def print_missing_countries(self):
         for country, stats in sorted(self.country_stats.items(), key=lambda x: x[1][0], reverse=True):
             if country not in self.countries:
@@ -56,129 +118,118 @@ class PersonNames:
         except:
             return None
 
-    def single_name(self, name: str, name_stats: Dict[str, Dict[str, int]]) -> Dict:
-        name_prob = {
-            country: sum(gender_counts.values()) / self.countries[country] * self.get_internet_users_weight(country)
-            for country, gender_counts in name_stats.items()}
-
-        genders = {}
-        for country, gender_counts in name_stats.items():
-            m = gender_counts.get('M', 1)
-            f = gender_counts.get('F', 1)
-            genders[country] = {'M': m / (m + f), 'F': f / (m + f)}
-
-        interpretation = {}
-        interpretation['names'] = [name_stats]
-        interpretation['prob'] = name_prob
-        interpretation['tokenization'] = (name,)
-        interpretation['genders'] = genders
-        return interpretation
-
-    def name_with_initial(self, name: str, initial: str, name_stats: Dict[str, Dict[str, int]], initial_firstname: bool,
+    def _initial_counts(self, initial: str, initial_firstname: bool) -> np.ndarray:
+        key = (initial_firstname, initial)
+        if key not in self._initial_counts_cache:
+            initials = self.firstname_initials if initial_firstname else self.lastname_initials
+            self._initial_counts_cache[key] = np.array(
+                [initials.get(country, {}).get(initial, 1) for country in self.country_names], dtype=np.int64)
+        return self._initial_counts_cache[key]
+
+    def single_name(self, name: str, index: NameIndex, name_id: int) -> Dict:
+        entries = index.entries(name_id)
+        countries = index.countries[entries]
+        return {
+            'tokenization': (name,),
+            'countries': countries,
+            'prob': index.probs[entries],
+            'males': index.males[entries],
+            'females': index.females[entries],
+        }
+
+    def name_with_initial(self, name: str, initial: str, index: NameIndex, name_id: int, initial_firstname: bool,
                           initial_first: bool) -> Dict:
-        name_prob = {
-            country: sum(gender_counts.values()) / self.countries[country] *
-                     (self.firstname_initials[country].get(initial, 1) if initial_firstname else
-                      self.lastname_initials[country].get(initial, 1)) /
-                     self.countries[country] * self.get_internet_users_weight(country) for country, gender_counts in
-            name_stats.items()}
-
-        genders = {}
-        for country, gender_counts in name_stats.items():
-            m = gender_counts.get('M', 1)
-            f = gender_counts.get('F', 1)
-            genders[country] = {'M': m / (m + f), 'F': f / (m + f)}
-
-        interpretation = {}
-        if initial_first:
-            interpretation['tokenization'] = (initial, name)
+        entries = index.entries(name_id)
+        countries = index.countries[entries]
+        initial_counts = self._initial_counts(initial, initial_firstname)
+        return {
+            'tokenization': (initial, name) if initial_first else (name, initial),
+            'countries': countries,
+            'prob': index.ratios[entries] * initial_counts[countries] / self._country_counts[countries]
+                    * self._weights[countries],
+            'males': index.males[entries],
+            'females': index.females[entries],
+        }
+
+    def two_names(self, name1: str, name2: str, index1: NameIndex, name1_id: int, index2: NameIndex,
+                  name2_id: int) -> Dict:
+        entries1, entries2 = index1.entries(name1_id), index2.entries(name2_id)
+        countries1, countries2 = index1.countries[entries1], index2.countries[entries2]
+        ratios1, ratios2 = index1.ratios[entries1], index2.ratios[entries2]
+        males1, males2 = index1.males[entries1], index2.males[entries2]
+        females1, females2 = index1.females[entries1], index2.females[entries2]
+
+        if not self.allow_cross_country:
+            countries, positions1, positions2 = np.intersect1d(countries1, countries2, assume_unique=True,
+                                                               return_indices=True)
+            probs = ratios1[positions1] * ratios2[positions2]
+            males = males1[positions1] * males2[positions2]
+            females = females1[positions1] * females2[positions2]
         else:
-            interpretation['tokenization'] = (name, initial)
-
-        interpretation['names'] = [name_stats]
-        interpretation['prob'] = name_prob
-        interpretation['genders'] = genders
-        return interpretation
-
-    def two_names(self, name1: str, name2: str, name1_stats: Dict[str, Dict[str, int]],
-                  name2_stats: Dict[str, Dict[str, int]]) -> Dict:
-        name1_prob = {country: sum(gender_counts.values()) / self.countries[country] for
-                      country, gender_counts in name1_stats.items()}
-        name2_prob = {country: sum(gender_counts.values()) / self.countries[country] for
-                      country, gender_counts in name2_stats.items()}
-        interpretation = {}
-        interpretation['names'] = [name1_stats, name2_stats]
-        interpretation['tokenization'] = (name1, name2)
-
-        probs = collections.defaultdict(list)
-        probs2 = {}
-        genders = {}
-        for name_prob in [name1_prob, name2_prob]:
-            for country, prob in name_prob.items():
-                probs[country].append(prob)
-        for country, probs in probs.items():
-            if len(probs) == 1:
-                if not self.allow_cross_country: continue
-                probs.append(1 / self.countries[country])
-            probs2[country] = math.prod(probs)
-            probs2[country] *= self.get_internet_users_weight(country)
-
-            m = name1_stats.get(country, {}).get('M', 1) * name2_stats.get(country, {}).get('M', 1)
-            f = name1_stats.get(country, {}).get('F', 1) * name2_stats.get(country, {}).get('F', 1)
-            genders[country] = {'M': m / (m + f), 'F': f / (m + f)}
-        interpretation['prob'] = probs2
-        interpretation['genders'] = genders
-
-        return interpretation
+            # a name missing in a country counts as a name seen once there
+            countries = np.union1d(countries1, countries2)
+            in1, in2 = np.isin(countries, countries1), np.isin(countries, countries2)
+            order1, order2 = np.argsort(countries1), np.argsort(countries2)
+            ratio1, ratio2 = np.zeros(len(countries)), np.zeros(len(countries))
+            ratio1[in1], ratio2[in2] = ratios1[order1], ratios2[order2]
+            missing = 1 / self._country_counts[countries]
+            probs = np.where(in1, ratio1, ratio2) * np.where(in1 & in2, ratio2, missing)
+            males, females = np.ones(len(countries), dtype=np.int64), np.ones(len(countries), dtype=np.int64)
+            males[in1] *= males1[order1]
+            males[in2] *= males2[order2]
+            females[in1] *= females1[order1]
+            females[in2] *= females2[order2]
+
+        return {
+            'tokenization': (name1, name2),
+            'countries': countries,
+            'prob': probs * self._weights[countries],
+            'males': males,
+            'females': females,
+        }
 
     def anal(self, input_name: str) -> List[Dict]:
+        """
+        Returns the interpretations of the input with the ids of their countries and the probabilities
+        and the gender counts in these countries (arrays).
+        """
         interpretations = []
         # only one name
-        name_stats = copy.copy(self.firstnames.get(input_name, None))
-        if name_stats:
-            interpretation = self.single_name(input_name, name_stats)
-            interpretation['type'] = 'first'
-            interpretations.append(interpretation)
-
-        name_stats = copy.copy(self.lastnames.get(input_name, None))
-        if name_stats:
-            interpretation = self.single_name(input_name, name_stats)
-            interpretation['type'] = 'last'
-            interpretations.append(interpretation)
+        for index, name_type in [(self.firstnames, 'first'), (self.lastnames, 'last')]:
+            name_id = index.find(input_name)
+            if name_id != EMPTY:
+                interpretation = self.single_name(input_name, index, name_id)
+                interpretation['type'] = name_type
+                interpretations.append(interpretation)
 
         # one name with initial
         for name, initial, initial_first in [(input_name[1:], input_name[:1], True),
                                              (input_name[:-1], input_name[-1:], False)]:
             if not initial or not name: continue
-            name_stats = copy.copy(self.firstnames.get(name, None))
-            if name_stats:
-                interpretation = self.name_with_initial(name, initial, name_stats, initial_firstname=False,
-                                                        initial_first=initial_first)
-                interpretation['type'] = 'first with initial'
-                interpretations.append(interpretation)
-
-            name_stats = copy.copy(self.lastnames.get(name, None))
-            if name_stats:
-                interpretation = self.name_with_initial(name, initial, name_stats, initial_firstname=True,
-                                                        initial_first=initial_first)
-                interpretation['type'] = 'last with initial'
-                interpretations.append(interpretation)
+            for index, name_type, initial_firstname in [(self.firstnames, 'first with initial', False),
+                                                        (self.lastnames, 'last with initial', True)]:
+                name_id = index.find(name)
+                if name_id != EMPTY:
+                    interpretation = self.name_with_initial(name, initial, index, name_id,
+                                                            initial_firstname=initial_firstname,
+                                                            initial_first=initial_first)
+                    interpretation['type'] = name_type
+                    interpretations.append(interpretation)
 
         # two names
+        first_ids, last_ids = self.firstnames.ids, self.lastnames.ids
         for i in range(1, len(input_name)):
             name1 = input_name[:i]
             name2 = input_name[i:]
-            name1_result = copy.copy(self.firstnames.get(name1, None))
-            name2_result = copy.copy(self.lastnames.get(name2, None))
-            if name1_result and name2_result:
-                interpretation = self.two_names(name1, name2, name1_result, name2_result)
+            if name1 in first_ids and name2 in last_ids:
+                interpretation = self.two_names(name1, name2, self.firstnames, first_ids[name1], self.lastnames,
+                                                last_ids[name2])
                 interpretation['type'] = 'first last'
                 interpretations.append(interpretation)
 
-            name1_result = copy.copy(self.lastnames.get(name1, None))
-            name2_result = copy.copy(self.firstnames.get(name2, None))
-            if name1_result and name2_result:
-                interpretation = self.two_names(name1, name2, name1_result, name2_result)
+            if name1 in last_ids and name2 in first_ids:
+                interpretation = self.two_names(name1, name2, self.lastnames, last_ids[name1], self.firstnames,
+                                                first_ids[name2])
                 interpretation['type'] = 'last first'
                 interpretations.append(interpretation)
 
@@ -187,60 +238,45 @@ class PersonNames:
     def tokenize(self, input_name: str, user_country: str = None, topn: int = 1) -> List[
         tuple[float, str, tuple[str, ...], List[str], Dict[str, float]]]:
         """Return best country interpretation."""
-        all_interpretations = self.score(input_name, user_country)
-
-        return all_interpretations[:topn]
+        return self._rank(input_name, user_country, topn)
 
     def score(self, input_name: str, user_country: str = None) -> List[
         tuple[float, str, tuple[str, ...], List[str], Dict[str, float]]]:
         """Return best interpretation."""
+        return self._rank(input_name, user_country)
+
+    def _rank(self, input_name: str, user_country: str = None, topn: int = None) -> List[
+        tuple[float, str, tuple[str, ...], List[str], Dict[str, float]]]:
         interpretations = self.anal(input_name)
+        if not interpretations:
+            return []
+
+        lengths = [len(r['countries']) for r in interpretations]
+        owners = np.repeat(np.arange(len(interpretations)), lengths)
+        countries = np.concatenate([r['countries'] for r in interpretations])
+        probs = np.concatenate([r['prob'] for r in interpretations])
+        if user_country in self.country_ids:
+            bonus = countries == self.country_ids[user_country]
+            probs[bonus] = probs[bonus] * self.country_bonus
+
+        # only the entries which can be in the top n (including ties) are sorted
+        if topn is not None and 0 < topn < len(probs):
+            threshold = np.partition(probs, len(probs) - topn)[len(probs) - topn]
+            positions = np.flatnonzero(probs >= threshold)
+        else:
+            positions = np.arange(len(probs))
 
+        males = np.concatenate([r['males'] for r in interpretations])[positions].tolist()
+        females = np.concatenate([r['females'] for r in interpretations])[positions].tolist()
         all_interpretations = []
-        for r in interpretations:
-            if user_country in r['prob']:
-                r['prob'][user_country] = r['prob'][user_country] * self.country_bonus
-
-            for country, prob in r['prob'].items():
-                all_interpretations.append(
-                    (prob, country, r['tokenization'], r['type'], r['genders'].get(country, None)))
-
-        return sorted(all_interpretations, reverse=True)
-
-    def verbose(self, input_name):
-        results = self.anal(input_name)
-
-        for r in results:
-            score = math.prod([sum(result['gender'].values()) for result in r['names']])
-            print([result['name'] for result in r['names']], [result['type'] for result in r['names']])
-            print(score, score ** (1 / len(r)), r['names'])
-
-            for result in r['names']:
-                best_probs = sorted(result['prob'].items(), key=lambda x: x[1], reverse=True)[:5]
-                print(result['name'])
-                print(best_probs)
-
-            # wymnoz gendery i kraje
-            countries = collections.defaultdict(lambda: 1)
-            genders = collections.defaultdict(lambda: 1)
-            probs = collections.defaultdict(lambda: 1)
-            for result in r['names']:
-                for country, count in result['country'].items():
-                    countries[country] *= count
-                for gender, count in result['gender'].items():
-                    genders[gender] *= count
-                for country, count in result['prob'].items():
-                    probs[country] *= count
-            # TODO srednia geometryczna
-            country = sorted(countries.items(), key=lambda x: x[1], reverse=True)[:1]
-            print('Country', country)
-            gender = sorted(genders.items(), key=lambda x: x[1], reverse=True)[:1]
-            print('Gender', gender)
-            probs = sorted(probs.items(), key=lambda x: x[1], reverse=True)[:1]
-            print('Prob', probs)
-            probs2 = sorted(r['prob'].items(), key=lambda x: x[1], reverse=True)[:3]
-            print('Prob2', probs2)
-            print()
+        for prob, country, owner, m, f in zip(probs[positions].tolist(), countries[positions].tolist(),
+                                              owners[positions].tolist(), males, females):
+            r = interpretations[owner]
+            all_interpretations.append((prob, self.country_names[country], r['tokenization'], r['type'],
+                                        {'M': m / (m + f), 'F': f / (m + f)}))
+
+        all_interpretations.sort(reverse=True)
+        return all_interpretations[:topn]
 
 
 if __name__ == "__main__":
@@ -252,6 +288,5 @@ if __name__ == "__main__":
         r1 = pn.tokenize(name)
         print(name, r1)
         # print(pn.score(name))
-        # pn.verbose(name)
         # except:
         #     print('NOT_NAME', name)
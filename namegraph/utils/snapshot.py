@@ -0,0 +1,161 @@
+"""
+Binary snapshots of the compiled stores, memory-mapped on load: magic, header length, JSON header (with the version
+and the sections), then the 8-byte aligned sections, each an array of one type (see `array` typecodes).
+The stores made of several arrays (e.g. the suffix array) are directories of files, written with `save_dir`.
+"""
+from __future__ import annotations
+
+import fcntl
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+EMPTY = -1
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) // 8 * 8
+
+
+def pack(magic: bytes, header: dict, section_data: Iterable[tuple[str, bytes, str]]) -> bytes:
+    """
+    Lays out the sections (name, data, typecode) after the header, which gets their positions in `sections`.
+    """
+    section_data = list(section_data)
+
+    def header_bytes(sections: dict) -> bytes:
+        return json.dumps({**header, 'sections': sections}).encode('utf-8')
+
+    # the header length depends on the offsets of the sections, which depend on the header length
+    sections = {name: (0, len(data), typecode) for name, data, typecode in section_data}
+    while True:
+        offset = _align(8 + len(header_bytes(sections)))
+        placed = {}
+        for name, data, typecode in section_data:
+            placed[name] = (offset, len(data), typecode)
+            offset = _align(offset + len(data))
+        if placed == sections:
+            break
+        sections = placed
+
+    encoded_header = header_bytes(sections)
+    snapshot = bytearray(offset)
+    snapshot[:4] = magic
+    struct.pack_into('<I', snapshot, 4, len(encoded_header))
+    snapshot[8:8 + len(encoded_header)] = encoded_header
+    for name, data, _ in section_data:
+        start, length, _ = sections[name]
+        snapshot[start:start + length] = data
+    return bytes(snapshot)
+
+
+def hash_table(keys: list[bytes]) -> tuple[array, array]:
+    """
+    Open addressing hash table of the indices of the keys, keyed by CRC32 of the key (-1 is empty), with the hash
+    of the key in every slot (so that only the keys with the same hash are compared). The size is a power of 2.
+    """
+    size = 8
+    while size < 2 * len(keys):
+        size *= 2
+    table = array('i', [EMPTY]) * size
+    hashes = array('I', [0]) * size
+    mask = size - 1
+    for index, key in enumerate(keys):
+        key_hash = zlib.crc32(key)
+        slot = key_hash & mask
+        while table[slot] != EMPTY:
+            slot = (slot + 1) & mask
+        table[slot] = index
+        hashes[slot] = key_hash
+    return table, hashes
+
+
+def unpack(buffer, magic: bytes, version: int, kind: str) -> tuple[dict, dict[str, memoryview]]:
+    """
+    Returns the header and the sections of the snapshot, cast to their types (the byte sections are left as is).
+    """
+    view = memoryview(buffer)
+    if bytes(view[:4]) != magic:
+        raise ValueError(f'not a {kind} snapshot')
+    header_length, = struct.unpack_from('<I', view, 4)
+    header = json.loads(bytes(view[8:8 + header_length]))
+    if header['version'] != version:
+        raise ValueError(f'unsupported {kind} version: {header["version"]}')
+
+    sections = {}
+    for name, (start, length, typecode) in header['sections'].items():
+        sections[name] = view[start:start + length].cast(typecode) if typecode != 'B' else view[start:start + length]
+    return header, sections
+
+
+def open_mmap(path: Path) -> mmap.mmap:
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def lock_path(path: Path) -> Path:
+    return path.with_name(path.name + '.lock')
+
+
+@contextmanager
+def build_lock(path: Path) -> Iterator[None]:
+    """
+    Holds an exclusive lock on `<path>.lock` while the snapshot at `path` is built, so that of the processes
+    starting at the same time one builds it and the other ones wait for it (instead of all building it at once).
+    """
+    os.makedirs(path.parent, exist_ok=True)
+    with open(lock_path(path), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def load_or_build(path: Path, build: Callable[[], bytes]) -> mmap.mmap:
+    """
+    Maps the snapshot at `path`, building and writing it first if it does not exist (see `build_lock`).
+    The snapshot is written to a temporary file and renamed, so no process ever reads a partial one.
+    """
+    if not path.exists():
+        with build_lock(path):
+            if not path.exists():  # not built by another process meanwhile
+                snapshot = build()
+                with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name, suffix='.tmp',
+                                                 delete=False) as f:
+                    f.write(snapshot)
+                os.chmod(f.name, 0o644)
+                os.replace(f.name, path)
+    return open_mmap(path)
+
+
+def save_dir(path: Path, write: Callable[[Path], None]) -> None:
+    """
+    Writes the files (with `write`, given the directory) to a temporary directory renamed to `path`,
+    so a partial one is never loaded. If another process renamed its directory first, that one is kept.
+    """
+    os.makedirs(path.parent, exist_ok=True)
+    tmp_path = Path(tempfile.mkdtemp(dir=path.parent, prefix=path.name, suffix='.tmp'))
+    try:
+        write(tmp_path)
+        os.chmod(tmp_path, 0o755)
+        os.rename(tmp_path, path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not path.exists():
+            raise
+
+
+def load_or_build_dir(path: Path, write: Callable[[Path], None]) -> None:
+    """
+    Builds the directory at `path` with `write` (see `save_dir`), if it does not exist (see `build_lock`).
+    """
+    if not path.exists():
+        with build_lock(path):
+            if not path.exists():  # not built by another process meanwhile
+                save_dir(path, write)
@@ -0,0 +1,249 @@
+"""
+Compiled store of name statuses and scores, memory-mapped from a binary snapshot, so that the worker processes
+share one copy of it in the page cache and no Python object is created per name.
+
+Layout (see `snapshot`): JSON header with the entry count and the status groups, and the sections:
+`names` (UTF-8 names concatenated), `offsets` (uint32, n + 1), `statuses` (uint8), `scores` (float32),
+`table` (int32 open addressing hash table of the entry indices, keyed by CRC32 of the name, -1 is empty),
+`hashes` (uint32 CRC32 of the name in every slot, so that only the names with the same hash are compared),
+and one int32 section of entry indices per named subset. Entries are grouped by status, so a status is a range.
+"""
+from __future__ import annotations
+
+import zlib
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, ItemsView, Iterator, MutableMapping, Set
+from pathlib import Path
+from typing import Callable, Optional
+
+from namegraph.utils import snapshot
+from namegraph.utils.snapshot import EMPTY
+
+MAGIC = b'NGSS'
+VERSION = 3
+
+
+class StatusStore:
+    def __init__(self, buffer):
+        self._buffer = buffer
+        self.header, sections = snapshot.unpack(buffer, MAGIC, VERSION, 'status store')
+        self._names = sections.pop('names')
+        # slicing the buffer is faster than slicing the memoryview
+        self._names_start = self.header['sections']['names'][0]
+        self._offsets = sections.pop('offsets')
+        self._statuses = sections.pop('statuses')
+        self._scores = sections.pop('scores')
+        self._table = sections.pop('table')
+        self._hashes = sections.pop('hashes')
+        self._mask = len(self._table) - 1
+        self._subsets = sections
+        self.groups: dict[int, range] = {int(status): range(start, stop)
+                                         for status, (start, stop) in self.header['groups'].items()}
+
+    @staticmethod
+    def build(
+            entries: Iterable[tuple[str, int, float]],
+            subsets: Optional[dict[str, Iterable[tuple[str, int]]]] = None,
+            metadata: Optional[dict] = None,
+    ) -> bytes:
+        """
+        Compiles the entries (name, status, score) into a snapshot. A name can have entries with different statuses.
+        `subsets` are named subsets of the entries, given as (name, status), kept in the order of the entries.
+        """
+        entries = sorted(entries, key=lambda entry: entry[1])  # stable, keeps the order within a status
+        n = len(entries)
+
+        encoded = [name.encode('utf-8') for name, _, _ in entries]
+        names = b''.join(encoded)
+        if len(names) >= 2 ** 32:
+            raise ValueError('names too long for the status store')
+        offsets = array('I', [0])
+        for name in encoded:
+            offsets.append(offsets[-1] + len(name))
+        statuses = bytes(status for _, status, _ in entries)
+        scores = array('f', (score for _, _, score in entries))
+
+        table, hashes = snapshot.hash_table(encoded)
+
+        index_of = {(name, status): index for index, (name, status, _) in enumerate(entries)}
+        subset_arrays = {subset: array('i', sorted(index_of[entry] for entry in subset_entries))
+                         for subset, subset_entries in (subsets or {}).items()}
+
+        groups = {}
+        for index, (_, status, _) in enumerate(entries):
+            start, _ = groups.get(status, (index, index))
+            groups[status] = (start, index + 1)
+
+        section_data = [('names', names, 'B'), ('offsets', offsets.tobytes(), 'I'), ('statuses', statuses, 'B'),
+                        ('scores', scores.tobytes(), 'f'), ('table', table.tobytes(), 'i'),
+                        ('hashes', hashes.tobytes(), 'I')]
+        section_data += [(subset, indices.tobytes(), 'i') for subset, indices in subset_arrays.items()]
+
+        header = {'version': VERSION, 'entries': n, 'groups': groups, 'metadata': metadata or {}}
+        return snapshot.pack(MAGIC, header, section_data)
+
+    @classmethod
+    def open(cls, path: Path) -> StatusStore:
+        return cls(snapshot.open_mmap(path))
+
+    @classmethod
+    def load_or_build(cls, path: Path, build: Callable[[], bytes]) -> StatusStore:
+        """
+        Maps the snapshot at `path`, building and writing it first if it does not exist.
+        """
+        return cls(snapshot.load_or_build(path, build))
+
+    def __len__(self) -> int:
+        return self.header['entries']
+
+    def find(self, name: str, status: Optional[int] = None) -> int:
+        """
+        Returns the index of the entry of the name (with the status, if given) or -1.
+        """
+        encoded = name.encode('utf-8')
+        name_hash = zlib.crc32(encoded)
+        table, hashes, mask = self._table, self._hashes, self._mask
+        buffer, start, offsets, statuses = self._buffer, self._names_start, self._offsets, self._statuses
+        slot = name_hash & mask
+        while (index := table[slot]) != EMPTY:
+            if hashes[slot] == name_hash and (status is None or statuses[index] == status) \
+                    and buffer[start + offsets[index]:start + offsets[index + 1]] == encoded:
+                return index
+            slot = (slot + 1) & mask
+        return EMPTY
+
+    def status_mask(self, name: str) -> int:
+        """
+        Returns the statuses of all the entries of the name as a bit mask (bit `1 << status` per entry).
+        """
+        encoded = name.encode('utf-8')
+        name_hash = zlib.crc32(encoded)
+        table, hashes, mask = self._table, self._hashes, self._mask
+        found = 0
+        slot = name_hash & mask
+        while (index := table[slot]) != EMPTY:
+            if hashes[slot] == name_hash:
+                start, offsets = self._names_start, self._offsets
+                if self._buffer[start + offsets[index]:start + offsets[index + 1]] == encoded:
+                    found |= 1 << self._statuses[index]
+            slot = (slot + 1) & mask
+        return found
+
+    def name(self, index: int) -> str:
+        return str(self._names[self._offsets[index]:self._offsets[index + 1]], 'utf-8')
+
+    def names(self, indices: range) -> list[str]:
+        """
+        Decodes the names of a range of entries, e.g. of a status group, at once.
+        """
+        if not indices:
+            return []
+        offsets = self._offsets
+        first = offsets[indices.start]
+        data = bytes(self._names[first:offsets[indices.stop]])
+        text = str(data, 'utf-8')
+        bounds = [offset - first for offset in offsets[indices.start:indices.stop + 1]]
+        if len(text) == len(data):  # ASCII, the byte offsets are the character offsets
+            return [text[start:stop] for start, stop in zip(bounds, bounds[1:])]
+        return [str(data[start:stop], 'utf-8') for start, stop in zip(bounds, bounds[1:])]
+
+    def status(self, index: int) -> int:
+        return self._statuses[index]
+
+    def score(self, index: int) -> float:
+        return self._scores[index]
+
+    def subset(self, subset: str) -> memoryview:
+        return self._subsets[subset]
+
+    def group(self, status: int) -> range:
+        return self.groups.get(status, range(0))
+
+
+class StatusMapping(MutableMapping):
+    """
+    Dict-like view of the names with the given status, or of a subset of them, mapping the names to their scores.
+    Names set in the process (e.g. in the tests) are kept in a regular dict on top of the store,
+    `on_change` is called with the name after it is set or deleted.
+    """
+
+    def __init__(self, store: StatusStore, status: Optional[int], subset: Optional[str] = None,
+                 on_change: Optional[Callable[[str], None]] = None):
+        self.store = store
+        self.status = status
+        self.subset = subset
+        self.on_change = on_change
+        self.added: dict[str, float] = {}
+        self._indices = store.subset(subset) if subset is not None else store.group(status)
+
+    def _index(self, name: str) -> int:
+        index = self.store.find(name, self.status)
+        if index == EMPTY or (self.subset is not None and not self._in_subset(index)):
+            return EMPTY
+        return index
+
+    def _in_subset(self, index: int) -> bool:
+        position = bisect_left(self._indices, index)
+        return position < len(self._indices) and self._indices[position] == index
+
+    def __getitem__(self, name: str) -> float:
+        if name in self.added:
+            return self.added[name]
+        index = self._index(name)
+        if index == EMPTY:
+            raise KeyError(name)
+        return self.store.score(index)
+
+    def __contains__(self, name) -> bool:
+        return name in self.added or self._index(name) != EMPTY
+
+    def __setitem__(self, name: str, score: float) -> None:
+        self.added[name] = score
+        if self.on_change is not None:
+            self.on_change(name)
+
+    def __delitem__(self, name: str) -> None:
+        del self.added[name]
+        if self.on_change is not None:
+            self.on_change(name)
+
+    def __iter__(self) -> Iterator[str]:
+        for name, _ in self._iter_items():
+            yield name
+
+    def _iter_items(self) -> Iterator[tuple[str, float]]:
+        for index in self._indices:
+            name = self.store.name(index)
+            if name not in self.added:
+                yield name, self.store.score(index)
+        yield from self.added.items()
+
+    def items(self) -> ItemsView:
+        return _ItemsView(self)
+
+    def __len__(self) -> int:
+        return len(self._indices) + sum(1 for name in self.added if self._index(name) == EMPTY)
+
+
+class _ItemsView(ItemsView):
+    def __iter__(self) -> Iterator[tuple[str, float]]:
+        return self._mapping._iter_items()
+
+
+class NameSet(Set):
+    """
+    Set-like view of a subset of the names in the store.
+    """
+
+    def __init__(self, store: StatusStore, subset: str):
+        self._names = StatusMapping(store, status=None, subset=subset)
+
+    def __contains__(self, name) -> bool:
+        return name in self._names
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
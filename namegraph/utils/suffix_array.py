@@ -0,0 +1,156 @@
+"""
+Suffix array over a list of names, for finding the names containing a substring. The names are kept in the
+given order (e.g. by score) and the matches are returned in that order.
+
+The text is the UTF-8 encoded names, each preceded by a newline (and one at the end), so the comparisons of bytes
+agree with the order of the code points and no character needs escaping. Only the suffixes starting at
+a character (not at a UTF-8 continuation byte) are indexed. Stored as a directory, memory-mapped on load:
+`text.bin` (the text), `sa.npy` (int32 positions of the suffixes in the sorted order), `names.npy` (int32 index
+of the name of every suffix) and `starts.npy` (int32 position of every name and the end of the text).
+"""
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+import numpy as np
+
+from namegraph.utils import snapshot
+
+VERSION = 1
+SEPARATOR = b'\n'
+
+
+def _suffix_array(codes: np.ndarray, positions: np.ndarray, max_length: int) -> np.ndarray:
+    """
+    Sorts the suffixes starting at `positions` by prefix doubling. `codes` are the ranks of the symbols;
+    every separator has its own rank, so two suffixes differ within `max_length` symbols (up to a separator).
+    """
+    n = len(codes)
+    rank = codes.astype(np.int64)
+    length = 1  # the ranks order the suffixes by their first `length` symbols
+    while length < max_length:
+        following = np.zeros(n, dtype=np.int64)
+        following[:n - length] = rank[length:] + 1
+        key = rank * (int(rank.max()) + 2) + following
+        order = np.argsort(key, kind='stable')
+        sorted_key = key[order]
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = np.concatenate(([0], np.cumsum(sorted_key[1:] != sorted_key[:-1])))
+        length *= 2
+
+    return positions[np.argsort(rank[positions], kind='stable')]
+
+
+class SuffixArray:
+    def __init__(self, text, sa: np.ndarray, names: np.ndarray, starts: np.ndarray):
+        self.text = text
+        self.sa = sa
+        self.names = names
+        self.starts = starts
+
+    def __len__(self) -> int:
+        return len(self.starts) - 1
+
+    @classmethod
+    def build(cls, names: Iterable[str]) -> SuffixArray:
+        encoded = [name.encode('utf-8') for name in names]
+        text = SEPARATOR + SEPARATOR.join(encoded) + SEPARATOR
+        data = np.frombuffer(text, dtype=np.uint8)
+
+        separators = np.flatnonzero(data == SEPARATOR[0])
+        starts = (separators + 1).astype(np.int32)
+        starts[-1] = len(text)
+
+        # symbols below the separator keep their byte value, every separator gets its own rank above them
+        # and the symbols above the separator are shifted above the ranks of the separators
+        codes = data.astype(np.int64)
+        codes[data > SEPARATOR[0]] += len(separators)
+        codes[separators] = SEPARATOR[0] + np.arange(len(separators))
+
+        # suffixes at the characters of the names, excluding the continuation bytes and the separators
+        positions = np.flatnonzero(((data & 0xC0) != 0x80) & (data != SEPARATOR[0]))
+        max_length = int(np.diff(separators).max()) if len(separators) > 1 else 1
+        sa = _suffix_array(codes, positions, max_length).astype(np.int32)
+        suffix_names = (np.searchsorted(starts, sa, side='right') - 1).astype(np.int32)
+        return cls(text, sa, suffix_names, starts)
+
+    def write(self, directory: Path) -> None:
+        with open(directory / 'text.bin', 'wb') as f:
+            f.write(self.text)
+        for name in ('sa', 'names', 'starts'):
+            np.save(directory / f'{name}.npy', getattr(self, name))
+
+    def save(self, path: Path) -> None:
+        snapshot.save_dir(path, self.write)
+
+    @classmethod
+    def open(cls, path: Path) -> SuffixArray:
+        text = snapshot.open_mmap(path / 'text.bin')
+        return cls(text, *(np.load(path / f'{name}.npy', mmap_mode='r') for name in ('sa', 'names', 'starts')))
+
+    @classmethod
+    def load_or_build(cls, path: Path, names: Callable[[], Iterable[str]]) -> SuffixArray:
+        snapshot.load_or_build_dir(path, lambda directory: cls.build(names()).write(directory))
+        return cls.open(path)
+
+    def name(self, index: int) -> str:
+        return self.text[int(self.starts[index]):int(self.starts[index + 1]) - 1].decode('utf-8')
+
+    def _bound(self, pattern: bytes, upper: bool) -> int:
+        text, sa, length = self.text, self.sa, len(pattern)
+        lo, hi = 0, len(sa)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = int(sa[mid])
+            prefix = text[start:start + length]
+            if prefix < pattern or (upper and prefix == pattern):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find_range(self, pattern: str) -> tuple[int, int]:
+        """
+        Returns the range of the suffix array of the suffixes starting with the pattern.
+        """
+        encoded = pattern.encode('utf-8')
+        return self._bound(encoded, upper=False), self._bound(encoded, upper=True)
+
+    def find(self, pattern: str, batch: int = 100) -> Iterator[str]:
+        """
+        Yields the names containing the pattern in the order of the names, lazily: the indices of the names
+        are selected in growing windows, each expected to hold about `batch` matches.
+        """
+        return (self.name(index) for index in self.find_indices(pattern, batch))
+
+    def find_indices(self, pattern: str, batch: int = 100) -> Iterator[int]:
+        if not pattern or SEPARATOR.decode() in pattern:
+            return
+        start, end = self.find_range(pattern)
+        if start == end:
+            return
+
+        indices = np.asarray(self.names[start:end])
+        if len(indices) <= batch:
+            yield from np.unique(indices).tolist()
+            return
+
+        window = max(1, batch * len(self) // len(indices))
+        lower = 0
+        while lower < len(self):
+            upper = min(len(self), lower + window)
+            yield from np.unique(indices[(indices >= lower) & (indices < upper)]).tolist()
+            lower = upper
+            window *= 2
+
+    def scan(self, pattern: str) -> Iterator[str]:
+        """
+        Yields the names containing the pattern in the order of the names by scanning the text; faster than `find`
+        for the short patterns contained in most of the names.
+        """
+        if not pattern or SEPARATOR.decode() in pattern:
+            return iter(())
+        regex = re.compile(SEPARATOR + b'[^\n]*' + re.escape(pattern.encode('utf-8')) + b'[^\n]*')
+        return (match.group()[1:].decode('utf-8') for match in regex.finditer(self.text))
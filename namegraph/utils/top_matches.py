@@ -0,0 +1,94 @@
+"""
+Precomputed first `k` names (in the order of the names, e.g. by score) containing the patterns matched by the most
+names: all the patterns up to `max_length` characters and the given frequent patterns (e.g. tokens of the requests).
+Only the patterns contained in at least `k` names are kept, the other ones are cheap to find in the suffix array.
+
+Stored as a directory, memory-mapped on load: `patterns.npy` (sorted UTF-8 patterns, fixed width)
+and `matches.npy` (int32 indices of the names in the suffix array, `k` per pattern).
+"""
+from __future__ import annotations
+
+from array import array
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+
+from namegraph.utils import snapshot
+from namegraph.utils.suffix_array import SuffixArray
+
+VERSION = 1
+
+
+class TopMatches:
+    def __init__(self, patterns: np.ndarray, matches: np.ndarray):
+        self.patterns = patterns
+        self.matches = matches
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    @property
+    def k(self) -> int:
+        return self.matches.shape[1]
+
+    @classmethod
+    def build(
+            cls,
+            suffix_array: SuffixArray,
+            k: int,
+            max_length: int,
+            frequent_patterns: Iterable[str] = (),
+    ) -> TopMatches:
+        top: dict[str, array] = {}
+        for index in range(len(suffix_array)):
+            name = suffix_array.name(index)
+            for pattern in {name[i:i + length] for length in range(1, max_length + 1)
+                            for i in range(len(name) - length + 1)}:
+                try:
+                    indices = top[pattern]
+                except KeyError:
+                    top[pattern] = array('i', [index])
+                    continue
+                if len(indices) < k:
+                    indices.append(index)
+
+        for pattern in frequent_patterns:
+            if pattern and pattern not in top:
+                top[pattern] = array('i', islice(suffix_array.find_indices(pattern), k))
+
+        full = sorted(pattern.encode('utf-8') for pattern, indices in top.items() if len(indices) == k)
+        patterns = np.array(full, dtype=f'S{max((len(p) for p in full), default=1)}')
+        matches = np.empty((len(full), k), dtype=np.int32)
+        for row, pattern in enumerate(full):
+            matches[row] = top[pattern.decode('utf-8')]
+        return cls(patterns, matches)
+
+    def write(self, directory: Path) -> None:
+        np.save(directory / 'patterns.npy', self.patterns)
+        np.save(directory / 'matches.npy', self.matches)
+
+    def save(self, path: Path) -> None:
+        snapshot.save_dir(path, self.write)
+
+    @classmethod
+    def open(cls, path: Path) -> TopMatches:
+        return cls(np.load(path / 'patterns.npy', mmap_mode='r'), np.load(path / 'matches.npy', mmap_mode='r'))
+
+    @classmethod
+    def load_or_build(cls, path: Path, build: Callable[[], TopMatches]) -> TopMatches:
+        snapshot.load_or_build_dir(path, lambda directory: build().write(directory))
+        return cls.open(path)
+
+    def get(self, pattern: str) -> Optional[list[int]]:
+        """
+        Returns the first `k` indices of the names containing the pattern or `None` if the pattern is not stored.
+        """
+        encoded = pattern.encode('utf-8')
+        if len(encoded) > self.patterns.dtype.itemsize or not len(self.patterns):
+            return None
+        row = int(np.searchsorted(self.patterns, encoded))
+        if row == len(self.patterns) or self.patterns[row] != encoded:
+            return None
+        return self.matches[row].tolist()
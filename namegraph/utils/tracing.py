@@ -0,0 +1,157 @@
+"""
+Lightweight span tracing of a single request.
+
+Tracing is enabled for a request by starting a trace; without it `span` only checks a thread-local
+and hot loops can check `current_span()` before measuring anything.
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+from typing import Any, Callable, Iterator, Optional, TypeVar
+import threading
+
+
+T = TypeVar('T')
+
+_thread_locals = threading.local()
+
+
+class Span:
+    """
+    A timed step of a request. Aggregated spans sum the durations of many short, repeated steps
+    (e.g. sampling iterations of one pipeline) instead of recording each of them.
+    """
+
+    __slots__ = ('name', 'attributes', 'start', 'duration', 'count', 'children', 'aggregated', '_aggregates', '_lock')
+
+    def __init__(self, name: str, attributes: dict[str, Any], aggregated: bool = False):
+        self.name = name
+        self.attributes = attributes
+        self.start = perf_counter()
+        self.duration: Optional[float] = 0.0 if aggregated else None
+        self.count = 0
+        self.children: list[Span] = []
+        self.aggregated = aggregated
+        self._aggregates: Optional[dict[tuple, Span]] = None
+        self._lock = threading.Lock()
+
+    def child(self, name: str, **attributes) -> Span:
+        span = Span(name, attributes)
+        with self._lock:
+            self.children.append(span)
+        return span
+
+    def aggregate(self, name: str, **attributes) -> Span:
+        """
+        Returns the aggregated child span with the given name and attributes, creating it if needed.
+        """
+        key = (name, tuple(sorted(attributes.items())))
+        with self._lock:
+            if self._aggregates is None:
+                self._aggregates = {}
+            span = self._aggregates.get(key)
+            if span is None:
+                span = self._aggregates[key] = Span(name, attributes, aggregated=True)
+                self.children.append(span)
+        return span
+
+    def add(self, duration: float) -> None:
+        """
+        Adds a duration of one step to an aggregated span.
+        """
+        with self._lock:
+            self.duration += duration
+            self.count += 1
+
+    def finish(self) -> None:
+        self.duration = perf_counter() - self.start
+
+    def to_dict(self, trace_start: Optional[float] = None) -> dict[str, Any]:
+        trace_start = self.start if trace_start is None else trace_start
+        duration = self.duration if self.duration is not None else perf_counter() - self.start
+        result = {
+            'name': self.name,
+            'start_ms': round((self.start - trace_start) * 1000, 3),
+            'duration_ms': round(duration * 1000, 3),
+        }
+        if self.aggregated:
+            result['count'] = self.count
+        if self.attributes:
+            result['attributes'] = {key: str(value) for key, value in self.attributes.items()}
+        with self._lock:
+            children = list(self.children)
+        if children:
+            result['children'] = [child.to_dict(trace_start) for child in children]
+        return result
+
+
+def current_span() -> Optional[Span]:
+    """Returns the active span of the current thread or `None` if the request is not traced."""
+    return getattr(_thread_locals, 'span', None)
+
+
+@contextmanager
+def span_for_thread(span: Optional[Span]) -> Iterator[Optional[Span]]:
+    """
+    Makes `span` the parent of the spans started in the current thread, restores the previous one at exit.
+    """
+    previous = current_span()
+    _thread_locals.span = span
+    try:
+        yield span
+    finally:
+        _thread_locals.span = previous
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """
+    Records a child span of the active span. Does nothing if the request is not traced.
+    """
+    parent = current_span()
+    if parent is None:
+        yield None
+        return
+
+    child = parent.child(name, **attributes)
+    _thread_locals.span = child
+    try:
+        yield child
+    finally:
+        child.finish()
+        _thread_locals.span = parent
+
+
+@contextmanager
+def start_trace(name: str, enabled: bool = True, **attributes) -> Iterator[Optional[Span]]:
+    """
+    Starts tracing of a request in the current thread. Returns the root span or `None` if not enabled.
+    """
+    if not enabled:
+        yield None
+        return
+
+    root = Span(name, attributes)
+    with span_for_thread(root):
+        try:
+            yield root
+        finally:
+            root.finish()
+
+
+def propagate_span(fn: Callable[..., T]) -> Callable[..., T]:
+    """
+    Wraps a function submitted to another thread, so that its spans are recorded under the active span.
+    """
+    parent = current_span()
+    if parent is None:
+        return fn
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with span_for_thread(parent):
+            return fn(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,69 @@
+import collections
+import logging
+from typing import Iterator
+
+from namegraph.namehash_common.pickle_cache import CACHE_DIR
+from namegraph.utils import Singleton
+from namegraph.utils.lemma_store import LemmaStore, VERSION as STORE_VERSION
+
+logger = logging.getLogger('namegraph')
+
+
+class WordnetLemmas(metaclass=Singleton):
+    """
+    WordNet lookups of the generators and tokenizers, served from a lemma store compiled from WordNet once
+    (into `data/cache`, e.g. by `generate_cache`). NLTK is imported only to compile the store.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.path = CACHE_DIR / f'wordnet-lemmas-{STORE_VERSION}.bin'
+        if not self.path.exists():
+            logger.info(f'Building WordNet lemma store {self.path}')
+        self.store = LemmaStore.load_or_build(self.path, self.build_store)
+
+    def has_synsets(self, word: str) -> bool:
+        """
+        Whether `wn.synsets(word)` is not empty.
+        """
+        return word.lower() in self.store
+
+    def lemma_counts(self, word: str) -> dict[str, int]:
+        """
+        Counts of the single word lemma names of the synsets of the word, in the order of `wn.synsets(word)`.
+        """
+        return dict(self.store.lemma_counts(word.lower()))
+
+    def build_store(self) -> bytes:
+        from nltk.corpus import wordnet as wn
+        return LemmaStore.build(self.wordnet_entries(wn), metadata={'wordnet': wn.get_version()})
+
+    @staticmethod
+    def wordnet_entries(wn) -> Iterator[tuple[str, list[tuple[str, int]]]]:
+        """
+        Yields the words having synsets with their lemma counts. Besides the lemmas, WordNet finds the synsets
+        of the forms in its exception lists and of the forms its substitution rules reduce to a lemma,
+        so these are generated from the lemmas by the reversed rules.
+        """
+        from nltk.corpus.reader.wordnet import POS_LIST
+
+        words = set()
+        for pos in POS_LIST:
+            for lemma in wn.all_lemma_names(pos):
+                words.add(lemma)
+                for old, new in wn.MORPHOLOGICAL_SUBSTITUTIONS[pos]:
+                    if lemma.endswith(new):
+                        words.add(lemma[:len(lemma) - len(new)] + old)
+            words.update(wn._exception_map[pos])
+
+        for word in sorted(words):
+            synsets = wn.synsets(word)
+            if not synsets:
+                continue
+            stats = collections.defaultdict(int)
+            for synset in synsets:
+                for lemma in synset.lemmas():
+                    name = str(lemma.name())
+                    if '_' not in name:
+                        stats[name] += 1
+            yield word, list(stats.items())
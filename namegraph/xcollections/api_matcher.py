@@ -7,6 +7,7 @@ from fastapi import HTTPException
 from namegraph.xcollections.matcher import CollectionMatcher
 from namegraph.xcollections.collection import Collection
 from namegraph.xcollections.query_builder import ElasticsearchQueryBuilder, SortOrder
+from namegraph.utils.metrics import ELASTICSEARCH_SECONDS
 from .utils import get_names_script, get_namehashes_script
 
 logger = logging.getLogger('namegraph')
@@ -125,6 +126,7 @@ class CollectionMatcherForAPI(CollectionMatcher):
                 **query_params
             )
             time_elapsed = (perf_counter() - t_before) * 1000
+            ELASTICSEARCH_SECONDS.observe(time_elapsed / 1000, operation='count')
         except Exception as ex:
             logger.error(f'Elasticsearch count failed [by-string]', exc_info=True)
             raise HTTPException(status_code=503, detail=str(ex)) from ex
@@ -237,6 +239,7 @@ class CollectionMatcherForAPI(CollectionMatcher):
                 **query_params
             )
             time_elapsed = (perf_counter() - t_before) * 1000
+            ELASTICSEARCH_SECONDS.observe(time_elapsed / 1000, operation='count')
         except Exception as ex:
             logger.error(f'Elasticsearch count failed [by-member]', exc_info=True)
             raise HTTPException(status_code=503, detail=str(ex)) from ex
@@ -1,23 +1,37 @@
 from typing import Optional, Literal
 from time import perf_counter
 from itertools import cycle
-import concurrent.futures
 import logging
 import random
 
 import elasticsearch.exceptions
 from fastapi import HTTPException
+from omegaconf import DictConfig
 
 from namegraph.xcollections.matcher import CollectionMatcher
 from namegraph.xcollections.collection import Collection
 from namegraph.xcollections.query_builder import ElasticsearchQueryBuilder, SortOrder
 from namegraph.utils import OrderedSet
+from namegraph.utils.metrics import ELASTICSEARCH_SECONDS
+from namegraph.utils.tracing import propagate_span
+from namegraph.thread_utils import BoundedExecutor, propagate_deadline
 
 
 logger = logging.getLogger('namegraph')
 
 
 class CollectionMatcherForGenerator(CollectionMatcher):
+    def __init__(self, config: DictConfig):
+        super().__init__(config)
+        # the queries of all the requests share one long-lived pool
+        self.executor = BoundedExecutor('collections',
+                                        max_workers=config.executors.collections.max_workers,
+                                        max_queue_size=config.executors.collections.max_queue_size,
+                                        block=True)
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)
+
     def _search_for_generator(
             self,
             tokens: tuple[str, ...],
@@ -152,28 +166,27 @@ class CollectionMatcherForGenerator(CollectionMatcher):
     ) -> tuple[list[Collection], dict]:
 
         t_before = perf_counter()
-        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
-            related_future = executor.submit(
-                self._search_for_generator,
-                tokens=tokens,
-                max_related_collections=max_related_collections,
-                label_diversity_ratio=label_diversity_ratio,
-                max_per_type=max_per_type,
-                limit_names=limit_names,
-                enable_learning_to_rank=enable_learning_to_rank
-            )
+        related_future = self.executor.submit(
+            propagate_span(propagate_deadline(self._search_for_generator)),
+            tokens=tokens,
+            max_related_collections=max_related_collections,
+            label_diversity_ratio=label_diversity_ratio,
+            max_per_type=max_per_type,
+            limit_names=limit_names,
+            enable_learning_to_rank=enable_learning_to_rank
+        )
 
-            membership_future = executor.submit(
-                self._search_by_membership,
-                name_label=input_name,
-                limit_names=limit_names,
-                sort_order=SortOrder.AI,
-                max_results=max_related_collections,
-                offset=0
-            )
+        membership_future = self.executor.submit(
+            propagate_span(propagate_deadline(self._search_by_membership)),
+            name_label=input_name,
+            limit_names=limit_names,
+            sort_order=SortOrder.AI,
+            max_results=max_related_collections,
+            offset=0
+        )
 
-            related, es_response_metadata1 = related_future.result()
-            membership, es_response_metadata2 = membership_future.result()
+        related, es_response_metadata1 = related_future.result()
+        membership, es_response_metadata2 = membership_future.result()
 
         time_elapsed = (perf_counter() - t_before) * 1000
 
@@ -261,6 +274,7 @@ class CollectionMatcherForGenerator(CollectionMatcher):
             t_before = perf_counter()
             response = self.elastic.search(index=self.index_name, **query_params)
             time_elapsed = (perf_counter() - t_before) * 1000
+            ELASTICSEARCH_SECONDS.observe(time_elapsed / 1000, operation='search')
         except Exception as ex:
             logger.error(f'Elasticsearch search failed [collection members sampling]', exc_info=True)
             raise HTTPException(status_code=503, detail=str(ex)) from ex
@@ -296,6 +310,7 @@ class CollectionMatcherForGenerator(CollectionMatcher):
             t_before = perf_counter()
             response = self.elastic.get(index=self.index_name, id=collection_id, _source_includes=fields)
             time_elapsed = (perf_counter() - t_before) * 1000
+            ELASTICSEARCH_SECONDS.observe(time_elapsed / 1000, operation='get')
         except elasticsearch.exceptions.NotFoundError as ex:
             raise HTTPException(status_code=404, detail=f'Collection with id={collection_id} not found') from ex
         except Exception as ex:
@@ -353,6 +368,7 @@ class CollectionMatcherForGenerator(CollectionMatcher):
             t_before = perf_counter()
             response = self.elastic.search(index=self.index_name, **query_params)
             time_elapsed = (perf_counter() - t_before) * 1000
+            ELASTICSEARCH_SECONDS.observe(time_elapsed / 1000, operation='search')
         except Exception as ex:
             logger.error(f'Elasticsearch search failed [scramble tokens from collection]', exc_info=True)
             raise HTTPException(status_code=503, detail=str(ex)) from ex
@@ -518,6 +534,7 @@ class CollectionMatcherForGenerator(CollectionMatcher):
             t_before = perf_counter()
             response = self.elastic.search(index=self.index_name, **query_params)
             time_elapsed = (perf_counter() - t_before) * 1000
+            ELASTICSEARCH_SECONDS.observe(time_elapsed / 1000, operation='search')
         except Exception as ex:
             logger.error(f'Elasticsearch search failed [fetch collection members]', exc_info=True)
             raise HTTPException(status_code=503, detail=str(ex)) from ex
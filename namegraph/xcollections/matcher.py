@@ -14,7 +14,11 @@ from namegraph.tokenization import WordNinjaTokenizer, BigramLongestTokenizer
 from namegraph.xcollections.collection import Collection
 from namegraph.xcollections.query_builder import ElasticsearchQueryBuilder, SortOrder
 from namegraph.utils.elastic import connect_to_elasticsearch, index_exists
+from namegraph.utils.local_elastic import LocalElasticsearch
 from namegraph.utils import Singleton
+from namegraph.utils.metrics import ELASTICSEARCH_SECONDS
+from namegraph.utils.tracing import span
+from namegraph.thread_utils import get_deadline
 
 logger = logging.getLogger('namegraph')
 
@@ -32,13 +36,17 @@ class CollectionMatcher(metaclass=Singleton):
         self.ltr_window_size = config.elasticsearch.ltr.window_size
 
         try:
-            self.elastic = connect_to_elasticsearch(
-                config.elasticsearch.scheme,
-                config.elasticsearch.host,
-                config.elasticsearch.port,
-                config.elasticsearch.username,
-                config.elasticsearch.password
-            )
+            if config.elasticsearch.local.snapshot:
+                logger.info(f'Serving collections from the snapshot {config.elasticsearch.local.snapshot}')
+                self.elastic = LocalElasticsearch.from_config(config)
+            else:
+                self.elastic = connect_to_elasticsearch(
+                    config.elasticsearch.scheme,
+                    config.elasticsearch.host,
+                    config.elasticsearch.port,
+                    config.elasticsearch.username,
+                    config.elasticsearch.password
+                )
 
             self.active = index_exists(self.elastic, self.index_name)
             if not self.active:  # TODO should we raise Exception instead?
@@ -115,10 +123,27 @@ class CollectionMatcher(metaclass=Singleton):
             limit_names: int,
             script_names=False
     ) -> tuple[list[Collection], dict[str, Any]]:
+        deadline = get_deadline()
+        if deadline.expired():
+            logger.warning('Deadline exceeded, skipping Elasticsearch query')
+            return [], {
+                'n_total_hits': 0,
+                'took': 0,
+                'elasticsearch_communication_time': 0,
+            }
+
+        # the query cannot take longer than the time left for the request
+        elastic = self.elastic if deadline.remaining() is None \
+            else self.elastic.options(request_timeout=deadline.remaining())
+
         try:
             t_before = perf_counter()
-            response = self.elastic.search(index=self.index_name, **query_params)
+            with span('elasticsearch', operation='search') as es_span:
+                response = elastic.search(index=self.index_name, **query_params)
+                if es_span is not None:
+                    es_span.attributes['took_ms'] = response['took']
             time_elapsed = (perf_counter() - t_before) * 1000
+            ELASTICSEARCH_SECONDS.observe(time_elapsed / 1000, operation='search')
 
             hits = response["hits"]["hits"]
             n_total_hits = response["hits"]['total']['value']
@@ -139,6 +164,15 @@ class CollectionMatcher(metaclass=Singleton):
                 'took': 0,
                 'elasticsearch_communication_time': 0,
             }
+        except elastic_transport.ConnectionTimeout as e:
+            if not deadline.expired():
+                raise
+            logger.warning(f'Elasticsearch query timed out because of the deadline: {e}')
+            return [], {
+                'n_total_hits': 0,
+                'took': 0,
+                'elasticsearch_communication_time': (perf_counter() - t_before) * 1000,
+            }
 
     def _search_related(
             self,
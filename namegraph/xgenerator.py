@@ -1,13 +1,13 @@
 import collections
 import concurrent.futures
+import copy
 import threading
 import logging
 import time
 from functools import reduce
 from itertools import islice, cycle
-from typing import List, Any
+from typing import List, Any, Iterator
 
-import wordninja
 from omegaconf import DictConfig
 
 from namegraph.generation.collection_generator import uniq
@@ -17,7 +17,14 @@ from namegraph.generated_name import GeneratedName
 from namegraph.pipeline import Pipeline
 from namegraph.meta_sampler import MetaSampler
 from namegraph.input_name import InputName
-from namegraph.utils import aggregate_duplicates
+from namegraph.utils import aggregate_duplicates, LRUCache
+from namegraph.utils.cache import freeze
+from namegraph.pipeline.generator_output_cache import GeneratorOutputCache
+from namegraph.tokenization.wordninja_tokenizer import WordNinjaModel
+from namegraph.utils.memory import PeakRss
+from namegraph.utils.metrics import PREPROCESSING_SECONDS, DOMAINS_RELOAD_SECONDS
+from namegraph.utils.tracing import propagate_span, span
+from namegraph.thread_utils import BoundedExecutor, Deadline, deadline_for_thread
 
 logger = logging.getLogger('namegraph')
 
@@ -61,10 +68,21 @@ class RelatedSuggestions(collections.UserList):
 
 
 class Generator:
+    # request parameters which do not influence the generated suggestions
+    # (results cut short by the deadline are not cached)
+    UNCACHED_PARAMS = ('user_info', 'deadline_ms')
+
     def __init__(self, config: DictConfig):
         self.domains = None
         self.config = config
 
+        # final results are shared between requests; the output is deterministic for a given label
+        # and parameters, because the random generators are seeded with the label
+        self.results_cache = LRUCache(maxsize=self.config.caches.results.maxsize,
+                                      ttl=self.config.caches.results.ttl)
+        # reloads of the domains are serialized, so that the generators end up built from the latest statuses
+        self._reload_lock = threading.Lock()
+
         self.pipelines = []
         for definition in self.config.pipelines:
             # logger.info('start ' + str(definition.name))
@@ -75,7 +93,13 @@ class Generator:
 
         self.init_objects()
         self.preprocessor = Preprocessor(config)
-        self.metasampler = MetaSampler(config, self.pipelines)
+
+        # speculative warm-up of the pipelines, shared by all the samplers
+        self.warmup_executor = BoundedExecutor('warmup',
+                                               max_workers=self.config.executors.warmup.max_workers,
+                                               max_queue_size=self.config.executors.warmup.max_queue_size) \
+            if self.config.warmup.enabled else None
+        self.metasampler = MetaSampler(config, self.pipelines, self.warmup_executor)
 
         # self.weights = {}
         # for definition in self.config.pipelines:
@@ -99,42 +123,129 @@ class Generator:
         # 2. Within each category: sample type and lang of interpretation, sample interpretaion with this type and lang. Sample pipeline (weights of pipelines depends on type and language. Do it in parallel?
         self.grouped_metasamplers = {}
         for category, pipelines in self.pipelines_grouped.items():
-            self.grouped_metasamplers[category] = MetaSampler(config, pipelines)
+            self.grouped_metasamplers[category] = MetaSampler(config, pipelines, self.warmup_executor)
+
+        # categories of all the requests are sampled in one long-lived pool
+        self.category_executor = BoundedExecutor('categories',
+                                                 max_workers=self.config.executors.categories.max_workers,
+                                                 max_queue_size=self.config.executors.categories.max_queue_size,
+                                                 block=True)
+        self.executors = [self.category_executor]
+        if self.warmup_executor is not None:
+            self.executors.append(self.warmup_executor)
 
         # 3. Sample `max number of suggestions per category`. How handle `min_available_fraction`?
 
+    def _results_cache_key(self, endpoint: str, name: str, params: dict[str, Any], *args) -> tuple:
+        params = {k: v for k, v in params.items() if k not in self.UNCACHED_PARAMS}
+        return endpoint, name, freeze(args), freeze(params)
+
+    def create_deadline(self, params: dict[str, Any]) -> Deadline:
+        """
+        Creates a deadline of a request from the `deadline_ms` parameter or from the config of the request mode.
+        """
+        if params.get('deadline_ms') is not None:
+            return Deadline(params['deadline_ms'] / 1000)
+
+        mode = params.get('mode', 'full')
+        timeout = self.config.deadlines.get(mode, None)
+        if timeout is None and mode.startswith('grouped_'):
+            # use ungrouped mode deadline as default (if key 'grouped_{mode}' does not exist)
+            timeout = self.config.deadlines.get(mode.removeprefix('grouped_'), None)
+        return Deadline(timeout)
+
+    def shutdown(self, wait: bool = True):
+        for executor in self.executors:
+            executor.shutdown(wait=wait)
+
+    def reload_domains(self) -> dict[str, Any]:
+        """
+        Reloads the domains files and, if they changed, rebuilds the structures of the generators derived from them
+        and drops the cached suggestions. The requests are served meanwhile with the previous statuses.
+        Returns the duration and the memory used by the reload.
+        """
+        start = time.perf_counter()
+        with self._reload_lock, PeakRss() as memory:
+            changed = self.domains.reload()
+            if changed:
+                generators = {id(pipeline.generator): pipeline.generator
+                              for pipeline in self.pipelines + [self.random_available_name_pipeline]}
+                for generator in generators.values():
+                    generator.reload_domains()
+                self.results_cache.clear()
+                GeneratorOutputCache(self.config).clear()
+        duration = time.perf_counter() - start
+        DOMAINS_RELOAD_SECONDS.observe(duration, changed=str(changed).lower())
+
+        report = {'changed': changed, 'duration_s': duration, **memory.stats()}
+        if changed:
+            logger.info(f'Reloaded domains in {duration:.1f}s, peak RSS {memory.peak} bytes')
+        return report
+
     def init_objects(self):
         self.domains = Domains(self.config)
-        wordninja.DEFAULT_LANGUAGE_MODEL = wordninja.LanguageModel(self.config.tokenization.wordninja_dictionary)
+        WordNinjaModel(self.config)
 
-    def generate_names(
+    def _prepare_params(
             self,
-            name: str,
-            sorter: str = 'weighted-sampling',
-            min_suggestions: int = None,
-            max_suggestions: int = None,
-            min_available_fraction: float = 0.1,
-            params: dict[str, Any] = None
-    ) -> list[GeneratedName]:
+            min_suggestions: int | None,
+            max_suggestions: int | None,
+            min_available_fraction: float | None,
+            params: dict[str, Any] | None
+    ) -> dict[str, Any]:
         params = params or {}
-
-        min_suggestions = min_suggestions or self.config.app.suggestions
-        max_suggestions = max_suggestions or self.config.app.suggestions
-        min_available_fraction = min_available_fraction or self.config.app.min_available_fraction
-
-        params['min_suggestions'] = min_suggestions
-        params['max_suggestions'] = max_suggestions
-        params['min_available_fraction'] = min_available_fraction
-
-        name = InputName(name, params)
-        logger.info('Start normalize')
-        self.preprocessor.normalize(name)
-        logger.info('Start classify')
-        self.preprocessor.classify(name)
+        params['min_suggestions'] = min_suggestions or self.config.app.suggestions
+        params['max_suggestions'] = max_suggestions or self.config.app.suggestions
+        params['min_available_fraction'] = min_available_fraction or self.config.app.min_available_fraction
+        return params
+
+    def _preprocess(self, name: InputName) -> None:
+        if self.preprocessor.restore(name):
+            logger.info(f'Preprocessing cache hit: {name.input_name}')
+            logger.info(str(name.types_probabilities))
+            return
+
+        with deadline_for_thread(name.deadline):  # checked by the tokenizers
+            logger.info('Start normalize')
+            start = time.perf_counter()
+            with span('normalize'):
+                self.preprocessor.normalize(name)
+            PREPROCESSING_SECONDS.observe(time.perf_counter() - start, stage='normalize')
+            logger.info('Start classify')
+            start = time.perf_counter()
+            with span('classify'):
+                self.preprocessor.classify(name)
+            PREPROCESSING_SECONDS.observe(time.perf_counter() - start, stage='classify')
+        self.preprocessor.store(name)
         logger.info('End preprocessing')
 
         logger.info(str(name.types_probabilities))
 
+    def _preprocess_batch(self, names: list[InputName]) -> None:
+        """
+        Preprocesses the names like `_preprocess`, but the names which are not cached are classified together,
+        so the labels are tokenized and their tokenizations scored by the n-grams in one pass.
+        """
+        names = [name for name in names if not self.preprocessor.restore(name)]
+        if not names:
+            return
+
+        # the names of a batch share the deadline
+        with deadline_for_thread(names[0].deadline):
+            start = time.perf_counter()
+            with span('normalize'):
+                for name in names:
+                    self.preprocessor.normalize(name)
+            PREPROCESSING_SECONDS.observe(time.perf_counter() - start, stage='normalize')
+            start = time.perf_counter()
+            with span('classify'):
+                self.preprocessor.classify_batch(names)
+            PREPROCESSING_SECONDS.observe(time.perf_counter() - start, stage='classify')
+        for name in names:
+            self.preprocessor.store(name)
+        logger.info(f'Preprocessed {len(names)} names')
+
+    def _sample_names(self, name: InputName, sorter: str) -> list[GeneratedName]:
         logger.info('Start sampling')
         all_suggestions = self.metasampler.sample(name, sorter, min_suggestions=name.params['min_suggestions'],
                                                   max_suggestions=name.params['max_suggestions'],
@@ -142,13 +253,107 @@ class Generator:
 
         logger.info(f'Generated suggestions: {len(all_suggestions)}')
 
-        if len(all_suggestions) < min_suggestions:
+        if len(all_suggestions) < name.params['min_suggestions']:
             only_available_suggestions = self.random_available_name_pipeline.apply(name, None)
             all_suggestions.extend(only_available_suggestions)  # TODO dodawaj do osiągnięcia limitu
             logger.info(f'Generated suggestions after random: {len(all_suggestions)}')
             all_suggestions = aggregate_duplicates(all_suggestions)
 
-        return all_suggestions[:max_suggestions]
+        return all_suggestions[:name.params['max_suggestions']]
+
+    def generate_names(
+            self,
+            name: str,
+            sorter: str = 'weighted-sampling',
+            min_suggestions: int = None,
+            max_suggestions: int = None,
+            min_available_fraction: float = 0.1,
+            params: dict[str, Any] = None,
+            use_cache: bool = True,
+            deadline: Deadline = None
+    ) -> list[GeneratedName]:
+        """
+        If the deadline expires, the suggestions generated so far are returned and `deadline.exceeded` is set.
+        """
+        params = self._prepare_params(min_suggestions, max_suggestions, min_available_fraction, params)
+        deadline = deadline or self.create_deadline(params)
+
+        cache_key = self._results_cache_key('generate_names', name, params, sorter)
+        if use_cache and (cached := self.results_cache.get(cache_key)) is not None:
+            logger.info(f'Results cache hit: {name}')
+            return copy.deepcopy(cached)
+
+        name = InputName(name, params, deadline)
+        self._preprocess(name)
+        all_suggestions = self._sample_names(name, sorter)
+
+        if use_cache and not deadline.exceeded:
+            self.results_cache.put(cache_key, copy.deepcopy(all_suggestions))
+        return all_suggestions
+
+    def generate_names_batch(
+            self,
+            names: list[str],
+            sorter: str = 'weighted-sampling',
+            min_suggestions: int = None,
+            max_suggestions: int = None,
+            min_available_fraction: float = 0.1,
+            params: dict[str, Any] = None,
+            use_cache: bool = True,
+            deadline: Deadline = None
+    ) -> list[tuple[list[GeneratedName], float, bool]]:
+        """
+        Generate suggestions for many labels with the same parameters. Identical labels are generated once,
+        all the labels are preprocessed together before sampling starts: they are tokenized and scored
+        by the n-grams in one pass, and the sampling of all the labels shares the generator outputs cached
+        for common tokens. The deadline applies to the whole batch.
+        Returns suggestions, processing time (in ms) and whether the deadline cut the suggestions short
+        for each label, in the input order. The preprocessing time of the batch is split evenly between
+        the preprocessed labels.
+        """
+        params = params or {}
+        deadline = deadline or self.create_deadline(params)
+
+        unique_names: dict[str, tuple[list[GeneratedName], float, bool] | None] = dict.fromkeys(names)
+        to_sample: list[tuple[str, InputName, tuple, float]] = []
+
+        for name in unique_names:
+            start_time = time.perf_counter()
+            name_params = self._prepare_params(min_suggestions, max_suggestions, min_available_fraction,
+                                               dict(params))
+
+            cache_key = self._results_cache_key('generate_names', name, name_params, sorter)
+            if use_cache and (cached := self.results_cache.get(cache_key)) is not None:
+                logger.info(f'Results cache hit: {name}')
+                unique_names[name] = (copy.deepcopy(cached), 1000 * (time.perf_counter() - start_time), False)
+                continue
+
+            input_name = InputName(name, name_params, deadline)
+            to_sample.append((name, input_name, cache_key, 1000 * (time.perf_counter() - start_time)))
+
+        start_time = time.perf_counter()
+        self._preprocess_batch([input_name for _, input_name, _, _ in to_sample])
+        if to_sample:
+            preprocessing_time = 1000 * (time.perf_counter() - start_time) / len(to_sample)
+            to_sample = [(name, input_name, cache_key, lookup_time + preprocessing_time)
+                         for name, input_name, cache_key, lookup_time in to_sample]
+
+        for name, input_name, cache_key, preprocessing_time in to_sample:
+            start_time = time.perf_counter()
+            suggestions = self._sample_names(input_name, sorter)
+            if use_cache and not deadline.exceeded:
+                self.results_cache.put(cache_key, copy.deepcopy(suggestions))
+            unique_names[name] = (suggestions, preprocessing_time + 1000 * (time.perf_counter() - start_time),
+                                  deadline.exceeded)
+
+        results = []
+        returned = set()
+        for name in names:
+            suggestions, processing_time, partial = unique_names[name]
+            # duplicated labels get their own copies of the suggestions
+            results.append((copy.deepcopy(suggestions) if name in returned else suggestions, processing_time, partial))
+            returned.add(name)
+        return results
 
     def generate_grouped_names(
             self,
@@ -158,8 +363,54 @@ class Generator:
             max_recursive_related_collections: int = 5,
             categories_params=None,
             min_total_suggestions: int = 50,
-            params: dict[str, Any] = None
+            params: dict[str, Any] = None,
+            use_cache: bool = True,
+            deadline: Deadline = None
     ) -> tuple[dict[str, RelatedSuggestions], dict[str, list[GeneratedName]], list[tuple[str, ...]]]:
+        all_related_suggestions: dict[str, RelatedSuggestions] = {}
+        grouped_suggestions: dict[str, list[GeneratedName]] = {}
+        unique_tokenizations: list[tuple[str, ...]] = []
+
+        for category, suggestions in self.generate_grouped_names_stream(
+                name,
+                max_related_collections=max_related_collections,
+                max_labels_per_related_collection=max_labels_per_related_collection,
+                max_recursive_related_collections=max_recursive_related_collections,
+                categories_params=categories_params,
+                min_total_suggestions=min_total_suggestions,
+                params=params,
+                use_cache=use_cache,
+                deadline=deadline
+        ):
+            if category == 'related':
+                all_related_suggestions = suggestions
+            elif category == 'all_tokenizations':
+                unique_tokenizations = suggestions
+            else:
+                grouped_suggestions[category] = suggestions
+
+        return all_related_suggestions, grouped_suggestions, unique_tokenizations
+
+    def generate_grouped_names_stream(
+            self,
+            name: str,
+            max_related_collections: int = 5,
+            max_labels_per_related_collection: int = 5,
+            max_recursive_related_collections: int = 5,
+            categories_params=None,
+            min_total_suggestions: int = 50,
+            params: dict[str, Any] = None,
+            use_cache: bool = True,
+            deadline: Deadline = None
+    ) -> Iterator[tuple[str, Any]]:
+        """
+        Yields `(category, suggestions)` as soon as each category is sampled, so that the fast categories
+        do not wait for the slowest one (usually `related`, which queries Elasticsearch).
+        For `related` the suggestions are a dict of `RelatedSuggestions` keyed by the collection id.
+        `other` (if needed) is yielded after all the other categories, because it depends on their total size.
+        The last item is `('all_tokenizations', unique_tokenizations)`.
+        If the deadline expires, the categories sampled so far are yielded and `deadline.exceeded` is set.
+        """
         params = params or {}
         categories_params = categories_params or {}
 
@@ -172,25 +423,76 @@ class Generator:
         params['label_diversity_ratio'] = categories_params.related.label_diversity_ratio
         params['max_per_type'] = categories_params.related.max_per_type
         params['enable_learning_to_rank'] = categories_params.related.enable_learning_to_rank
+        deadline = deadline or self.create_deadline(params)
 
-        min_available_fraction = 0.0
+        cache_key = self._results_cache_key('generate_grouped_names', name, params)
+        if use_cache and (cached := self.results_cache.get(cache_key)) is not None:
+            logger.info(f'Results cache hit: {name}')
+            all_related_suggestions, grouped_suggestions, unique_tokenizations = copy.deepcopy(cached)
+            yield 'related', all_related_suggestions
+            yield from grouped_suggestions.items()
+            yield 'all_tokenizations', unique_tokenizations
+            return
 
-        name = InputName(name, params)
-        logger.info('Start normalize')
-        self.preprocessor.normalize(name)
-        logger.info('Start classify')
-        self.preprocessor.classify(name)
-        logger.info('End preprocessing')
+        name = InputName(name, params, deadline)
+        self._preprocess(name)
 
-        logger.info(str(name.types_probabilities))
         logger.info(str(name.interpretations))
         if name.is_pretokenized:
             logger.info(f'Input label is pretokenized: {name.pretokenization}')
 
+        all_related_suggestions: dict[str, RelatedSuggestions] = {}
+        grouped_suggestions: dict[str, list[GeneratedName]] = {}
+        count_real_suggestions = 0
+        for category, suggestions in self._sample_categories(name, categories_params):
+            if category == 'related':
+                all_related_suggestions = self._group_related_suggestions(
+                    suggestions, max_related_collections, max_labels_per_related_collection,
+                    max_recursive_related_collections, categories_params)
+                count_real_suggestions += sum(len(suggestions) for suggestions in all_related_suggestions.values())
+                yield category, all_related_suggestions
+                continue
+
+            # remove categories with less than min_suggestions suggestions and cap to max_suggestions
+            category_params = getattr(categories_params, category)
+            if len(suggestions) < category_params.min_suggestions:
+                continue
+            grouped_suggestions[category] = suggestions[:category_params.max_suggestions]
+            count_real_suggestions += len(grouped_suggestions[category])
+            yield category, grouped_suggestions[category]
+
+        # TODO agregate duplicates
+        # all_suggestions = aggregate_duplicates(all_suggestions)
+
+        logger.info(f'Generated suggestions: {count_real_suggestions}')
+
+        if count_real_suggestions < min_total_suggestions:
+            category_params = getattr(categories_params, 'other')
+            other_suggestions_number = max(
+                min((min_total_suggestions - count_real_suggestions), category_params.max_suggestions),
+                category_params.min_suggestions)
+            logger.info(f'Generated other suggestions: {other_suggestions_number}')
+            only_available_suggestions = self.random_available_name_pipeline.apply(name, None)
+            grouped_suggestions['other'] = list(islice(only_available_suggestions, other_suggestions_number))
+            yield 'other', grouped_suggestions['other']
+
+        unique_tokenizations = list(uniq([i.tokenization for ints in name.interpretations.values() for i in ints]))
+
+        if use_cache and not deadline.exceeded:
+            result = all_related_suggestions, grouped_suggestions, unique_tokenizations
+            self.results_cache.put(cache_key, copy.deepcopy(result))
+
+        yield 'all_tokenizations', unique_tokenizations
+
+    def _sample_categories(self, name: InputName, categories_params) -> Iterator[tuple[str, list[GeneratedName]]]:
+        """
+        Samples all the categories in parallel and yields them in the order of completion.
+        """
+        min_available_fraction = 0.0
+
         logger.info('Start sampling')
 
         multithreading = True
-        grouped_suggestions = {}
         if not multithreading:
             for category, meta_sampler in self.grouped_metasamplers.items():
                 start_time = time.time()
@@ -213,7 +515,7 @@ class Generator:
                 generator_time = 1000 * (time.time() - start_time)
                 logger.info(
                     f'Generated suggestions in category {category}: {len(suggestions)} Time: {generator_time:.2f}')
-                grouped_suggestions[category] = suggestions
+                yield category, suggestions
         else:
             multi_sampler_lock = threading.Lock()
             multi_sampler_suggestions_str = set()
@@ -225,49 +527,61 @@ class Generator:
                     return sampled
 
             # multithreading using concurrent.futures
-            with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.grouped_metasamplers)) as executor:
-                futures = {}
-                start_time = time.time()
-                for category, meta_sampler in self.grouped_metasamplers.items():
-                    category_params = getattr(categories_params, category)
-                    try:
-                        min_suggestions = category_params.min_suggestions
-                        max_suggestions = category_params.max_suggestions
-                    except AttributeError:  # RelatedCategoryParams
-                        min_suggestions = 0
-                        max_suggestions = 3 * category_params.max_related_collections * max(category_params.max_labels_per_related_collection, self.config.collections.suggestions_limit)
-
-                    futures[executor.submit(meta_sampler.sample, name, 'weighted-sampling',
-                                            min_suggestions=min_suggestions, max_suggestions=max_suggestions,
-                                            min_available_fraction=min_available_fraction,
-                                            category_endpoint=True, is_already_sampled=is_already_sampled)] = category
-                for future in concurrent.futures.as_completed(futures):
-                    category = futures[future]
-                    suggestions = future.result()
-                    generator_time = 1000 * (time.time() - start_time)
-                    logger.info(
-                        f'Generated suggestions in category {category}: {len(suggestions)} Time: {generator_time:.2f}')
-                    grouped_suggestions[category] = suggestions
-
-        # split related
+            def sample_category(category: str, meta_sampler: MetaSampler, **kwargs) -> list[GeneratedName]:
+                with span('category', category=category):
+                    return meta_sampler.sample(name, 'weighted-sampling', **kwargs)
+
+            futures = {}
+            start_time = time.time()
+            for category, meta_sampler in self.grouped_metasamplers.items():
+                category_params = getattr(categories_params, category)
+                try:
+                    min_suggestions = category_params.min_suggestions
+                    max_suggestions = category_params.max_suggestions
+                except AttributeError:  # RelatedCategoryParams
+                    min_suggestions = 0
+                    max_suggestions = 3 * category_params.max_related_collections * max(category_params.max_labels_per_related_collection, self.config.collections.suggestions_limit)
+
+                futures[self.category_executor.submit(
+                    propagate_span(sample_category), category, meta_sampler,
+                    min_suggestions=min_suggestions, max_suggestions=max_suggestions,
+                    min_available_fraction=min_available_fraction,
+                    category_endpoint=True, is_already_sampled=is_already_sampled)] = category
+            for future in concurrent.futures.as_completed(futures):
+                category = futures[future]
+                suggestions = future.result()
+                generator_time = 1000 * (time.time() - start_time)
+                logger.info(
+                    f'Generated suggestions in category {category}: {len(suggestions)} Time: {generator_time:.2f}')
+                yield category, suggestions
+
+    def _group_related_suggestions(
+            self,
+            suggestions: list[GeneratedName],
+            max_related_collections: int,
+            max_labels_per_related_collection: int,
+            max_recursive_related_collections: int,
+            categories_params
+    ) -> dict[str, RelatedSuggestions]:
+        """
+        Splits the suggestions of the `related` category by collection and assigns related collections to them.
+        """
 
         all_related_suggestions: dict[str, RelatedSuggestions] = {}
         collections_id2related: dict[str, list[dict]] = {}
-        if 'related' in grouped_suggestions:
-            for suggestion in grouped_suggestions['related']:
-                if suggestion.collection_id not in all_related_suggestions:
-                    all_related_suggestions[suggestion.collection_id] = \
-                        RelatedSuggestions(suggestion.collection_title,
-                                           suggestion.collection_id,
-                                           suggestion.collection_members_count)
-
-                    all_related_suggestions[suggestion.collection_id].related_collections = []
-                    collections_id2related[suggestion.collection_id] = suggestion.related_collections or []
-
-                collection_suggestions = all_related_suggestions[suggestion.collection_id]
-                if len(collection_suggestions) < max_labels_per_related_collection:
-                    collection_suggestions.append(suggestion)
-            del grouped_suggestions['related']
+        for suggestion in suggestions:
+            if suggestion.collection_id not in all_related_suggestions:
+                all_related_suggestions[suggestion.collection_id] = \
+                    RelatedSuggestions(suggestion.collection_title,
+                                       suggestion.collection_id,
+                                       suggestion.collection_members_count)
+
+                all_related_suggestions[suggestion.collection_id].related_collections = []
+                collections_id2related[suggestion.collection_id] = suggestion.related_collections or []
+
+            collection_suggestions = all_related_suggestions[suggestion.collection_id]
+            if len(collection_suggestions) < max_labels_per_related_collection:
+                collection_suggestions.append(suggestion)
 
         # round-robin with sampling from one list until something that is not a duplicate is found
         # the intention is to split duplicates evenly between collections
@@ -304,19 +618,6 @@ class Generator:
             related_suggestions.related_collections = \
                 related_suggestions.related_collections[:max_recursive_related_collections]
 
-        # TODO agregate duplicates
-        # all_suggestions = aggregate_duplicates(all_suggestions)
-
-        # remove categories with less than min_suggestions suggestions and cap to max_suggestions
-        for category, suggestions in list(grouped_suggestions.items()):
-            category_params = getattr(categories_params, category)
-            min_suggestions = category_params.min_suggestions
-            max_suggestions = category_params.max_suggestions
-            if len(suggestions) < min_suggestions:
-                del grouped_suggestions[category]
-            else:
-                grouped_suggestions[category] = suggestions[:max_suggestions]
-
         category_params = getattr(categories_params, 'related')
         for category, related_suggestions in all_related_suggestions.items():
             max_suggestions = category_params.max_labels_per_related_collection
@@ -326,23 +627,6 @@ class Generator:
         for category in list(all_related_suggestions.keys())[max_related_collections:]:
             del all_related_suggestions[category]
 
-        count_real_suggestions = sum(
-            [len(suggestions) for suggestions in grouped_suggestions.values()] + [len(suggestions) for suggestions in
-                                                                                  all_related_suggestions.values()])
-
-        logger.info(f'Generated suggestions: {count_real_suggestions}')
-
-        if count_real_suggestions < min_total_suggestions:
-            category_params = getattr(categories_params, 'other')
-            other_suggestions_number = max(
-                min((min_total_suggestions - count_real_suggestions), category_params.max_suggestions),
-                category_params.min_suggestions)
-            logger.info(f'Generated other suggestions: {other_suggestions_number}')
-            only_available_suggestions = self.random_available_name_pipeline.apply(name, None)
-            grouped_suggestions['other'] = list(islice(only_available_suggestions, other_suggestions_number))
-
-        unique_tokenizations = list(uniq([i.tokenization for ints in name.interpretations.values() for i in ints]))
-
-        return all_related_suggestions, grouped_suggestions, unique_tokenizations
+        return all_related_suggestions
 
 
@@ -0,0 +1,399 @@
+"""
+Micro-benchmarks of the components used for generating suggestions: every `NameGenerator`, the tokenizers,
+n-grams, person names, domain statuses, the samplers and `MetaSampler.sample`.
+Each component runs over the same fixed corpus of labels, so a regression can be attributed to a component.
+
+Run from the repository root:
+```
+python -m tests.benchmarks.components                   # compare with tests/benchmarks/baseline.json
+python -m tests.benchmarks.components --update          # overwrite the baseline
+python -m tests.benchmarks.components -k Generator -k tokenizer
+```
+The command fails if the wall time or the allocated memory of any case grew more than the tolerance.
+Cases which cannot be set up (missing data, no Elasticsearch) are reported as skipped and are not saved
+in the baseline; the cases missing in the baseline are listed as not compared.
+"""
+from __future__ import annotations
+
+import argparse
+import collections
+import copy
+import inspect
+import os
+import sys
+from itertools import islice
+from pathlib import Path
+from typing import Any
+
+from hydra import compose, initialize_config_dir
+from omegaconf import DictConfig
+
+from namegraph import generation
+from namegraph.domains import Domains
+from namegraph.generated_name import GeneratedName
+from namegraph.generation.name_generator import NameGenerator
+from namegraph.input_name import InputName, Interpretation
+from namegraph.thread_utils import Deadline, init_seed_for_thread
+
+from .measure import Case, run_cases, load_baseline, save_baseline, compare, format_comparison
+
+
+ROOT_PATH = Path(__file__).resolve().parent.parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / 'baseline.json'
+
+# label, tokenization, interpretation type
+CORPUS: dict[str, list[tuple[str, tuple[str, ...], str]]] = {
+    'short': [
+        ('ai', ('ai',), 'ngram'),
+        ('cat', ('cat',), 'ngram'),
+        ('zoo', ('zoo',), 'ngram'),
+    ],
+    'long': [
+        ('internationalbusinessmachines', ('international', 'business', 'machines'), 'ngram'),
+        ('thequickbrownfoxjumpsoverthelazydog',
+         ('the', 'quick', 'brown', 'fox', 'jumps', 'over', 'the', 'lazy', 'dog'), 'ngram'),
+    ],
+    'emoji': [
+        ('🚀rocket', ('🚀', 'rocket'), 'ngram'),
+        ('💎hands', ('💎', 'hands'), 'ngram'),
+        ('🔥', ('🔥',), 'ngram'),
+    ],
+    'person': [
+        ('johnsmith', ('john', 'smith'), 'person'),
+        ('chrisjohnson', ('chris', 'johnson'), 'person'),
+        ('annakowalska', ('anna', 'kowalska'), 'person'),
+    ],
+    'multi_token': [
+        ('firepower', ('fire', 'power'), 'ngram'),
+        ('bitcoinwallet', ('bitcoin', 'wallet'), 'ngram'),
+        ('ethereumnameservice', ('ethereum', 'name', 'service'), 'ngram'),
+    ],
+}
+
+LABELS = [label for entries in CORPUS.values() for label, _, _ in entries]
+TOKENIZATIONS = [tokens for entries in CORPUS.values() for _, tokens, _ in entries]
+
+# generators which need external services, benchmarked only with `--with-elasticsearch`
+ELASTICSEARCH_GENERATORS = {'CollectionGenerator'}
+
+DEFAULT_OVERRIDES = [
+    # every run generates the suggestions, instead of serving them from the previous run
+    'caches.generator_outputs.maxsize=0',
+    'caches.results.maxsize=0',
+]
+
+
+def load_config(config_name: str, overrides: list[str]) -> DictConfig:
+    os.chdir(ROOT_PATH)  # the data paths in the configs are relative to the repository root
+    with initialize_config_dir(version_base=None, config_dir=str(ROOT_PATH / 'conf')):
+        return compose(config_name=config_name, overrides=DEFAULT_OVERRIDES + overrides)
+
+
+def make_input_name(label: str, tokens: tuple[str, ...], type_: str, params: dict[str, Any]) -> InputName:
+    """
+    Creates an already preprocessed input name with a single, fixed interpretation,
+    so that the generators are benchmarked independently of the tokenizers and classifiers.
+    """
+    name = InputName(label, copy.deepcopy(params))
+    name.strip_quotes_name = label
+    name.strip_eth_namehash = label
+    name.strip_eth_namehash_unicode = label
+    name.strip_eth_namehash_unicode_replace_invalid = label
+    name.strip_eth_namehash_unicode_replace_invalid_long_name = label
+    name.strip_eth_namehash_unicode_long_name = label
+    name.strip_eth_namehash_long_name = label
+
+    features = {'gender': {'M': 0.5, 'F': 0.5}, 'country': 'us', 'person_name_type': 'first last'} \
+        if type_ == 'person' else {}
+    interpretation = Interpretation(type_, 'en', tokens, 1.0, features=features)
+    name.add_type(type_, 'en', 1.0)
+    name.add_interpretation(interpretation)
+    return name
+
+
+def generator_params(config: DictConfig) -> dict[str, Any]:
+    return {
+        'mode': 'full',
+        'min_suggestions': config.app.suggestions,
+        'max_suggestions': config.app.suggestions,
+        'min_available_fraction': config.app.min_available_fraction,
+        'country': 'us',
+    }
+
+
+def all_generator_classes() -> list[type[NameGenerator]]:
+    return sorted({cls for _, cls in inspect.getmembers(generation, inspect.isclass)
+                   if issubclass(cls, NameGenerator) and cls is not NameGenerator}, key=lambda cls: cls.__name__)
+
+
+def generator_case(config: DictConfig, generator_class: type[NameGenerator], limit: int) -> Case:
+    def setup():
+        generator = generator_class(config)
+        params = generator_params(config)
+        entries = [entry for entries in CORPUS.values() for entry in entries]
+
+        def run():
+            for label, tokens, type_ in entries:
+                name = make_input_name(label, tokens, type_, params)
+                init_seed_for_thread(seed_label=label)
+                for interpretation in name.interpretations[(type_, 'en')]:
+                    # consumed as far as the sampler usually does
+                    list(islice(generator.apply(name, interpretation), limit))
+
+        return run
+
+    return Case(f'generator/{generator_class.__name__}', setup, group='generator')
+
+
+def tokenizer_cases(config: DictConfig) -> list[Case]:
+    def tokenizer_case(class_name: str) -> Case:
+        def setup():
+            from namegraph import tokenization
+            from namegraph.tokenization.wordninja_tokenizer import WordNinjaModel
+            tokenizer = getattr(tokenization, class_name)(config)
+
+            def run():
+                # the tokenization cache would serve every run after the first one
+                WordNinjaModel(config).cache.clear()
+                for label in LABELS:
+                    list(islice(tokenizer.tokenize(label), 1000))
+
+            return run
+
+        return Case(f'tokenizer/{class_name}', setup, group='tokenizer')
+
+    return [tokenizer_case(name) for name in ('AllTokenizer', 'WordNinjaTokenizer', 'BigramLongestTokenizer')]
+
+
+def ngrams_case(config: DictConfig) -> Case:
+    def setup():
+        from namegraph.namehash_common.ngrams import Ngrams
+        ngrams = Ngrams(config)
+
+        def run():
+            for tokens in TOKENIZATIONS:
+                ngrams.sequence_probability(list(tokens))
+
+        return run
+
+    return Case('ngrams/sequence_probability', setup, group='ngrams')
+
+
+def person_names_case(config: DictConfig) -> Case:
+    def setup():
+        from namegraph.utils.person_names import PersonNames
+        person_names = PersonNames(config)
+
+        def run():
+            for label in LABELS:
+                person_names.tokenize(label, topn=1)
+
+        return run
+
+    return Case('person_names/tokenize', setup, group='person_names')
+
+
+def status_dict_config(config: DictConfig) -> DictConfig:
+    config = copy.deepcopy(config)
+    config.app.domains_status_dict = True
+    return config
+
+
+def domains_case(config: DictConfig, status_dict: bool = False) -> Case:
+    if status_dict:
+        config = status_dict_config(config)
+
+    def setup():
+        Domains.remove_self()
+        domains = Domains(config)
+        # the statuses are checked for every sampled suggestion, so the labels are extended with typical variants
+        names = [variant for label in LABELS for variant in (label, label + 's', 'the' + label, label + 'dao')]
+
+        def run():
+            for name in names:
+                domains.get_name_status(name)
+
+        return run
+
+    return Case('domains/get_name_status' + '/status_dict' * status_dict, setup, group='domains')
+
+
+def status_assignment_case(config: DictConfig, status_dict: bool = False) -> Case:
+    if status_dict:
+        config = status_dict_config(config)
+    # candidates as seen by the sampling loop: mostly unregistered variants (leet, affixes, keycaps) of the labels,
+    # every one gets its status assigned, even if it is discarded afterwards
+    candidates = [variant for label in LABELS for variant in (
+        label, label + 's', label.replace('e', '3').replace('o', '0'), label.replace('a', '4').replace('i', '1'),
+        '_' + label, label + '_', '$' + label, label + '1\ufe0f\u20e3', label + 'dao', 'the' + label,
+    )]
+
+    def setup():
+        Domains.remove_self()
+        domains = Domains(config)
+        suggestions = [GeneratedName((candidate,)) for candidate in candidates]
+
+        def run():
+            for suggestion in suggestions:
+                suggestion.status = domains.get_name_status(str(suggestion))
+
+        return run
+
+    return Case('domains/assign_statuses' + '/status_dict' * status_dict, setup, group='domains',
+                items=len(candidates))
+
+
+def domains_init_case(config: DictConfig, status_dict: bool = False) -> Case:
+    if status_dict:
+        config = status_dict_config(config)
+
+    def setup():
+        Domains.remove_self()
+        Domains(config)  # builds the snapshot, if it does not exist
+
+        def run():
+            Domains.remove_self()
+            Domains(config)
+
+        return run
+
+    def worker():
+        # the instance inherited from the benchmark process is kept, so that the new one is not built in its memory
+        previous = Domains(config)
+        Domains.remove_self()
+        return previous, Domains(config)
+
+    return Case('domains/init' + '/status_dict' * status_dict, setup, group='domains', worker=worker)
+
+
+class _Pipeline:
+    def __init__(self, pipeline_name: str):
+        self.pipeline_name = pipeline_name
+
+
+def sampler_cases(config: DictConfig) -> list[Case]:
+    def sampler_case(class_name: str) -> Case:
+        def setup():
+            from namegraph.sampling import WeightedSorterWithOrder
+            from namegraph.sampling.round_robin_sampler import RoundRobinSampler
+            sampler_class = {'WeightedSorterWithOrder': WeightedSorterWithOrder,
+                             'RoundRobinSampler': RoundRobinSampler}[class_name]
+            pipelines = [_Pipeline(f'pipeline{i}') for i in range(40)]
+            weights = {pipeline: 1.0 + i % 7 for i, pipeline in enumerate(pipelines)}
+
+            def run():
+                init_seed_for_thread(seed_label='sampler')
+                sampler = sampler_class(config, pipelines, dict(weights))
+                # every tenth sampled pipeline runs out of suggestions
+                for i in range(1000):
+                    try:
+                        pipeline = next(sampler)
+                    except StopIteration:
+                        break
+                    if i % 10 == 9:
+                        sampler.pipeline_used(pipeline)
+
+            return run
+
+        return Case(f'sampler/{class_name}', setup, group='sampler')
+
+    return [sampler_case(name) for name in ('WeightedSorterWithOrder', 'RoundRobinSampler')]
+
+
+def meta_sampler_case(config: DictConfig) -> Case:
+    def setup():
+        from namegraph.xgenerator import Generator
+        Domains.remove_self()
+        generator = Generator(config)
+        params = generator_params(config)
+
+        # preprocessed once, every run samples from a fresh copy with an empty pipelines cache
+        templates = []
+        for label in LABELS:
+            name = InputName(label, copy.deepcopy(params))
+            generator._preprocess(name)
+            templates.append(name)
+
+        def run():
+            for template in templates:
+                name = copy.copy(template)
+                name.pipelines_cache = collections.defaultdict(dict)
+                name.deadline = Deadline()
+                generator.metasampler.sample(name, 'weighted-sampling',
+                                             min_suggestions=params['min_suggestions'],
+                                             max_suggestions=params['max_suggestions'],
+                                             min_available_fraction=params['min_available_fraction'])
+
+        return run
+
+    return Case('meta_sampler/sample', setup, group='meta_sampler')
+
+
+def all_cases(config: DictConfig, limit: int = 100, with_elasticsearch: bool = False) -> list[Case]:
+    cases = [generator_case(config, generator_class, limit) for generator_class in all_generator_classes()
+             if with_elasticsearch or generator_class.__name__ not in ELASTICSEARCH_GENERATORS]
+    cases.extend(tokenizer_cases(config))
+    cases.append(ngrams_case(config))
+    cases.append(person_names_case(config))
+    for status_dict in (False, True):
+        cases.append(domains_case(config, status_dict))
+        cases.append(status_assignment_case(config, status_dict))
+        cases.append(domains_init_case(config, status_dict))
+    cases.extend(sampler_cases(config))
+    cases.append(meta_sampler_case(config))
+    return cases
+
+
+def select_cases(cases: list[Case], patterns: list[str]) -> list[Case]:
+    if not patterns:
+        return cases
+    return [case for case in cases if any(pattern.lower() in case.name.lower() for pattern in patterns)]
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Per-component micro-benchmarks compared with a baseline.')
+    parser.add_argument('-c', '--config', default='test_config_new', help='config name')
+    parser.add_argument('-o', '--override', action='append', default=[], help='config override, e.g. ngrams.lazy_loading=false')
+    parser.add_argument('-k', dest='patterns', action='append', default=[], help='run only cases containing the string')
+    parser.add_argument('--repeat', type=int, default=5, help='number of measured runs of every case')
+    parser.add_argument('--warmup', type=int, default=1, help='number of not measured runs of every case')
+    parser.add_argument('--limit', type=int, default=100, help='number of suggestions taken from every generator')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH, help='baseline file')
+    parser.add_argument('--update', action='store_true', help='save the results as the new baseline')
+    parser.add_argument('--time-tolerance', type=float, default=0.25, help='allowed relative increase of the wall time')
+    parser.add_argument('--memory-tolerance', type=float, default=0.10, help='allowed relative increase of the allocated memory')
+    parser.add_argument('--with-elasticsearch', action='store_true', help='benchmark also the generators querying Elasticsearch')
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config, args.override)
+    cases = select_cases(all_cases(config, args.limit, args.with_elasticsearch), args.patterns)
+    results = run_cases(cases, repeat=args.repeat, warmup=args.warmup)
+
+    if args.update:
+        baseline = load_baseline(args.baseline) or {'results': {}}
+        # updating a subset of the cases keeps the baseline of the others
+        save_baseline(args.baseline, {**baseline['results'], **results},
+                      config=args.config, overrides=args.override, limit=args.limit)
+        print(f'Baseline saved to {args.baseline}')
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f'No baseline at {args.baseline}, run with --update to create it')
+        return 0
+
+    comparison = compare(results, baseline, args.time_tolerance, args.memory_tolerance)
+    print(format_comparison(comparison))
+    compared = {row['name'] for row in comparison}
+    not_compared = [name for name in results if name not in compared]
+    if not_compared:
+        print(f'{len(not_compared)} not compared (skipped or not in the baseline): {", ".join(not_compared)}')
+    regressed = [row['name'] for row in comparison if 'regressions' in row]
+    if regressed:
+        print(f'{len(regressed)} regressed: {", ".join(regressed)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""
+Measuring benchmark cases and comparing the results with a baseline file.
+"""
+from __future__ import annotations
+
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from namegraph.utils.memory import rss_bytes
+
+# differences below these are not reported as regressions, whatever the relative change
+NOISE_FLOOR = {
+    'wall_time_ms': 0.1,
+    'allocated_bytes': 4096,
+}
+
+
+class Case:
+    """
+    A benchmarked component. `setup` builds the component (not measured) and returns a function running it
+    over the whole corpus once. With `items` (the number of items processed by one run) the throughput is reported.
+    With `worker` (a function building the component) the growth of the resident memory of a forked worker
+    building it is reported, i.e. the memory every worker of the server pays for the component.
+    """
+
+    def __init__(self, name: str, setup: Callable[[], Callable[[], Any]], group: str = 'other',
+                 items: Optional[int] = None, worker: Optional[Callable[[], Any]] = None):
+        self.name = name
+        self.setup = setup
+        self.group = group
+        self.items = items
+        self.worker = worker
+
+
+def max_rss_bytes() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024  # kilobytes on Linux
+
+
+def worker_rss_bytes(build: Callable[[], Any]) -> Optional[int]:
+    """
+    Returns how much the resident memory of a forked process grows by `build`: the memory it allocates
+    and the pages of the mapped files it touches. `None` where forking or the resident memory is not available.
+    """
+    if not hasattr(os, 'fork') or rss_bytes() is None:
+        return None
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read)
+            before = rss_bytes()
+            built = [build()]  # kept alive until the memory is read
+            os.write(write, str(rss_bytes() - before).encode())
+            built.clear()
+        finally:
+            os._exit(0)
+    os.close(write)
+    with os.fdopen(read) as f:
+        grown = f.read()
+    os.waitpid(pid, 0)
+    return int(grown) if grown else None
+
+
+def measure(run: Callable[[], Any], repeat: int = 5, warmup: int = 1, min_time: float = 0.05) -> dict[str, float]:
+    """
+    Returns the wall time of one run and the memory of an additional run traced by tracemalloc.
+    Every of the `repeat` samples loops the run until it takes at least `min_time` seconds,
+    `wall_time_ms` is the fastest sample (the least disturbed by the rest of the machine).
+    Memory: `allocated_bytes` - peak of the memory allocated during the run, `retained_bytes` - memory still
+    allocated after the run (e.g. by caches), `max_rss_bytes` - peak resident memory of the process so far.
+    The warm-up runs fill lazy-loaded data and caches, which are not what the benchmark measures.
+    """
+    for _ in range(warmup):
+        run()
+
+    def sample(loops: int) -> float:
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        return time.perf_counter() - start
+
+    loops = 1
+    while (elapsed := sample(loops)) < min_time and loops < 10000:
+        loops = min(10000, max(loops * 2, int(loops * min_time / max(elapsed, 1e-9))))
+
+    times = [elapsed / loops] + [sample(loops) / loops for _ in range(repeat - 1)]
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        run()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'wall_time_ms': min(times) * 1000,
+        'wall_time_median_ms': statistics.median(times) * 1000,
+        'loops': loops,
+        'allocated_bytes': peak - before,
+        'retained_bytes': after - before,
+        'max_rss_bytes': max_rss_bytes(),
+    }
+
+
+def run_cases(cases: list[Case], repeat: int = 5, warmup: int = 1,
+              log: Callable[[str], None] = print) -> dict[str, dict[str, Any]]:
+    """
+    Runs all the cases; a case which cannot be set up or run (e.g. because of missing data) is reported as skipped.
+    """
+    results = {}
+    for case in cases:
+        try:
+            run = case.setup()
+            run()  # the first warm-up run, lazily loaded data is loaded here
+        except Exception as e:
+            reason = f'{e.__class__.__name__}: {" ".join(str(e).replace("*", "").split())}'[:200]
+            log(f'{case.name}: skipped ({reason})')
+            results[case.name] = {'group': case.group, 'skipped': reason}
+            continue
+
+        result = measure(run, repeat=repeat, warmup=max(warmup - 1, 0))
+        details = ''
+        if case.items is not None:
+            result['items_per_second'] = case.items / (result['wall_time_ms'] / 1000)
+            details = f', {result["items_per_second"]:,.0f} items/s'
+        if case.worker is not None and (grown := worker_rss_bytes(case.worker)) is not None:
+            result['worker_rss_bytes'] = grown
+            details += f', {grown / 2 ** 20:.1f} MiB worker RSS'
+        results[case.name] = {'group': case.group, **result}
+        log(f'{case.name}: {result["wall_time_ms"]:.3f} ms, {result["allocated_bytes"] / 1024:.1f} KiB allocated'
+            f'{details}')
+    return results
+
+
+def machine_info() -> dict[str, str]:
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+    }
+
+
+def load_baseline(path: Path) -> Optional[dict[str, Any]]:
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path: Path, results: dict[str, dict[str, Any]], **metadata) -> None:
+    """
+    The skipped cases are not saved, a case gets into the baseline only when it is measured.
+    """
+    results = {name: result for name, result in results.items() if 'skipped' not in result}
+    with open(path, 'w') as f:
+        json.dump({'machine': machine_info(), **metadata, 'results': results}, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(
+        results: dict[str, dict[str, Any]],
+        baseline: dict[str, Any],
+        time_tolerance: float = 0.25,
+        memory_tolerance: float = 0.10,
+) -> list[dict[str, Any]]:
+    """
+    Returns the comparison of every case measured both now and in the baseline. A case regressed
+    if its wall time or allocated memory grew by more than the tolerance (a fraction of the baseline value)
+    and by more than the noise floor of the metric.
+    """
+    comparison = []
+    for name, result in results.items():
+        base = baseline['results'].get(name)
+        if base is None or 'skipped' in result or 'skipped' in base:
+            continue
+
+        row = {'name': name}
+        for metric, tolerance in (('wall_time_ms', time_tolerance), ('allocated_bytes', memory_tolerance)):
+            ratio = result[metric] / base[metric] if base[metric] else 1.0
+            row[metric] = (base[metric], result[metric], ratio)
+            if ratio > 1 + tolerance and result[metric] - base[metric] > NOISE_FLOOR[metric]:
+                row.setdefault('regressions', []).append(metric)
+        comparison.append(row)
+    return comparison
+
+
+def format_comparison(comparison: list[dict[str, Any]]) -> str:
+    lines = [f'{"case":<55} {"time ms":>10} {"base":>10} {"ratio":>6}  {"alloc KiB":>10} {"base":>10} {"ratio":>6}']
+    for row in comparison:
+        base_time, time_ms, time_ratio = row['wall_time_ms']
+        base_allocated, allocated, allocated_ratio = row['allocated_bytes']
+        flag = '  REGRESSION: ' + ', '.join(row['regressions']) if 'regressions' in row else ''
+        lines.append(f'{row["name"]:<55} {time_ms:>10.3f} {base_time:>10.3f} {time_ratio:>6.2f}  '
+                     f'{allocated / 1024:>10.1f} {base_allocated / 1024:>10.1f} {allocated_ratio:>6.2f}{flag}')
+    return '\n'.join(lines)
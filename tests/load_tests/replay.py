@@ -0,0 +1,267 @@
+"""
+Replays logged requests against the in-process app and reports latency percentiles per endpoint
+and the time each pipeline contributed.
+
+Input: JSON lines, either the request logs of the app (`LogEntry` entries and the `{"endpoint", "request"}`
+entries of the other endpoints, optionally prefixed by the log formatter) or hand-written lines like
+`{"endpoint": "/suggestions_by_category", "request": {"label": "zeus"}}` (`body` is accepted for `request`).
+Entries without `endpoint` are requests of `/`.
+
+Run from the repository root:
+```
+python -m tests.load_tests.replay requests.log --concurrency 8 --rate 20 --config test_config_new
+```
+With `--rate` the requests arrive as a Poisson process (open loop) and the latency includes the time
+a request waited for a free slot; without it, `--concurrency` clients send requests back to back (closed loop).
+The time per pipeline comes from the request traces (requested with the `X-Debug-Trace` header), disable with `--no-trace`.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+
+import numpy as np
+
+ROOT_PATH = Path(__file__).resolve().parent.parent.parent
+
+# keys added to the logged requests by `LogEntry`, not a part of the request
+LOG_ENTRY_KEYS = ('user', 'session')
+
+
+class ReplayRequest:
+    def __init__(self, path: str, body: dict[str, Any]):
+        self.path = path
+        self.body = body
+
+
+def parse_line(line: str) -> Optional[ReplayRequest]:
+    """
+    Returns the request of a log line or `None` if the line is not a logged request.
+    """
+    start = line.find('{')
+    if start == -1:
+        return None
+    try:
+        entry = json.loads(line[start:])
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(entry, dict):
+        return None
+
+    body = entry.get('request', entry.get('body'))
+    if not isinstance(body, dict):
+        return None
+    body = {key: value for key, value in body.items() if key not in LOG_ENTRY_KEYS}
+
+    endpoint = entry.get('endpoint', '/')
+    path = endpoint if endpoint.startswith('/') else '/' + endpoint
+    return ReplayRequest(path, body)
+
+
+def read_requests(paths: Iterable[Path]) -> list[ReplayRequest]:
+    requests = []
+    for path in paths:
+        with open(path) as f:
+            requests.extend(request for line in f if (request := parse_line(line)) is not None)
+    return requests
+
+
+def collect_spans(span: dict[str, Any], name: str) -> Iterator[dict[str, Any]]:
+    if span['name'] == name:
+        yield span
+    for child in span.get('children', ()):
+        yield from collect_spans(child, name)
+
+
+def extract_trace(response) -> Optional[dict[str, Any]]:
+    try:
+        body = response.json()
+    except ValueError:
+        return None
+    return body.get('trace') if isinstance(body, dict) else None
+
+
+class Report:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = collections.defaultdict(list)
+        self.errors: collections.Counter[str] = collections.Counter()
+        self.statuses: dict[str, collections.Counter[int]] = collections.defaultdict(collections.Counter)
+        self.pipeline_ms: collections.Counter[str] = collections.Counter()
+        self.pipeline_requests: collections.Counter[str] = collections.Counter()
+        self.elasticsearch_ms = 0.0
+        self.elasticsearch_queries = 0
+        self.traced_requests = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def add(self, path: str, latency: float, status: int, trace: Optional[dict[str, Any]]):
+        self.latencies[path].append(latency)
+        self.statuses[path][status] += 1
+        if status != 200:
+            self.errors[path] += 1
+        if trace is None:
+            return
+
+        self.traced_requests += 1
+        pipelines = collections.Counter()
+        for span in collect_spans(trace, 'pipeline'):
+            pipelines[span['attributes']['pipeline']] += span['duration_ms']
+        self.pipeline_ms.update(pipelines)
+        self.pipeline_requests.update(pipelines.keys())
+        for span in collect_spans(trace, 'elasticsearch'):
+            self.elasticsearch_ms += span['duration_ms']
+            self.elasticsearch_queries += 1
+
+    def to_dict(self) -> dict[str, Any]:
+        duration = (self.finished or time.perf_counter()) - self.started
+        endpoints = {}
+        for path, latencies in sorted(self.latencies.items()):
+            p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1000
+            endpoints[path] = {
+                'requests': len(latencies),
+                'errors': self.errors[path],
+                'statuses': dict(self.statuses[path]),
+                'p50_ms': p50,
+                'p90_ms': p90,
+                'p99_ms': p99,
+                'max_ms': max(latencies) * 1000,
+                'throughput_rps': len(latencies) / duration,
+            }
+        pipelines = {
+            pipeline: {
+                'total_ms': total,
+                'requests': self.pipeline_requests[pipeline],
+                'mean_ms_per_request': total / self.pipeline_requests[pipeline],
+            }
+            for pipeline, total in self.pipeline_ms.most_common()
+        }
+        return {
+            'duration_s': duration,
+            'endpoints': endpoints,
+            'pipelines': pipelines,
+            'elasticsearch': {'queries': self.elasticsearch_queries, 'total_ms': self.elasticsearch_ms},
+            'traced_requests': self.traced_requests,
+        }
+
+    def format(self) -> str:
+        report = self.to_dict()
+        lines = [f'{"endpoint":<40} {"requests":>8} {"errors":>6} {"p50 ms":>9} {"p90 ms":>9} '
+                 f'{"p99 ms":>9} {"max ms":>9} {"rps":>7}']
+        for path, stats in report['endpoints'].items():
+            lines.append(f'{path:<40} {stats["requests"]:>8} {stats["errors"]:>6} {stats["p50_ms"]:>9.1f} '
+                         f'{stats["p90_ms"]:>9.1f} {stats["p99_ms"]:>9.1f} {stats["max_ms"]:>9.1f} '
+                         f'{stats["throughput_rps"]:>7.2f}')
+        if report['pipelines']:
+            all_ms = sum(stats['total_ms'] for stats in report['pipelines'].values())
+            lines.append('')
+            lines.append(f'{"pipeline":<40} {"total ms":>10} {"share":>6} {"requests":>8} {"ms/request":>10}')
+            for pipeline, stats in report['pipelines'].items():
+                lines.append(f'{pipeline:<40} {stats["total_ms"]:>10.1f} {stats["total_ms"] / all_ms:>6.1%} '
+                             f'{stats["requests"]:>8} {stats["mean_ms_per_request"]:>10.2f}')
+            lines.append(f'Elasticsearch: {report["elasticsearch"]["queries"]} queries, '
+                         f'{report["elasticsearch"]["total_ms"]:.1f} ms')
+        return '\n'.join(lines)
+
+
+async def replay(
+        app,
+        requests: list[ReplayRequest],
+        concurrency: int = 4,
+        rate: Optional[float] = None,
+        trace: bool = True,
+        seed: int = 0,
+) -> Report:
+    """
+    Sends the requests to the ASGI app in order. With `rate` (requests per second) the requests are sent
+    at Poisson arrival times, at most `concurrency` at once; otherwise `concurrency` clients send them back to back.
+    """
+    import httpx
+
+    report = Report()
+    headers = {'X-Debug-Trace': 'true'} if trace else {}
+    rng = random.Random(seed)
+    slots = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://replay',
+                                 timeout=None) as client:
+        async def send(request: ReplayRequest, arrival: float):
+            async with slots:
+                response = await client.post(request.path, json=request.body, headers=headers)
+            # measured from the arrival, so the time waiting for a slot is not hidden (coordinated omission)
+            report.add(request.path, time.perf_counter() - arrival, response.status_code,
+                       extract_trace(response) if response.status_code == 200 else None)
+
+        if rate:
+            tasks = []
+            arrival = time.perf_counter()
+            for request in requests:
+                arrival += rng.expovariate(rate)
+                await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+                tasks.append(asyncio.create_task(send(request, arrival)))
+            await asyncio.gather(*tasks)
+        else:
+            queue = collections.deque(requests)
+
+            async def worker():
+                while queue:
+                    await send(queue.popleft(), time.perf_counter())
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    report.finished = time.perf_counter()
+    return report
+
+
+def load_app(config_name: str, overrides: list[str]):
+    os.chdir(ROOT_PATH)  # the data paths in the configs are relative to the repository root
+    sys.path.insert(0, str(ROOT_PATH))
+    os.environ['CONFIG_NAME'] = config_name
+    os.environ['CONFIG_OVERRIDES'] = json.dumps(overrides)
+    import web_api
+    return web_api.app
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Replays logged requests against the in-process app.')
+    parser.add_argument('inputs', nargs='+', type=Path, help='request logs or JSON lines files with requests')
+    parser.add_argument('-c', '--config', default='prod_config_new', help='config name')
+    parser.add_argument('-o', '--override', action='append', default=[], help='config override')
+    parser.add_argument('--concurrency', type=int, default=4, help='maximum number of requests in flight')
+    parser.add_argument('--rate', type=float, default=None, help='arrival rate (requests per second), open loop')
+    parser.add_argument('--limit', type=int, default=None, help='replay only the first N requests')
+    parser.add_argument('--repeat', type=int, default=1, help='replay the requests N times')
+    parser.add_argument('--warmup', type=int, default=0, help='send the first N requests before measuring')
+    parser.add_argument('--no-trace', action='store_true', help='do not request the traces (no time per pipeline)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the arrival times')
+    parser.add_argument('--output', type=Path, default=None, help='save the report as JSON')
+    args = parser.parse_args(argv)
+
+    requests = read_requests(args.inputs)[:args.limit] * args.repeat
+    if not requests:
+        print('No requests found')
+        return 1
+    print(f'Replaying {len(requests)} requests')
+
+    app = load_app(args.config, args.override)
+    if args.warmup:
+        asyncio.run(replay(app, requests[:args.warmup], concurrency=args.concurrency, trace=False))
+    report = asyncio.run(replay(app, requests, concurrency=args.concurrency, rate=args.rate,
+                                trace=not args.no_trace, seed=args.seed))
+
+    print(report.format())
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report.to_dict(), f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
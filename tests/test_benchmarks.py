@@ -0,0 +1,55 @@
+from hydra import compose, initialize
+
+from benchmarks.components import all_cases, all_generator_classes
+from benchmarks.measure import Case, compare, run_cases, load_baseline, save_baseline
+
+
+def test_compare_reports_regressions_above_tolerance_and_noise_floor():
+    baseline = {'results': {
+        'slower': {'wall_time_ms': 10.0, 'allocated_bytes': 100_000},
+        'noisy': {'wall_time_ms': 0.01, 'allocated_bytes': 100},
+        'bigger': {'wall_time_ms': 10.0, 'allocated_bytes': 100_000},
+        'skipped': {'skipped': 'no data'},
+    }}
+    results = {
+        'slower': {'wall_time_ms': 13.0, 'allocated_bytes': 100_000},
+        'noisy': {'wall_time_ms': 0.05, 'allocated_bytes': 1000},
+        'bigger': {'wall_time_ms': 10.0, 'allocated_bytes': 120_000},
+        'skipped': {'wall_time_ms': 10.0, 'allocated_bytes': 100},
+        'new': {'wall_time_ms': 10.0, 'allocated_bytes': 100},
+    }
+
+    comparison = {row['name']: row for row in compare(results, baseline)}
+    assert set(comparison) == {'slower', 'noisy', 'bigger'}
+    assert comparison['slower']['regressions'] == ['wall_time_ms']
+    assert 'regressions' not in comparison['noisy']
+    assert comparison['bigger']['regressions'] == ['allocated_bytes']
+
+
+def test_run_cases_skips_cases_without_data():
+    def missing_data():
+        raise FileNotFoundError('data/missing.csv')
+
+    results = run_cases([Case('missing', missing_data), Case('sum', lambda: lambda: sum(range(100)))],
+                        repeat=2, log=lambda message: None)
+    assert results['missing']['skipped'] == 'FileNotFoundError: data/missing.csv'
+    assert results['sum']['wall_time_ms'] > 0
+    assert results['sum']['allocated_bytes'] >= 0
+
+
+def test_save_baseline_leaves_out_skipped_cases(tmp_path):
+    path = tmp_path / 'baseline.json'
+    save_baseline(path, {'missing': {'group': 'other', 'skipped': 'FileNotFoundError: data/missing.csv'},
+                         'sum': {'group': 'other', 'wall_time_ms': 0.1, 'allocated_bytes': 10}}, limit=100)
+    baseline = load_baseline(path)
+    assert set(baseline['results']) == {'sum'}
+    assert baseline['limit'] == 100
+
+
+def test_all_generators_are_benchmarked():
+    with initialize(version_base=None, config_path="../conf/"):
+        config = compose(config_name="test_config_new")
+    names = {case.name for case in all_cases(config, with_elasticsearch=True)}
+    assert {f'generator/{cls.__name__}' for cls in all_generator_classes()} <= names
+    assert 'generator/PermuteGenerator' in names
+    assert 'meta_sampler/sample' in names
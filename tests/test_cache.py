@@ -0,0 +1,62 @@
+import time
+
+from namegraph.utils import LRUCache
+from namegraph.utils.cache import freeze
+
+
+def test_lru_cache_eviction():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'b' becomes the least recently used
+    cache.put('c', 3)
+
+    assert 'b' not in cache
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.get('b') is None
+
+    stats = cache.stats()
+    assert stats['size'] == 2
+    assert stats['hits'] == 3
+    assert stats['misses'] == 1
+    assert stats['evictions'] == 1
+
+
+def test_lru_cache_ttl():
+    cache = LRUCache(maxsize=10, ttl=0.05)
+    cache.put('a', 1)
+    assert cache.get('a') == 1
+    time.sleep(0.1)
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_lru_cache_disabled():
+    cache = LRUCache(maxsize=0)
+    cache.put('a', 1)
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_freeze():
+    assert freeze({'b': [1, 2], 'a': {'c': None}}) == freeze({'a': {'c': None}, 'b': (1, 2)})
+    assert freeze({'mode': 'full'}) != freeze({'mode': 'instant'})
+    hash(freeze({'a': [{'b': {1, 2}}]}))
+
+
+def test_lru_cache_maxbytes():
+    cache = LRUCache(maxsize=10, maxbytes=100)
+    cache.put('a', 1, nbytes=40)
+    cache.put('b', 2, nbytes=40)
+    cache.put('a', 3, nbytes=50)  # replacing an entry updates the total size
+    assert cache.nbytes == 90
+
+    cache.put('c', 4, nbytes=30)
+    assert 'b' not in cache
+    assert cache.nbytes == 80
+    assert sorted(cache.items_nbytes()) == [('a', 50), ('c', 30)]
+
+    cache.put('d', 5, nbytes=101)  # larger than the whole budget
+    assert 'd' not in cache
+    assert cache.stats()['evictions'] == 1
@@ -0,0 +1,46 @@
+import concurrent.futures
+import time
+
+from namegraph.thread_utils import Deadline, get_deadline, deadline_for_thread, propagate_deadline, until_deadline
+
+
+def test_deadline():
+    deadline = Deadline(0.05)
+    assert not deadline.expired()
+    assert 0 < deadline.remaining() <= 0.05
+
+    time.sleep(0.06)
+    assert deadline.expired()
+    assert deadline.exceeded
+    assert deadline.remaining() == 0.0
+
+
+def test_no_deadline():
+    deadline = Deadline()
+    assert not deadline.expired()
+    assert deadline.remaining() is None
+    assert list(until_deadline(range(3), deadline)) == [0, 1, 2]
+
+
+def test_until_deadline():
+    deadline = Deadline(0.05)
+
+    def slow():
+        for i in range(100):
+            time.sleep(0.01)
+            yield i
+
+    items = list(until_deadline(slow(), deadline))
+    assert 0 < len(items) < 100
+    assert deadline.exceeded
+
+
+def test_deadline_for_thread():
+    deadline = Deadline(10)
+    assert get_deadline().remaining() is None
+    with deadline_for_thread(deadline):
+        assert get_deadline() is deadline
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            assert executor.submit(get_deadline).result() is not deadline
+            assert executor.submit(propagate_deadline(get_deadline)).result() is deadline
+    assert get_deadline() is not deadline
@@ -1,6 +1,7 @@
 import pytest
 
 from namegraph.domains import Domains
+from namegraph.domains_refresher import DomainsRefresher
 from hydra import compose, initialize
 
 
@@ -36,6 +37,24 @@ def test_domains_filtering():
         assert '002' not in domains.taken
 
 
+@pytest.mark.parametrize('status_dict', [False, True])
+def test_domains_status_of_names_set_in_process(status_dict):
+    with initialize(version_base=None, config_path="../conf/"):
+        config = compose(config_name="test_config_new", overrides=[f'app.domains_status_dict={status_dict}'])
+        domains = Domains(config)
+        assert domains.get_name_status('fire') == Domains.ON_SALE
+        assert domains.get_name_status('00002') == Domains.TAKEN
+        assert domains.get_name_status('settheprocess') == Domains.AVAILABLE
+        domains.taken['settheprocess'] = 1.0
+        assert domains.get_name_status('settheprocess') == Domains.TAKEN
+        domains.on_sale['settheprocess'] = 1.0
+        assert domains.get_name_status('settheprocess') == Domains.ON_SALE
+        del domains.on_sale['settheprocess']
+        assert domains.get_name_status('settheprocess') == Domains.TAKEN
+        del domains.taken['settheprocess']
+        assert domains.get_name_status('settheprocess') == Domains.AVAILABLE
+
+
 def test_domains_singleton():
     with initialize(version_base=None, config_path="../conf/"):
         config = compose(config_name="test_config_new")
@@ -45,3 +64,126 @@ def test_domains_singleton():
         Domains.remove_self()
         domains3 = Domains(config)
         assert domains3 != domains
+
+
+def test_domains_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr('namegraph.domains.CACHE_DIR', tmp_path / 'cache')
+    domains_path = tmp_path / 'suggestable_domains.csv'
+    domains_path.write_text(open('tests/data/suggestable_domains.csv').read())
+
+    with initialize(version_base=None, config_path="../conf/"):
+        config = compose(config_name="test_config_new", overrides=[f'app.domains={domains_path}'])
+        domains = Domains(config)
+        snapshot = domains.snapshot_path()
+        assert snapshot.exists()
+        assert domains.get_name_status('fire') == Domains.ON_SALE
+        assert domains.get_name_status('00002') == Domains.TAKEN
+        assert domains.get_name_status('not-in-the-file') == Domains.AVAILABLE
+
+        Domains.remove_self()
+        in_memory = Domains(compose(config_name="test_config_new",
+                                    overrides=[f'app.domains={domains_path}', 'app.domains_snapshot=false']))
+        assert dict(in_memory.taken.items()) == dict(domains.taken.items())
+        assert list(in_memory.only_available) == list(domains.only_available)
+        assert set(in_memory.internet) == set(domains.internet)
+
+        # the snapshot is rebuilt when the file changes
+        with open(domains_path, 'a') as f:
+            f.write('\nnotinthefile.eth,1.0,on_sale\n')
+        Domains.remove_self()
+        domains = Domains(config)
+        assert domains.snapshot_path() != snapshot
+        assert domains.get_name_status('notinthefile') == Domains.ON_SALE
+
+
+def test_domains_reload(tmp_path, monkeypatch):
+    monkeypatch.setattr('namegraph.domains.CACHE_DIR', tmp_path / 'cache')
+    domains_path = tmp_path / 'suggestable_domains.csv'
+    domains_path.write_text(open('tests/data/suggestable_domains.csv').read())
+
+    with initialize(version_base=None, config_path="../conf/"):
+        config = compose(config_name="test_config_new", overrides=[f'app.domains={domains_path}'])
+        domains = Domains(config)
+        snapshot = domains.snapshot
+        domains.taken['addedintheprocess'] = 1.0
+        assert not domains.reload()
+
+        with open(domains_path, 'a') as f:
+            f.write('\nnotinthefile.eth,1.0,taken\n')
+        assert domains.reload()
+        assert domains.get_name_status('notinthefile') == Domains.TAKEN
+        assert domains.get_name_status('fire') == Domains.ON_SALE
+        assert domains.get_name_status('addedintheprocess') == Domains.TAKEN
+        assert domains.snapshot != snapshot
+        assert not snapshot.exists()
+
+
+def test_domains_refresher(tmp_path):
+    domains_path = tmp_path / 'suggestable_domains.csv'
+    domains_path.write_text('name,sort_score,status\n')
+
+    class Generator:
+        def __init__(self, config):
+            self.config = config
+            self.reloads = 0
+
+        def reload_domains(self):
+            self.reloads += 1
+            return {'changed': True}
+
+    with initialize(version_base=None, config_path="../conf/"):
+        config = compose(config_name="test_config_new", overrides=[f'app.domains={domains_path}'])
+        generator = Generator(config)
+        refresher = DomainsRefresher(generator)
+        assert refresher.check() is None
+
+        domains_path.write_text('name,sort_score,status\nfire.eth,1.0,taken\n')
+        assert refresher.check() == {'changed': True}
+        assert refresher.check() is None
+        assert generator.reloads == 1
+        assert refresher.last_report == {'changed': True}
+
+
+def test_domains_refresher_download(tmp_path, monkeypatch):
+    domains_path = tmp_path / 'suggestable_domains.csv'
+    domains_path.write_text('name,sort_score,status\n')
+    remote = {'content': 'name,sort_score,status\n'}
+    downloads = []
+
+    def download_file(self, url, path, override=True):
+        downloads.append(url)
+        with open(path, 'w') as f:
+            f.write(remote['content'])
+
+    monkeypatch.setattr('namegraph.download_from_s3.S3Downloader.download_file', download_file)
+
+    class Generator:
+        def __init__(self, config):
+            self.config = config
+            self.reloads = 0
+
+        def reload_domains(self):
+            self.reloads += 1
+            return {'changed': True}
+
+    with initialize(version_base=None, config_path="../conf/"):
+        config = compose(config_name="test_config_new", overrides=[f'app.domains={domains_path}',
+                                                                   'app.domains_reload.download=true'])
+        downloader, other = Generator(config), Generator(config)
+        refreshers = [DomainsRefresher(downloader), DomainsRefresher(other)]
+        try:
+            # the unchanged file is not replaced, so it is not reloaded
+            mtime = domains_path.stat().st_mtime_ns
+            assert [refresher.check() for refresher in refreshers] == [None, None]
+            assert domains_path.stat().st_mtime_ns == mtime
+            # only the process holding the lock downloads
+            assert len(downloads) == 1
+
+            remote['content'] = 'name,sort_score,status\nfire.eth,1.0,taken\n'
+            assert [refresher.check() for refresher in refreshers] == [{'changed': True}, {'changed': True}]
+            assert len(downloads) == 2
+            assert domains_path.read_text() == remote['content']
+            assert (downloader.reloads, other.reloads) == (1, 1)
+        finally:
+            for refresher in refreshers:
+                refresher.stop()
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+
+import pytest
+
+from namegraph.thread_utils import BoundedExecutor, ExecutorSaturated
+
+
+def test_bounded_executor_runs_tasks():
+    executor = BoundedExecutor('test', max_workers=2, max_queue_size=2)
+    try:
+        futures = [executor.submit(pow, 2, i) for i in range(4)]
+        assert [f.result() for f in futures] == [1, 2, 4, 8]
+
+        stats = executor.stats()
+        assert stats['submitted'] == 4
+        assert stats['completed'] == 4
+        assert stats['queue_depth'] == 0
+        assert stats['active'] == 0
+        assert stats['rejected'] == 0
+    finally:
+        executor.shutdown()
+
+
+def test_bounded_executor_rejects_when_saturated():
+    executor = BoundedExecutor('test', max_workers=1, max_queue_size=1)
+    release = threading.Event()
+    try:
+        running = executor.submit(release.wait)
+        queued = executor.submit(release.wait)
+        with pytest.raises(ExecutorSaturated):
+            executor.submit(release.wait)
+
+        stats = executor.stats()
+        assert stats['rejected'] == 1
+        assert stats['active'] + stats['queue_depth'] == 2
+
+        release.set()
+        running.result()
+        queued.result()
+
+        # slots are released after the tasks are done
+        assert executor.submit(pow, 3, 2).result() == 9
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_bounded_executor_async_run():
+    executor = BoundedExecutor('test', max_workers=1, max_queue_size=0)
+    try:
+        assert asyncio.run(executor.run(sum, [1, 2, 3])) == 6
+    finally:
+        executor.shutdown()
+
+
+def test_bounded_executor_blocks_when_saturated():
+    executor = BoundedExecutor('test', max_workers=1, max_queue_size=0, block=True)
+    release = threading.Event()
+    try:
+        running = executor.submit(release.wait)
+        threading.Timer(0.05, release.set).start()
+
+        # waits for the running task instead of raising ExecutorSaturated
+        assert executor.submit(pow, 2, 3).result() == 8
+        assert running.result()
+
+        stats = executor.stats()
+        assert stats['blocked'] == 1
+        assert stats['rejected'] == 0
+        assert stats['max_wait_time_ms'] > 0
+    finally:
+        release.set()
+        executor.shutdown()
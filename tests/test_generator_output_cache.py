@@ -0,0 +1,99 @@
+from itertools import islice
+
+import pytest
+from hydra import compose, initialize
+
+from namegraph.generation.name_generator import NameGenerator
+from namegraph.input_name import InputName, Interpretation
+from namegraph.pipeline.generator_output_cache import GeneratorOutputCache
+from namegraph.thread_utils import Deadline
+
+
+class CountingGenerator(NameGenerator):
+    def __init__(self, config, n: int):
+        super().__init__(config)
+        self.n = n
+        self.calls = 0
+
+    def generate2(self, name: InputName, interpretation: Interpretation):
+        self.calls += 1
+        return ((token, str(i)) for token in interpretation.tokenization for i in range(self.n))
+
+    def prepare_arguments(self, name: InputName, interpretation: Interpretation):
+        return {'tokens': interpretation.tokenization}
+
+
+class RandomGenerator(CountingGenerator):
+    cacheable = False
+
+
+@pytest.fixture
+def config():
+    GeneratorOutputCache.remove_self()
+    with initialize(version_base=None, config_path="../conf/"):
+        config = compose(config_name="test_config_new")
+        yield config
+    GeneratorOutputCache.remove_self()
+
+
+def apply(cache, generator, tokens):
+    name = InputName(''.join(tokens), {})
+    interpretation = Interpretation('ngram', 'en', tokens, 1.0)
+    return cache.apply(generator, name, interpretation, generator.hash(name, interpretation), 'config')
+
+
+def test_generator_output_cache_prefix(config):
+    cache = GeneratorOutputCache(config)
+    generator = CountingGenerator(config, n=100)
+
+    first = [str(s) for s in islice(apply(cache, generator, ('dog',)), 20)]
+    assert generator.calls == 1
+    assert cache.stats()['generators']['CountingGenerator']['entries'] == 1
+
+    # the cached prefix is served without running the generator
+    second = [str(s) for s in islice(apply(cache, generator, ('dog',)), 10)]
+    assert second == first[:10]
+    assert generator.calls == 1
+
+    # the generator is re-run and fast-forwarded when the prefix runs out
+    full = [str(s) for s in apply(cache, generator, ('dog',))]
+    assert full[:20] == first
+    assert full == [f'dog{i}' for i in range(100)]
+    assert generator.calls == 2
+
+    # the complete output is cached
+    assert [str(s) for s in apply(cache, generator, ('dog',))] == full
+    assert generator.calls == 2
+    assert cache.stats()['generators']['CountingGenerator']['nbytes'] > 0
+
+
+def test_generator_output_cache_returns_copies(config):
+    cache = GeneratorOutputCache(config)
+    generator = CountingGenerator(config, n=3)
+
+    for suggestion in apply(cache, generator, ('cat',)):
+        suggestion.append_strategy_point('SomeFilter')
+
+    for suggestion in apply(cache, generator, ('cat',)):
+        assert suggestion.applied_strategies == [['CountingGenerator']]
+
+
+def test_generator_output_cache_skips_non_cacheable(config):
+    cache = GeneratorOutputCache(config)
+    generator = RandomGenerator(config, n=3)
+
+    list(apply(cache, generator, ('cat',)))
+    list(apply(cache, generator, ('cat',)))
+    assert generator.calls == 2
+    assert len(cache.cache) == 0
+
+
+def test_generator_output_cache_skips_outputs_cut_by_deadline(config):
+    cache = GeneratorOutputCache(config)
+    generator = CountingGenerator(config, n=100)
+
+    name = InputName('dog', {}, Deadline(0.0))
+    interpretation = Interpretation('ngram', 'en', ('dog',), 1.0)
+    name.deadline.expired()
+    list(cache.apply(generator, name, interpretation, generator.hash(name, interpretation), 'config'))
+    assert len(cache.cache) == 0
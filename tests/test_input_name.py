@@ -2,6 +2,7 @@ from hydra import initialize, compose
 
 from namegraph.input_name import InputName
 from namegraph.preprocessor import Preprocessor
+from namegraph.thread_utils import Deadline
 
 
 def test_do():
@@ -17,6 +18,56 @@ def test_do():
                 print(type, interpretation.tokenization, interpretation.in_type_probability, interpretation.features)
 
 
+def test_preprocessing_cache():
+    with initialize(version_base=None, config_path="../conf/"):
+        config = compose(config_name="prod_config_new")
+        do = Preprocessor(config)
+        name = InputName('"chase red"', {})
+        do.do(name)
+
+        cached = InputName('"chase red"', {})
+        assert do.restore(cached)
+        assert cached.is_pretokenized and cached.pretokenization == ('chase', 'red')
+        assert cached.strip_eth_namehash_unicode_replace_invalid_long_name == 'chasered'
+        assert cached.types_probabilities == name.types_probabilities
+        assert cached.interpretations.keys() == name.interpretations.keys()
+        for type_lang, interpretations in cached.interpretations.items():
+            assert [i.tokenization for i in interpretations] \
+                   == [i.tokenization for i in name.interpretations[type_lang]]
+            # the requests do not share the interpretations
+            assert not set(map(id, interpretations)) & set(map(id, name.interpretations[type_lang]))
+        assert do.cache.stats()['hits'] == 1
+
+        # the classification may be cut short when the deadline expires
+        deadline = Deadline(0)
+        deadline.expired()
+        do.do(InputName('chaseblue', {}, deadline))
+        assert not do.restore(InputName('chaseblue', {}))
+
+
+def test_classify_batch():
+    with initialize(version_base=None, config_path="../conf/"):
+        config = compose(config_name="prod_config_new")
+        do = Preprocessor(config)
+        labels = ['chasered', 'johnsmith', 'chasered', '"fire power"',
+                  '[003fda97309fd6aa9d7753dcffa37da8bb964d0fb99eba99d0770e76fc5bac91]']
+
+        names = [InputName(label, {}) for label in labels]
+        for name in names:
+            do.normalize(name)
+        do.classify_batch(names)
+
+        for label, batch_name in zip(labels, names):
+            name = InputName(label, {})
+            do.normalize(name)
+            do.classify(name)
+            assert batch_name.types_probabilities == name.types_probabilities
+            assert {type_lang: [(i.tokenization, i.in_type_probability) for i in interpretations]
+                    for type_lang, interpretations in batch_name.interpretations.items()} \
+                   == {type_lang: [(i.tokenization, i.in_type_probability) for i in interpretations]
+                       for type_lang, interpretations in name.interpretations.items()}
+
+
 def test_normalize():
     with initialize(version_base=None, config_path="../conf/"):
         config = compose(config_name="prod_config_new")
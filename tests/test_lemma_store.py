@@ -0,0 +1,67 @@
+import collections
+
+import pytest
+from hydra import initialize, compose
+
+from namegraph.utils.lemma_store import LemmaStore
+from namegraph.wordnet_lemmas import WordnetLemmas
+
+
+def test_lemma_store(tmp_path):
+    entries = [
+        ('dog', [('dog', 2), ('domestic_dog', 1), ('Canis', 1), ('frank', 1)]),
+        ('dogs', [('dog', 2), ('domestic_dog', 1), ('Canis', 1), ('frank', 1)]),
+        ('frank', [('frank', 3), ('blunt', 1)]),
+        ('łódź', []),
+    ]
+    path = tmp_path / 'lemmas.bin'
+    store = LemmaStore.load_or_build(path, lambda: LemmaStore.build(entries))
+    assert path.exists()
+
+    assert len(store) == 4
+    assert list(store) == ['dog', 'dogs', 'frank', 'łódź']
+    for key, lemma_counts in entries:
+        assert key in store
+        assert store.lemma_counts(key) == lemma_counts
+
+    # lemma names which are not keys
+    assert 'Canis' not in store
+    assert 'blunt' not in store
+    assert 'cat' not in store
+    assert store.lemma_counts('cat') == []
+
+
+def test_lemma_store_duplicate_keys():
+    with pytest.raises(ValueError):
+        LemmaStore.build([('dog', []), ('dog', [('dog', 1)])])
+
+
+def _wordnet_available() -> bool:
+    from nltk.corpus import wordnet as wn
+    try:
+        wn.ensure_loaded()
+    except LookupError:
+        return False
+    return True
+
+
+@pytest.mark.slow
+@pytest.mark.skipif(not _wordnet_available(), reason='WordNet not available')
+def test_wordnet_lemmas_equal_wordnet():
+    from nltk.corpus import wordnet as wn
+
+    with initialize(version_base=None, config_path="../conf/"):
+        config = compose(config_name="test_config_new")
+        wordnet = WordnetLemmas(config)
+
+        for word in ['dog', 'Dogs', 'geese', 'wives', 'running', 'ran', 'better', 'hot_dog', 'USA', 'repeatable',
+                     'eatable', 'rep', 'able', 'xyzzy', '', 'łódź']:
+            synsets = wn.synsets(word)
+            assert wordnet.has_synsets(word) == bool(synsets)
+
+            stats = collections.defaultdict(int)
+            for synset in synsets:
+                for lemma in synset.lemmas():
+                    if '_' not in lemma.name():
+                        stats[str(lemma.name())] += 1
+            assert list(wordnet.lemma_counts(word).items()) == list(stats.items())
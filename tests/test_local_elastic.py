@@ -0,0 +1,139 @@
+import time
+
+import elastic_transport
+import elasticsearch
+import pytest
+
+from namegraph.utils.local_elastic import LocalElasticsearch, LatencyModel
+from namegraph.xcollections.collection import Collection
+from namegraph.xcollections.query_builder import ElasticsearchQueryBuilder, SortOrder
+
+SNAPSHOT = 'tests/data/collections_snapshot.json'
+
+FIELDS = [
+    'data.collection_name', 'template.collection_rank', 'metadata.owner',
+    'metadata.members_count', 'template.top10_names.normalized_name', 'template.top10_names.namehash',
+    'template.collection_types', 'metadata.modified', 'data.avatar_emoji', 'data.avatar_image'
+]
+
+
+@pytest.fixture(scope='module')
+def elastic():
+    return LocalElasticsearch.from_snapshot(SNAPSHOT, index_name='collections')
+
+
+def test_search_by_string(elastic):
+    query_params = ElasticsearchQueryBuilder() \
+        .add_filter('term', {'data.public': True}) \
+        .add_filter('term', {'data.archived': False}) \
+        .add_query('highest mountains', fields=['data.collection_name^3', 'data.names.normalized_name'],
+                   type_='most_fields', type2='query_string') \
+        .add_rank_feature('template.collection_rank', boost=100) \
+        .rescore_with_learning_to_rank('highest mountains', window_size=20, model_name='model',
+                                       feature_set='set', feature_store='store') \
+        .set_source({'includes': ['template.top25_names.tokenized_name']}) \
+        .include_fields(FIELDS) \
+        .add_limit(5) \
+        .build_params()
+
+    response = elastic.search(index='collections', **query_params)
+
+    assert response['hits']['total']['value'] == 1
+    collection = Collection.from_elasticsearch_hit(response['hits']['hits'][0])
+    assert collection.title == 'Highest mountains on Earth'
+    assert collection.names[:2] == ['everest', 'k2']
+    assert collection.tokenized_names[-1] == ('cho', 'yu')
+    assert collection.name_types == ['mountain']
+
+
+def test_filters_sort_and_pagination(elastic):
+    builder = ElasticsearchQueryBuilder() \
+        .add_filter('term', {'data.names.normalized_name': 'queen'}) \
+        .add_filter('term', {'data.archived': False}) \
+        .set_sort_order(SortOrder.ZA, field='data.collection_name.raw') \
+        .set_source(False) \
+        .include_fields(FIELDS)
+
+    response = elastic.search(index='collections', **builder.build_params())
+    titles = [hit['fields']['data.collection_name'][0] for hit in response['hits']['hits']]
+    assert titles == ['Rock bands', 'Music artists and bands from England']
+    assert all('_source' not in hit for hit in response['hits']['hits'])
+
+    response = elastic.search(index='collections', **builder.add_offset(1).add_limit(1).build_params())
+    assert [hit['_id'] for hit in response['hits']['hits']] == ['ri2QqxnAqZT7']
+    assert response['hits']['total']['value'] == 2
+
+    assert elastic.count(index='collections', **ElasticsearchQueryBuilder()
+                         .add_filter('term', {'data.names.normalized_name': 'queen'}).build_params()) == {'count': 2}
+
+
+def test_ids_must_not_and_archived(elastic):
+    response = elastic.search(index='collections', **ElasticsearchQueryBuilder()
+                              .add_ids(['Lm7Rr4Yt9Qa2', 'JCzsKPv4HQ9P', 'missing']).build_params())
+    assert {hit['_id'] for hit in response['hits']['hits']} == {'Lm7Rr4Yt9Qa2', 'JCzsKPv4HQ9P'}
+
+    response = elastic.search(index='collections', **ElasticsearchQueryBuilder()
+                              .add_query('bands', type_='cross_fields')
+                              .add_must_not('term', {'_id': 'sb3KuZp8Xc1d'}).build_params())
+    assert [hit['_id'] for hit in response['hits']['hits']] == ['ri2QqxnAqZT7']
+
+
+def test_script_fields(elastic):
+    response = elastic.search(index='collections', **ElasticsearchQueryBuilder()
+                              .set_term('_id', 'ri2QqxnAqZT7')
+                              .include_fields(['data.collection_name'])
+                              .include_script_field('members', "params['_source'].data.names.stream()"
+                                                               ".skip(2).limit(3).collect(Collectors.toList())")
+                              .include_script_field('script_names', "params['_source'].data.names.stream()"
+                                                                    ".limit(2).map(p -> p.normalized_name)"
+                                                                    ".collect(Collectors.toList())")
+                              .build_params())
+    fields = response['hits']['hits'][0]['fields']
+    assert [member['normalized_name'] for member in fields['members']] == ['radiohead', 'coldplay', 'oasis']
+    assert fields['script_names'] == ['thebeatles', 'queen']
+
+
+def test_get(elastic):
+    response = elastic.get(index='collections', id='JCzsKPv4HQ9P',
+                           _source_includes=['data.collection_name', 'template.top10_names.tokenized_name'])
+    assert response['_source']['data'] == {'collection_name': 'Highest mountains on Earth'}
+    assert response['_source']['template']['top10_names'][0] == {'tokenized_name': ['everest']}
+
+    with pytest.raises(elasticsearch.NotFoundError):
+        elastic.get(index='collections', id='missing')
+
+    assert elastic.indices.exists(index='collections')
+    assert not elastic.indices.exists(index='other')
+
+
+def test_injected_failures_are_reproducible():
+    def outcomes(seed):
+        elastic = LocalElasticsearch.from_snapshot(SNAPSHOT, error_rate=0.3, timeout_rate=0.2, seed=seed)
+        results = []
+        for _ in range(50):
+            try:
+                elastic.count(index='collections')
+                results.append('ok')
+            except elastic_transport.ConnectionTimeout:
+                results.append('timeout')
+            except elastic_transport.ConnectionError:
+                results.append('error')
+        return results
+
+    results = outcomes(seed=1)
+    assert results == outcomes(seed=1)
+    assert {'ok', 'timeout', 'error'} == set(results)
+
+
+def test_latency_and_request_timeout():
+    elastic = LocalElasticsearch.from_snapshot(SNAPSHOT, latency=LatencyModel('constant', ms=30))
+
+    start = time.perf_counter()
+    response = elastic.search(index='collections', size=1)
+    assert time.perf_counter() - start >= 0.03
+    assert response['took'] == 30
+
+    start = time.perf_counter()
+    with pytest.raises(elastic_transport.ConnectionTimeout):
+        elastic.options(request_timeout=0.005).search(index='collections')
+    assert time.perf_counter() - start < 0.03
@@ -0,0 +1,48 @@
+from namegraph.filtering.filter import Filter
+from namegraph.generated_name import GeneratedName
+from namegraph.utils.metrics import MetricsRegistry, Counter, Histogram, REGISTRY, SUGGESTIONS_FILTERED
+
+
+def test_counter():
+    registry = MetricsRegistry()
+    counter = Counter('test_total', 'Test counter', ['pipeline'], registry=registry)
+    counter.inc(pipeline='a')
+    counter.inc(2, pipeline='a')
+    counter.inc(pipeline='b"')
+
+    assert counter.value(pipeline='a') == 3
+    assert registry.render() == '# HELP test_total Test counter\n' \
+                                '# TYPE test_total counter\n' \
+                                'test_total{pipeline="a"} 3\n' \
+                                'test_total{pipeline="b\\""} 1\n'
+
+
+def test_histogram():
+    registry = MetricsRegistry()
+    histogram = Histogram('test_seconds', 'Test histogram', buckets=(0.1, 1.0), registry=registry)
+    histogram.observe(0.05)
+    histogram.observe(0.1)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    assert histogram.count() == 4
+    assert registry.render().splitlines()[2:] == [
+        'test_seconds_bucket{le="0.1"} 2',
+        'test_seconds_bucket{le="1"} 3',
+        'test_seconds_bucket{le="+Inf"} 4',
+        'test_seconds_sum 5.65',
+        'test_seconds_count 4',
+    ]
+
+
+class ShortFilter(Filter):
+    def filter_name(self, name: str) -> bool:
+        return len(name) < 3
+
+
+def test_filter_metrics():
+    before = SUGGESTIONS_FILTERED.value(filter='ShortFilter')
+    names = [GeneratedName(('a',)), GeneratedName(('abc',)), GeneratedName(('ab',))]
+    assert [str(name) for name in ShortFilter().apply(names)] == ['a', 'ab']
+    assert SUGGESTIONS_FILTERED.value(filter='ShortFilter') == before + 1
+    assert 'namegraph_filter_seconds_count{filter="ShortFilter"}' in REGISTRY.render()
@@ -561,6 +561,30 @@ def test_substringmatchgenerator_re_equals_tree():
         assert sorted(re_impl.find('0')) == sorted(tree_impl.find('0'))
 
 
+def test_substringmatchgenerator_trigrams_equal_re():
+    from namegraph.generation.substringmatch_generator import TrigramImpl, ReImpl
+
+    with initialize(version_base=None, config_path="../conf/"):
+        config = compose(config_name="test_config_new")
+        re_impl = ReImpl(config)
+        trigram_impl = TrigramImpl(config)
+        for pattern in ['0', '42', '000', '0004206', '00-00', 'fire', 'zzzzzz']:
+            assert list(trigram_impl.find(pattern)) == list(re_impl.find(pattern))
+
+
+def test_substringmatchgenerator_suffix_array_equals_re(tmp_path, monkeypatch):
+    from namegraph.generation.substringmatch_generator import SuffixArrayImpl, ReImpl
+
+    monkeypatch.setattr('namegraph.generation.substringmatch_generator.CACHE_DIR', tmp_path)
+    with initialize(version_base=None, config_path="../conf/"):
+        config = compose(config_name="test_config_new")
+        re_impl = ReImpl(config)
+        suffix_array_impl = SuffixArrayImpl(config)
+        assert suffix_array_impl.path.exists()
+        for pattern in ['0', '42', '000', '0004206', '00-00', 'fire', 'zzzzzz']:
+            assert list(suffix_array_impl.find(pattern)) == list(re_impl.find(pattern))
+
+
 def test_leet_generator():
     with initialize(version_base=None, config_path="../conf/"):
         config = compose(config_name="test_config_new")
@@ -1,3 +1,5 @@
+import math
+
 from hydra import initialize, compose
 
 from namegraph.namehash_common.ngrams import Ngrams
@@ -47,3 +49,47 @@ def test_gap_prob():
             if None not in (tok1, tok2):
                 break
         assert ngrams.sequence_probability(tok1) < ngrams.sequence_probability(tok2)
+
+
+def test_ngrams_model(tmp_path, monkeypatch):
+    monkeypatch.setattr('namegraph.namehash_common.ngrams.CACHE_DIR', tmp_path / 'cache')
+    (tmp_path / 'unigrams.csv').write_text('word,count\nthe,60\ncat,30\nwhite,10\n')
+    (tmp_path / 'bigrams.csv').write_text('bigram,count\nthe cat,20\nwhite cat,5\ncat dog,2\nthe big cat,1\n')
+    (tmp_path / 'custom.txt').write_text('NFT\ncat\n')
+
+    with initialize(version_base=None, config_path="../conf/"):
+        config = compose(config_name="test_config_new", overrides=[
+            f'ngrams.unigrams={tmp_path}/unigrams.csv',
+            f'ngrams.bigrams={tmp_path}/bigrams.csv',
+            f'ngrams.custom_dictionary={tmp_path}/custom.txt',
+            'ngrams.custom_token_frequency=50',
+        ])
+        ngrams = Ngrams(config)
+        assert ngrams.all_unigrams_count == 100
+        assert ngrams.all_bigrams_count == 28
+        assert list((tmp_path / 'cache').iterdir())
+
+        assert ngrams.unigram_count('cat') == 30
+        assert ngrams.unigram_count('nft') == 50
+        assert ngrams.unigram_count('dog') == 0.01 ** 3  # only in the bigrams
+        assert ngrams.unigram_count('xyz') == 0.01 ** 3
+        assert ngrams.word_probability('the') == 0.6
+
+        assert ngrams.bigram_count('the cat') == 20
+        assert ngrams.bigram_count('the big cat') == 1
+        assert ngrams.bigram_count('cat the') is None
+        assert ngrams.bigram_probability('the', 'cat') == 20 / 60
+        assert ngrams.bigram_probability('cat', 'dog') == 2 / 30
+        assert ngrams.bigram_probability('the big', 'cat') == 1 / 0.01 ** 7
+        assert ngrams.bigram_probability('cat', 'the') == 0.4 * 0.6
+        assert ngrams.bigram_probability('xyz', 'white') == 0.4 * 0.1
+
+        sequences = [['the', 'cat'], ['white', 'cat', 'dog'], ['xyz'], ['cat', 'the', 'xyz', 'cat'], ['the', 'big cat']]
+        assert ngrams.sequence_log_probability(['the', 'cat']) == math.log(0.6) + math.log(20 / 60)
+        assert ngrams.sequence_log_probabilities(sequences) == [ngrams.sequence_log_probability(words)
+                                                                for words in sequences]
+        assert ngrams.sequence_probabilities(sequences) == [ngrams.sequence_probability(words)
+                                                            for words in sequences]
+
+        # the compiled model is loaded by the next instances
+        assert Ngrams(config).sequence_log_probabilities(sequences) == ngrams.sequence_log_probabilities(sequences)
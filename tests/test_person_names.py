@@ -1,3 +1,5 @@
+import json
+
 import pytest
 from pytest import mark
 from hydra import initialize, compose
@@ -34,6 +36,41 @@ def test_person_names(person_names):
     assert result3[0][0] > result2[0][0] > result1[0][0]
 
 
+def test_person_names_index(tmp_path):
+    data = {
+        'firstnames': {'krzysztof': {'PL': {'M': 90, 'F': 10}}, 'john': {'US': {'M': 200}, 'PL': {'M': 10}}},
+        'lastnames': {'wrobel': {'PL': {'M': 40, 'F': 60}}, 'smith': {'US': {'M': 100, 'F': 100}}},
+        'other': {'all': {'PL': 1000, 'US': 4000},
+                  'firstname_initials': {'PL': {'k': 100}, 'US': {'j': 400}},
+                  'lastname_initials': {'PL': {'w': 50}, 'US': {}}},
+        'country_stats': {'PL': [10, 40], 'US': [30, 300]},
+    }
+    for key, value in data.items():
+        (tmp_path / f'{key}.json').write_text(json.dumps(value))
+
+    with initialize(version_base=None, config_path="../conf/"):
+        config = compose(config_name="test_config_new",
+                         overrides=[f'person_names.{key}_path={tmp_path}/{key}.json' for key in data])
+        pn = PersonNames(config)
+
+    assert not pn.tokenize('information')
+
+    assert pn.tokenize('krzysztofwrobel') == [
+        (pytest.approx(0.1 * 0.1 * 0.25), 'PL', ('krzysztof', 'wrobel'), 'first last', {'M': 6 / 7, 'F': 1 / 7})]
+    assert pn.tokenize('kwrobel') == [
+        (pytest.approx(0.1 * 0.1 * 0.25), 'PL', ('k', 'wrobel'), 'last with initial', {'M': 0.4, 'F': 0.6})]
+    assert pn.tokenize('wrobel') == [(pytest.approx(0.025), 'PL', ('wrobel',), 'last', {'M': 0.4, 'F': 0.6})]
+    assert pn.tokenize('johnsmith') == [
+        (pytest.approx(0.05 * 0.05 * 0.75), 'US', ('john', 'smith'), 'first last', {'M': 200 / 201, 'F': 1 / 201})]
+
+    # the user country gets the bonus
+    assert [result[1] for result in pn.score('john')] == ['US', 'PL']
+    assert [result[1] for result in pn.score('john', user_country='PL')] == ['PL', 'US']
+    assert pn.tokenize('john', user_country='PL')[0][0] == pytest.approx(0.01 * 0.25 * 100)
+    assert pn.tokenize('john', topn=2) == pn.score('john')
+    assert pn.tokenize('john', topn=None) == pn.score('john')
+
+
 @mark.xfail
 @mark.parametrize("name", ['john', 'james', 'david'])
 def test_person_names_english_chinese(person_names, name):
@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+from fastapi import FastAPI, Request, Response
+
+from load_tests.replay import ReplayRequest, parse_line, replay
+
+
+def test_parse_line():
+    log_entry = {'type': 'Request&Response', 'request': {'label': 'zeus', 'user': '0x35b3', 'session': 'abc'},
+                 'response': []}
+    request = parse_line('[2024-01-01 12:00:00,000 INFO] ' + json.dumps(log_entry))
+    assert request.path == '/'
+    assert request.body == {'label': 'zeus'}
+
+    request = parse_line(json.dumps({'endpoint': 'suggestions_by_category', 'request': {'label': 'zeus'}}))
+    assert request.path == '/suggestions_by_category'
+
+    request = parse_line(json.dumps({'endpoint': '/batch', 'body': {'labels': ['zeus']}}))
+    assert (request.path, request.body) == ('/batch', {'labels': ['zeus']})
+
+    assert parse_line('[2024-01-01 12:00:00,000 INFO] Start sampling') is None
+    assert parse_line('{"not": "a request"}') is None
+
+
+def test_replay_reports_percentiles_and_pipelines():
+    app = FastAPI()
+
+    @app.post('/')
+    async def generate(request: Request, response: Response):
+        body = await request.json()
+        if body['label'] == 'error':
+            response.status_code = 503
+            return []
+        trace = {'name': 'generate_names', 'children': [
+            {'name': 'sample', 'children': [
+                {'name': 'pipeline', 'attributes': {'pipeline': 'permute'}, 'duration_ms': 2.0},
+                {'name': 'pipeline', 'attributes': {'pipeline': 'prefix'}, 'duration_ms': 1.0,
+                 'children': [{'name': 'elasticsearch', 'duration_ms': 0.5}]},
+            ]},
+        ]}
+        if request.headers.get('X-Debug-Trace') == 'true':
+            return {'suggestions': [], 'trace': trace}
+        return []
+
+    @app.post('/suggestions_by_category')
+    async def grouped():
+        return {'categories': [], 'trace': None}
+
+    requests = [ReplayRequest('/', {'label': 'zeus'})] * 10 + [ReplayRequest('/', {'label': 'error'})] \
+               + [ReplayRequest('/suggestions_by_category', {'label': 'zeus'})] * 5
+    report = asyncio.run(replay(app, requests, concurrency=3)).to_dict()
+
+    assert report['endpoints']['/']['requests'] == 11
+    assert report['endpoints']['/']['errors'] == 1
+    assert report['endpoints']['/suggestions_by_category']['requests'] == 5
+    assert report['endpoints']['/']['p50_ms'] <= report['endpoints']['/']['p99_ms'] <= report['endpoints']['/']['max_ms']
+    assert report['pipelines']['permute'] == {'total_ms': 20.0, 'requests': 10, 'mean_ms_per_request': 2.0}
+    assert report['elasticsearch'] == {'queries': 10, 'total_ms': 5.0}
+
+    report = asyncio.run(replay(app, requests, concurrency=3, rate=1000.0, trace=False)).to_dict()
+    assert report['endpoints']['/']['requests'] == 11
+    assert report['pipelines'] == {}
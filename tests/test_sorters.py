@@ -1,5 +1,7 @@
+from types import SimpleNamespace
 from typing import List
 import itertools
+import time
 
 import pytest
 from pytest import mark
@@ -7,10 +9,12 @@ from hydra import initialize, compose
 
 from namegraph.domains import Domains
 from namegraph.generated_name import GeneratedName
+from namegraph.generation.collection_generator import CollectionGenerator
 from namegraph.input_name import InputName, Interpretation
 from namegraph.meta_sampler import MetaSampler
 from namegraph.pipeline.pipeline_results_iterator import PipelineResultsIterator
 from namegraph.sampling import RoundRobinSampler, WeightedSorterWithOrder, WeightedSorter
+from namegraph.thread_utils import BoundedExecutor
 
 
 @pytest.fixture(autouse=True)
@@ -529,3 +533,80 @@ def test_available_fraction_obligation_weighted_sampling_sorter_available_names_
 
         assert len(sorted_strings) <= max_suggestions
         assert min_expected_available <= len(available_names_set & set(sorted_strings)) <= max_expected_available
+
+
+class SlowPipelineMock(PipelineMock):
+    def __init__(self, pipeline_name, names, uses_request_rng=False, generator=None):
+        super().__init__(pipeline_name, names)
+        self.generator = generator or SimpleNamespace(uses_request_rng=uses_request_rng)
+        self.iterator = PipelineResultsIterator(self._generate())
+
+    def _generate(self):
+        for name in self.names:
+            time.sleep(0.001)
+            yield name
+
+
+def sample_with_warm_up(config, pipelines) -> tuple[list[str], int]:
+    input_name = InputName('asd', {})
+    input_name.add_type('ngram', 'en', 1.0)
+    input_name.add_interpretation(Interpretation('ngram', 'en', ('asd',), 1.0))
+
+    executor = BoundedExecutor('warmup', max_workers=4, max_queue_size=16)
+    try:
+        metasampler = MetaSampler(config, pipelines, executor)
+        all_suggestions = metasampler.sample(input_name, 'weighted-sampling', min_suggestions=30,
+                                             max_suggestions=30, min_available_fraction=0.0)
+    finally:
+        executor.shutdown()
+    return [str(gn) for gn in all_suggestions], executor.stats()['submitted']
+
+
+@mark.parametrize("uses_request_rng", [False, True])
+def test_weighted_sampling_warm_up(uses_request_rng: bool):
+    with initialize(version_base=None, config_path="../conf/"):
+        results = []
+        for warmup in [False, True]:
+            config = compose(config_name="test_config_new", overrides=[f"warmup.enabled={warmup}"])
+            pipelines = [
+                SlowPipelineMock(str(i), [GeneratedName((f'{i}{j}',)) for j in range(20)],
+                                 uses_request_rng=uses_request_rng)
+                for i in range(5)
+            ]
+
+            suggestions, submitted = sample_with_warm_up(config, pipelines)
+            results.append(suggestions)
+            assert submitted == (3 if warmup and not uses_request_rng else 0)
+
+        # the same seed gives the same suggestions
+        assert results[0] == results[1]
+
+
+def test_weighted_sampling_warm_up_collections():
+    # the collection generator is not cacheable, but it does not use the per-request rng, so it is warmed up
+    with initialize(version_base=None, config_path="../conf/"):
+        config = compose(config_name="test_config_new", overrides=["warmup.enabled=true"])
+        generator = object.__new__(CollectionGenerator)  # without connecting to Elasticsearch
+        pipelines = [SlowPipelineMock(str(i), [GeneratedName((f'{i}{j}',)) for j in range(20)], generator=generator)
+                     for i in range(5)]
+
+        _, submitted = sample_with_warm_up(config, pipelines)
+        assert submitted == 3
+
+
+def test_pipeline_results_iterator_prefetch_error():
+    def generate():
+        yield GeneratedName(('a',))
+        raise ValueError('generator failed')
+
+    executor = BoundedExecutor('warmup', max_workers=1, max_queue_size=0)
+    try:
+        iterator = PipelineResultsIterator(generate())
+        iterator.prefetch(executor, 5)
+        assert str(next(iterator)) == 'a'
+        with pytest.raises(ValueError):
+            next(iterator)
+        with pytest.raises(StopIteration):
+            next(iterator)
+    finally:
+        executor.shutdown()
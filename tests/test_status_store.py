@@ -0,0 +1,60 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from namegraph.utils.status_store import StatusStore, StatusMapping, NameSet
+
+TAKEN, ON_SALE = 1, 2
+
+
+def make_store(tmp_path):
+    entries = [('fire', ON_SALE, 3.0), ('water', TAKEN, 2.0), ('fire', TAKEN, 1.5), ('zażółć', TAKEN, 0.5)]
+    entries += [(f'name{i}', TAKEN, float(i)) for i in range(100)]
+    snapshot = StatusStore.build(entries, {'short': [('fire', TAKEN), ('water', TAKEN)]})
+    return StatusStore.load_or_build(tmp_path / 'store.bin', lambda: snapshot)
+
+
+def test_status_store_lookup(tmp_path):
+    store = make_store(tmp_path)
+    assert len(store) == 104
+    assert store.status_mask('fire') == 1 << TAKEN | 1 << ON_SALE
+    assert store.status_mask('earth') == 0
+    assert store.find('earth') == -1
+    index = store.find('zażółć', TAKEN)
+    assert store.name(index) == 'zażółć'
+    assert store.score(index) == 0.5
+    assert store.find('water', ON_SALE) == -1
+    assert store.names(store.group(TAKEN))[:3] == ['water', 'fire', 'zażółć']
+    assert store.names(store.group(ON_SALE)) == ['fire']
+
+
+def test_status_mapping(tmp_path):
+    store = make_store(tmp_path)
+    taken = StatusMapping(store, TAKEN)
+    assert len(taken) == 103
+    assert list(taken)[:3] == ['water', 'fire', 'zażółć']
+    assert taken['fire'] == 1.5
+    assert 'earth' not in taken
+
+    taken['earth'] = 7.0
+    assert taken['earth'] == 7.0
+    assert len(taken) == 104
+    assert list(taken.items())[-1] == ('earth', 7.0)
+
+    short = StatusMapping(store, TAKEN, subset='short')
+    assert dict(short.items()) == {'water': 2.0, 'fire': 1.5}
+    assert 'name1' not in short
+    assert set(NameSet(store, 'short')) == {'water', 'fire'}
+
+
+def test_status_store_built_once_by_concurrent_workers(tmp_path):
+    calls = []
+
+    def build():
+        calls.append(1)
+        time.sleep(0.2)  # the other workers wait on the build lock meanwhile
+        return StatusStore.build([('fire', ON_SALE, 3.0)])
+
+    with ThreadPoolExecutor(4) as executor:
+        stores = list(executor.map(lambda _: StatusStore.load_or_build(tmp_path / 'store.bin', build), range(4)))
+    assert len(calls) == 1
+    assert all(store.status_mask('fire') == 1 << ON_SALE for store in stores)
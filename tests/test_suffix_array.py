@@ -0,0 +1,57 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from namegraph.utils.suffix_array import SuffixArray
+
+NAMES = ['fire', 'firestarter', 'campfire', 'żółw', 'żółwik', '🚀rocket', 'rocket', 'water', 'fire']
+
+
+def test_suffix_array_find(tmp_path):
+    SuffixArray.build(NAMES).save(tmp_path / 'sa')
+    suffix_array = SuffixArray.open(tmp_path / 'sa')
+
+    assert len(suffix_array) == len(NAMES)
+    for pattern in ['fire', 'ire', 'f', 'żółw', 'ół', '🚀', 'rocket', 'ter', 'xyz', 'firestarters']:
+        expected = [name for name in NAMES if pattern in name]
+        assert list(suffix_array.find(pattern, batch=1)) == expected
+        assert list(suffix_array.scan(pattern)) == expected
+
+    assert list(suffix_array.find('')) == []
+    assert list(suffix_array.find('fire\nwater')) == []
+
+
+def test_suffix_array_lazy_order():
+    names = [f'name{i}' for i in range(1000)]
+    suffix_array = SuffixArray.build(names)
+    assert list(islice(suffix_array.find('name', batch=10), 30)) == names[:30]
+    assert list(suffix_array.find('99')) == [name for name in names if '99' in name]
+
+
+def test_suffix_array_load_or_build(tmp_path):
+    calls = []
+
+    def names():
+        calls.append(1)
+        return NAMES
+
+    first = SuffixArray.load_or_build(tmp_path / 'sa', names)
+    second = SuffixArray.load_or_build(tmp_path / 'sa', names)
+    assert len(calls) == 1
+    assert list(first.find('fire')) == list(second.find('fire'))
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['sa', 'sa.lock']  # no temporary directory left
+
+
+def test_suffix_array_built_once_by_concurrent_workers(tmp_path):
+    calls = []
+
+    def names():
+        calls.append(1)
+        time.sleep(0.2)  # the other workers wait on the build lock meanwhile
+        return NAMES
+
+    with ThreadPoolExecutor(4) as executor:
+        arrays = list(executor.map(lambda _: SuffixArray.load_or_build(tmp_path / 'sa', names), range(4)))
+    assert len(calls) == 1
+    expected = [name for name in NAMES if 'fire' in name]
+    assert all(list(suffix_array.find('fire')) == expected for suffix_array in arrays)
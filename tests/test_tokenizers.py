@@ -4,6 +4,7 @@ from typing import List
 import pytest
 from pytest import mark
 from hydra import initialize, compose
+import wordninja
 
 from namegraph.tokenization import (
     BigramTokenizer,
@@ -59,6 +60,25 @@ def test_word_ninja_tokenizer2():
         assert ('york', 'newyork', '123') in tokenized_names
 
 
+def test_word_ninja_tokenizer_batch():
+    with initialize(version_base=None, config_path="../conf/"):
+        config = compose(config_name="test_config_new")
+        tokenizer = WordNinjaTokenizer(config)
+        names = ['braverest', 'yorknewyork123', "it'sthecat's win32intel", '', 'funny💩', 'braverest']
+        expected = [[tuple(wordninja.split(name))] for name in names]
+
+        tokenizer.model.cache.clear()
+        assert tokenizer.tokenize_batch(names) == expected
+        assert [tokenizer.tokenize(name) for name in names] == expected
+        stats = tokenizer.model.cache.stats()
+        assert stats['size'] == 5
+        assert stats['hits'] == 6
+
+        improved_tokenizer = ImprovedWordNinjaTokenizer(config)
+        assert improved_tokenizer.tokenize_batch(names) == [improved_tokenizer.tokenize(name) for name in names]
+        assert improved_tokenizer.tokenize_batch(['funny💩'])[0][0] == ('funny', '💩')
+
+
 @mark.parametrize(
     "name,tokenized_name", [
         ['funny💩', ('funny', '💩')],
@@ -223,6 +243,47 @@ def test_all_tokenizer_time(overrides):
         tokenized_names = tokenizer.tokenize('miinibaashkiminasiganibiitoosijiganibadagwiingweshiganibakwezhigan')
 
 
+@pytest.mark.execution_timeout(10)
+def test_all_tokenizer_max_steps():
+    with initialize(version_base=None, config_path="../conf/"):
+        config = compose(config_name="prod_config_new", overrides=["tokenization.all_tokenizer_max_steps=10000"])
+        tokenizer = AllTokenizer(config)
+        tokenized_names = list(tokenizer.tokenize('miinibaashkiminasiganibiitoosijiganibadagwiingweshiganibakwezhigan'))
+        assert 0 < len(tokenized_names) <= 10000
+
+
+class LengthNgrams:
+    """Prefers the longer words and the gaps."""
+
+    def word_probability(self, word):
+        return 1 - 0.5 ** (len(word) + 1)
+
+    def bigram_probability(self, word1, word2):
+        return self.word_probability(word2)
+
+
+@mark.parametrize(
+    "overrides",
+    [
+        ([]),
+        (["tokenization.with_gaps=false"]),
+        (["tokenization.skip_one_letter_words=false", "tokenization.add_letters_ias=false"]),
+    ],
+)
+def test_all_tokenizer_k_best(overrides: List[str]):
+    with initialize(version_base=None, config_path="../conf/"):
+        config = compose(config_name="test_config_new", overrides=overrides)
+        tokenizer = AllTokenizer(config, ngrams=LengthNgrams())
+        all_tokenized_names = list(tokenizer.tokenize('yorknewŁyork123'))
+
+        best = list(tokenizer.lattice('yorknewŁyork123').best_paths(tokenizer.ngrams))
+        assert sorted(all_tokenized_names) == sorted(tokenized_name for tokenized_name, _ in best)
+        scores = [score for _, score in best]
+        assert scores == sorted(scores, reverse=True)
+
+        assert list(tokenizer.tokenize_best('yorknewŁyork123', 3)) == [tokenized_name for tokenized_name, _ in best[:3]]
+
+
 @mark.parametrize(
     "overrides",
     [
@@ -0,0 +1,20 @@
+from namegraph.utils.suffix_array import SuffixArray
+from namegraph.utils.top_matches import TopMatches
+
+
+def test_top_matches(tmp_path):
+    names = [f'name{i}' for i in range(50)] + ['żółw', 'fire', 'firefly', 'campfire']
+    suffix_array = SuffixArray.build(names)
+    TopMatches.build(suffix_array, k=3, max_length=2, frequent_patterns=['fire', 'name4', 'water']) \
+        .save(tmp_path / 'top')
+    top_matches = TopMatches.open(tmp_path / 'top')
+
+    assert top_matches.k == 3
+    for pattern in ['n', 'na', '1', 'fire', 'name4']:
+        assert [suffix_array.name(index) for index in top_matches.get(pattern)] == \
+               [name for name in names if pattern in name][:3]
+
+    # the patterns with less than k matches, longer than max_length and not frequent are not stored
+    assert top_matches.get('ż') is None
+    assert top_matches.get('water') is None
+    assert top_matches.get('nam') is None
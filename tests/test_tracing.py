@@ -0,0 +1,63 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from namegraph.filtering.filter import Filter
+from namegraph.generated_name import GeneratedName
+from namegraph.utils.tracing import current_span, propagate_span, span, span_for_thread, start_trace
+
+
+def test_span_is_noop_without_trace():
+    assert current_span() is None
+    with span('normalize') as s:
+        assert s is None
+    assert propagate_span(len) is len
+
+
+def test_span_tree():
+    with start_trace('request') as root:
+        with span('normalize'):
+            pass
+        with span('sample', sorter='weighted-sampling'):
+            current_span().aggregate('iteration', pipeline='a').add(0.001)
+            current_span().aggregate('iteration', pipeline='a').add(0.002)
+            current_span().aggregate('iteration', pipeline='b').add(0.004)
+    assert current_span() is None
+
+    trace = root.to_dict()
+    assert trace['name'] == 'request'
+    assert [child['name'] for child in trace['children']] == ['normalize', 'sample']
+
+    sample = trace['children'][1]
+    assert sample['attributes'] == {'sorter': 'weighted-sampling'}
+    assert [(child['attributes']['pipeline'], child['count'], child['duration_ms'])
+            for child in sample['children']] == [('a', 2, 3.0), ('b', 1, 4.0)]
+
+
+def test_propagate_span():
+    with start_trace('request') as root, ThreadPoolExecutor(2) as executor:
+        def work(category):
+            with span('category', category=category):
+                return current_span().name
+
+        assert list(executor.map(propagate_span(work), ['wordplay', 'alternates'])) == ['category', 'category']
+
+    assert sorted(child['attributes']['category'] for child in root.to_dict()['children']) \
+           == ['alternates', 'wordplay']
+
+
+class ShortFilter(Filter):
+    def filter_name(self, name: str) -> bool:
+        return len(name) < 3
+
+
+def test_filter_span_is_aggregated_under_pipeline_span():
+    with start_trace('request') as root:
+        pipeline_span = root.aggregate('pipeline', pipeline='test')
+        with span_for_thread(pipeline_span):
+            filtered = ShortFilter().apply([GeneratedName(('a',)), GeneratedName(('abcd',))])
+        # the filter runs lazily, after the span of the pipeline is no longer active
+        assert [str(name) for name in filtered] == ['a']
+
+    [filter_span] = root.to_dict()['children'][0]['children']
+    assert filter_span['name'] == 'filter'
+    assert filter_span['attributes'] == {'filter': 'ShortFilter'}
+    assert filter_span['count'] == 1
@@ -235,3 +235,124 @@ def test_person_name_generator(test_test_client):
     str_names = [name['label'] for name in json]
 
     assert "iamchris" in str_names
+
+
+def test_results_cache(test_test_client):
+    client = test_test_client
+    request = {"label": "firecache", "min_suggestions": 20, "max_suggestions": 20}
+
+    hits_before = client.get("/caches").json()['results']['hits']
+    response1 = client.post("/", json=request)
+    response2 = client.post("/", json=request)
+
+    assert response1.status_code == 200
+    assert response2.status_code == 200
+    assert response1.json() == response2.json()
+    assert client.get("/caches").json()['results']['hits'] == hits_before + 1
+
+    response3 = client.post("/", json={**request, "max_suggestions": 10})
+    assert len(response3.json()) <= 10
+    assert client.get("/caches").json()['results']['hits'] == hits_before + 1
+
+
+def test_batch(test_test_client):
+    client = test_test_client
+    labels = ["firebatch", "dogcat", "firebatch"]
+    response = client.post("/batch", json={"labels": labels, "min_suggestions": 10, "max_suggestions": 10})
+
+    assert response.status_code == 200
+
+    json = response.json()
+    assert [result['label'] for result in json['results']] == labels
+    assert json['results'][0]['suggestions'] == json['results'][2]['suggestions']
+
+    single = client.post("/", json={"label": "dogcat", "min_suggestions": 10, "max_suggestions": 10}).json()
+    assert json['results'][1]['suggestions'] == single
+
+
+def test_batch_validation(test_test_client):
+    client = test_test_client
+    assert client.post("/batch", json={"labels": []}).status_code == 422
+    assert client.post("/batch", json={"labels": ["fire.eth"]}).status_code == 422
+
+
+def test_suggestions_by_category_streaming(test_test_client):
+    client = test_test_client
+    request = {"label": "zeusgod"}
+    expected = client.post("/suggestions_by_category", json=request).json()
+
+    response = client.post("/suggestions_by_category", json=request, headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('application/x-ndjson')
+
+    import json
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [event['event'] for event in events[:-1]] == ['category'] * (len(events) - 1)
+    assert events[-1]['event'] == 'end'
+    assert events[-1]['data']['all_tokenizations'] == expected['all_tokenizations']
+
+    streamed = [event['data'] for event in events[:-1]]
+    assert sorted(streamed, key=str) == sorted(expected['categories'], key=str)
+
+    labels = [s['label'] for category in streamed for s in category['suggestions'] if category['type'] != 'related']
+    assert len(labels) == len(set(labels))
+
+
+def test_suggestions_by_category_sse(test_test_client):
+    client = test_test_client
+    response = client.post("/suggestions_by_category", json={"label": "zeusgod"},
+                           headers={"Accept": "text/event-stream"})
+    assert response.status_code == 200
+    assert response.text.startswith('event: ')
+    assert 'event: end\n' in response.text
+
+
+def test_deadline_partial_result(test_test_client):
+    client = test_test_client
+    response = client.post("/", json={"label": "firedeadline", "params": {"deadline_ms": 1}})
+    assert response.status_code == 200
+    assert response.headers.get('X-Partial-Result') == 'true'
+
+    response = client.post("/suggestions_by_category", json={"label": "firedeadline", "params": {"deadline_ms": 1}})
+    assert response.status_code == 200
+    assert response.json()['partial']
+
+    response = client.post("/suggestions_by_category", json={"label": "firedeadline"})
+    assert response.status_code == 200
+    assert not response.json()['partial']
+
+
+def test_metrics(test_test_client):
+    client = test_test_client
+    client.post("/", json={"label": "firemetrics"})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain')
+    assert 'namegraph_preprocessing_seconds_count{stage="normalize"}' in response.text
+    assert 'namegraph_sampling_seconds_bucket' in response.text
+    assert 'namegraph_suggestions_produced_total' in response.text
+
+
+def test_debug_trace(test_test_client):
+    client = test_test_client
+    response = client.post("/suggestions_by_category", json={"label": "firetrace"})
+    assert response.status_code == 200
+    assert response.json()['trace'] is None
+
+    # another label, the results of the previous request are cached
+    response = client.post("/suggestions_by_category", json={"label": "icetrace"},
+                           headers={'X-Debug-Trace': 'true'})
+    assert response.status_code == 200
+    trace = response.json()['trace']
+    assert trace['name'] == 'suggestions_by_category'
+    assert {'normalize', 'classify', 'category', 'convert'} <= {child['name'] for child in trace['children']}
+
+    response = client.post("/", json={"label": "firetrace"}, headers={'X-Debug-Trace': 'true'})
+    assert response.status_code == 200
+    assert response.json()['trace']['name'] == 'generate_names'
+    assert isinstance(response.json()['suggestions'], list)
+
+    response = client.post("/", json={"label": "firetrace"})
+    assert response.status_code == 200
+    assert isinstance(response.json(), list)
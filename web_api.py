@@ -1,23 +1,31 @@
+import asyncio
 import hashlib
 import json
 import logging
 import random
+import threading
 from collections import defaultdict
 from time import perf_counter
 from typing import List, Optional
 
 import numpy as np
-from fastapi import FastAPI
-from fastapi.responses import Response
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from hydra import initialize, compose
 from pydantic_settings import BaseSettings
 
 from namegraph.domains import Domains
+from namegraph.domains_refresher import DomainsRefresher
 from namegraph.generated_name import GeneratedName
 from namegraph.generation.categories_generator import Categories
 from namegraph.normalization.namehash_normalizer import NamehashNormalizer
+from namegraph.pipeline.generator_output_cache import GeneratorOutputCache
+from namegraph.tokenization.wordninja_tokenizer import WordNinjaModel
+from namegraph.thread_utils import BoundedExecutor, ExecutorSaturated, Deadline
 from namegraph.utils.log import LogEntry
+from namegraph.utils.metrics import REGISTRY
+from namegraph.utils.tracing import Span, span, span_for_thread
 from namegraph.xcollections import CollectionMatcherForAPI, OtherCollectionsSampler, CollectionMatcherForGenerator
 from namegraph.xcollections.collection import Collection
 from namegraph.xgenerator import Generator, RelatedSuggestions
@@ -95,9 +103,48 @@ labelhash_normalizer = NamehashNormalizer(generator.config)
 domains = Domains(generator.config)
 categories = Categories(generator.config)
 
+# CPU-bound generation and blocking Elasticsearch calls are run in separate pools,
+# so that neither of them blocks the event loop nor starves the other one
+generation_executor = BoundedExecutor('generation',
+                                      max_workers=generator.config.executors.generation.max_workers,
+                                      max_queue_size=generator.config.executors.generation.max_queue_size)
+elasticsearch_executor = BoundedExecutor('elasticsearch',
+                                         max_workers=generator.config.executors.elasticsearch.max_workers,
+                                         max_queue_size=generator.config.executors.elasticsearch.max_queue_size)
+executors = [generation_executor, elasticsearch_executor]
+
+domains_refresher = DomainsRefresher(generator)
+
+
+@app.exception_handler(ExecutorSaturated)
+async def executor_saturated_handler(request: Request, exc: ExecutorSaturated):
+    logger.warning(f'Request rejected: {exc}')
+    return Response(status_code=503, content='Service Overloaded')
+
+
+@app.on_event('startup')
+def start_domains_refresher():
+    # started in every worker, the app is created before forking (preload)
+    domains_refresher.start()
+
+
+@app.on_event('shutdown')
+def shutdown_executors():
+    domains_refresher.stop()
+    # in-flight requests are finished first, they may still use the internal pools
+    for executor in executors:
+        executor.shutdown(wait=True)
+    generator.shutdown(wait=True)
+    generator_matcher.shutdown(wait=True)
+
 from models import (
+    Params,
+    GroupedParams,
     LabelRequest,
+    BatchLabelRequest,
     Suggestion,
+    TracedSuggestions,
+    BatchSuggestions,
     GroupedSuggestions,
     GroupedLabelRequest,
 )
@@ -182,6 +229,20 @@ def convert_related_to_grouped_suggestions_format(
     return grouped_response
 
 
+def convert_category_to_grouped_suggestions_format(
+        gcat: str,
+        suggestions: list[GeneratedName],
+        include_metadata: bool = True
+) -> dict:
+    converted_suggestions = convert_to_suggestion_format(suggestions, include_metadata=True)
+    return {
+        'suggestions': converted_suggestions if include_metadata else
+        [{k: v for k, v in sug.items() if k != 'metadata'} for sug in converted_suggestions],
+        'type': gcat,
+        'name': category_fancy_names[gcat],
+    }
+
+
 def convert_grouped_to_grouped_suggestions_format(
         related_suggestions: dict[str, RelatedSuggestions],
         grouped_suggestions: dict[str, list[GeneratedName]],
@@ -192,13 +253,8 @@ def convert_grouped_to_grouped_suggestions_format(
         if gcat == 'related':
             grouped_response.extend(convert_related_to_grouped_suggestions_format(related_suggestions,include_metadata))
         elif gcat in grouped_suggestions:
-            converted_suggestions = convert_to_suggestion_format(grouped_suggestions[gcat], include_metadata=True)
-            grouped_response.append({
-                'suggestions': converted_suggestions if include_metadata else
-                [{k: v for k, v in sug.items() if k != 'metadata'} for sug in converted_suggestions],
-                'type': gcat,
-                'name': category_fancy_names[gcat],
-            })
+            grouped_response.append(
+                convert_category_to_grouped_suggestions_format(gcat, grouped_suggestions[gcat], include_metadata))
 
     response = {'categories': grouped_response}
     return response
@@ -262,8 +318,58 @@ def convert_to_grouped_suggestions_format(
 
 # ======== Endpoints for generator API ========
 
-@app.post("/", response_model=list[Suggestion], tags=['generator'])
-async def generate_names(name: LabelRequest):
+def create_deadline(params: Optional[Params | GroupedParams], mode_prefix: str = '') -> Deadline:
+    """
+    The deadline is created when the request arrives, so that the time spent in the queue counts towards it.
+    """
+    params = params.model_dump() if params is not None else dict()
+    params['mode'] = mode_prefix + params.get('mode', 'full')
+    return generator.create_deadline(params)
+
+
+TRACE_HEADER = 'X-Debug-Trace'
+
+
+def create_trace(request: Request, endpoint: str) -> Optional[Span]:
+    """
+    Requests are traced only with the `X-Debug-Trace: true` header. The root span is created when the request
+    arrives, so that the time spent in the queue is visible as the offset of the first span.
+    """
+    if request.headers.get(TRACE_HEADER, '').lower() not in ('1', 'true'):
+        return None
+    return Span(endpoint, {})
+
+
+def finish_trace(trace: Optional[Span]) -> Optional[dict]:
+    if trace is None:
+        return None
+    trace.finish()
+    return trace.to_dict()
+
+
+@app.post("/", response_model=list[Suggestion] | TracedSuggestions, tags=['generator'])
+async def generate_names(name: LabelRequest, request: Request, response: Response):
+    """
+    * if the time budget of the request runs out, the response has the `X-Partial-Result: true` header
+    * with the `X-Debug-Trace: true` header, the suggestions are returned in `suggestions` and the span tree
+      of the request in `trace`
+    """
+    deadline = create_deadline(name.params)
+    trace = create_trace(request, 'generate_names')
+    result = await generation_executor.run(_generate_names, name, deadline, trace)
+    if deadline.exceeded:
+        response.headers['X-Partial-Result'] = 'true'
+    if trace is not None:
+        return {'suggestions': result, 'trace': finish_trace(trace)}
+    return result
+
+
+def _generate_names(name: LabelRequest, deadline: Deadline, trace: Optional[Span] = None):
+    with span_for_thread(trace):
+        return _generate_names_traced(name, deadline)
+
+
+def _generate_names_traced(name: LabelRequest, deadline: Deadline):
     seed_all(name.label)
     log_entry = LogEntry(generator.config)
     logger.debug(f'Request received: {name.label}')
@@ -274,16 +380,80 @@ async def generate_names(name: LabelRequest):
                                       min_suggestions=name.min_suggestions,
                                       max_suggestions=name.max_suggestions,
                                       min_available_fraction=name.min_primary_fraction,
-                                      params=params)
+                                      params=params,
+                                      use_cache=generator.config.caches.results.endpoints.generate_names,
+                                      deadline=deadline)
 
-    response = convert_to_suggestion_format(result, include_metadata=name.metadata)
+    with span('convert'):
+        response = convert_to_suggestion_format(result, include_metadata=name.metadata)
     logger.info(json.dumps(log_entry.create_log_entry(name.model_dump(), result)))
 
     return response
 
 
+@app.post("/batch", response_model=BatchSuggestions, tags=['generator'])
+async def generate_names_batch(request: BatchLabelRequest, http_request: Request):
+    """
+    * generates suggestions for many labels with the same parameters in one request
+    """
+    return await generation_executor.run(_generate_names_batch, request, create_deadline(request.params),
+                                         create_trace(http_request, 'generate_names_batch'))
+
+
+def _generate_names_batch(request: BatchLabelRequest, deadline: Deadline, trace: Optional[Span] = None):
+    with span_for_thread(trace):
+        response = _generate_names_batch_traced(request, deadline)
+    response['trace'] = finish_trace(trace)
+    return response
+
+
+def _generate_names_batch_traced(request: BatchLabelRequest, deadline: Deadline):
+    t_before = perf_counter()
+    logger.debug(f'Request received: {request.labels}')
+    params = request.params.model_dump() if request.params is not None else dict()
+
+    results = generator.generate_names_batch(request.labels,
+                                             sorter=request.sorter,
+                                             min_suggestions=request.min_suggestions,
+                                             max_suggestions=request.max_suggestions,
+                                             min_available_fraction=request.min_primary_fraction,
+                                             params=params,
+                                             use_cache=generator.config.caches.results.endpoints.generate_names,
+                                             deadline=deadline)
+
+    with span('convert'):
+        response = {
+            'results': [
+                {
+                    'label': label,
+                    'suggestions': convert_to_suggestion_format(suggestions, include_metadata=request.metadata),
+                    'processing_time_ms': processing_time,
+                    'partial': partial,
+                }
+                for label, (suggestions, processing_time, partial) in zip(request.labels, results)
+            ],
+            'processing_time_ms': (perf_counter() - t_before) * 1000,
+        }
+
+    logger.info(json.dumps({'endpoint': 'batch', 'request': request.model_dump()}))
+
+    return response
+
+
 @app.post("/grouped_by_category", response_model=GroupedSuggestions, tags=['generator'])
-async def grouped_by_category(name: LabelRequest):
+async def grouped_by_category(name: LabelRequest, request: Request):
+    return await generation_executor.run(_grouped_by_category, name, create_deadline(name.params, 'grouped_'),
+                                         create_trace(request, 'grouped_by_category'))
+
+
+def _grouped_by_category(name: LabelRequest, deadline: Deadline, trace: Optional[Span] = None):
+    with span_for_thread(trace):
+        response = _grouped_by_category_traced(name, deadline)
+    response['trace'] = finish_trace(trace)
+    return response
+
+
+def _grouped_by_category_traced(name: LabelRequest, deadline: Deadline):
     seed_all(name.label)
     log_entry = LogEntry(generator.config)
     logger.debug(f'Request received: {name.label}')
@@ -295,18 +465,78 @@ async def grouped_by_category(name: LabelRequest):
                                       min_suggestions=name.min_suggestions,
                                       max_suggestions=name.max_suggestions,
                                       min_available_fraction=name.min_primary_fraction,
-                                      params=params)
+                                      params=params,
+                                      use_cache=generator.config.caches.results.endpoints.grouped_by_category,
+                                      deadline=deadline)
 
-    response = convert_to_grouped_suggestions_format(result, include_metadata=name.metadata)
+    with span('convert'):
+        response = convert_to_grouped_suggestions_format(result, include_metadata=name.metadata)
     response['all_tokenizations'] = []  # todo: fix if this will be used
+    response['partial'] = deadline.exceeded
 
     logger.info(json.dumps(log_entry.create_log_entry(name.model_dump(), result)))
 
     return response
 
 
+STREAMING_MEDIA_TYPES = ('application/x-ndjson', 'text/event-stream')
+
+
 @app.post("/suggestions_by_category", response_model=GroupedSuggestions, tags=['generator'])
-def suggestions_by_category(name: GroupedLabelRequest):
+async def suggestions_by_category(name: GroupedLabelRequest, request: Request):
+    """
+    * if the `Accept` header is `application/x-ndjson` or `text/event-stream`, the categories are streamed
+      as soon as they are generated, in the order of completion, instead of waiting for the slowest one
+    * every streamed event is a `category` (same format as an item of `categories`),
+      the last event is `end` with `all_tokenizations`, `partial` and `processing_time_ms`
+    * with the `X-Debug-Trace: true` header, the span tree of the request is returned in `trace`
+      (of the response or of the `end` event)
+    """
+    deadline = create_deadline(name.params)
+    trace = create_trace(request, 'suggestions_by_category')
+    accept = request.headers.get('accept', '')
+    media_type = next((media_type for media_type in STREAMING_MEDIA_TYPES if media_type in accept), None)
+    if media_type is None:
+        return await generation_executor.run(_suggestions_by_category, name, deadline, trace)
+
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue[tuple[str, dict] | None] = asyncio.Queue()
+    stopped = threading.Event()
+
+    def emit(event: str, data: dict):
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    # submitted before the response starts, so that a saturated executor still results in 503
+    future = generation_executor.submit(_stream_suggestions_by_category, name, deadline, emit, stopped, trace)
+    future.add_done_callback(lambda _: loop.call_soon_threadsafe(events.put_nowait, None))
+
+    def format_event(event: str, data: dict) -> str:
+        if media_type == 'text/event-stream':
+            return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+        return json.dumps({'event': event, 'data': data}) + '\n'
+
+    async def stream():
+        try:
+            while (item := await events.get()) is not None:
+                yield format_event(*item)
+            if (exc := future.exception()) is not None:
+                logger.error('Streaming suggestions failed', exc_info=exc)
+                yield format_event('error', {'detail': 'Internal Server Error'})
+        finally:
+            # the client may disconnect before all the categories are generated
+            stopped.set()
+
+    return StreamingResponse(stream(), media_type=media_type)
+
+
+def _suggestions_by_category(name: GroupedLabelRequest, deadline: Deadline, trace: Optional[Span] = None):
+    with span_for_thread(trace):
+        response = _suggestions_by_category_traced(name, deadline)
+    response['trace'] = finish_trace(trace)
+    return response
+
+
+def _suggestions_by_category_traced(name: GroupedLabelRequest, deadline: Deadline):
     seed_all(name.label)
     log_entry = LogEntry(generator.config)
     logger.debug(f'Request received: {name.label}')
@@ -320,12 +550,16 @@ def suggestions_by_category(name: GroupedLabelRequest):
         max_recursive_related_collections=name.categories.related.max_recursive_related_collections,
         categories_params=name.categories,
         min_total_suggestions=name.categories.other.min_total_suggestions,
-        params=params
+        params=params,
+        use_cache=generator.config.caches.results.endpoints.suggestions_by_category,
+        deadline=deadline
     )
 
-    response = convert_grouped_to_grouped_suggestions_format(related_suggestions, grouped_suggestions,
-                                                             include_metadata=name.params.metadata)
+    with span('convert'):
+        response = convert_grouped_to_grouped_suggestions_format(related_suggestions, grouped_suggestions,
+                                                                 include_metadata=name.params.metadata)
     response['all_tokenizations'] = all_tokenizations
+    response['partial'] = deadline.exceeded
 
     logger.info(json.dumps(
         log_entry.create_grouped_log_entry(name.model_dump(), {**related_suggestions, **grouped_suggestions})))
@@ -333,6 +567,60 @@ def suggestions_by_category(name: GroupedLabelRequest):
     return response
 
 
+def _stream_suggestions_by_category(name: GroupedLabelRequest, deadline: Deadline, emit, stopped: threading.Event,
+                                    trace: Optional[Span] = None):
+    with span_for_thread(trace):
+        _stream_suggestions_by_category_traced(name, deadline, emit, stopped, trace)
+
+
+def _stream_suggestions_by_category_traced(name: GroupedLabelRequest, deadline: Deadline, emit,
+                                           stopped: threading.Event, trace: Optional[Span]):
+    t_before = perf_counter()
+    seed_all(name.label)
+    log_entry = LogEntry(generator.config)
+    logger.debug(f'Request received: {name.label}')
+    params = name.params.model_dump() if name.params is not None else dict()
+
+    related_suggestions, grouped_suggestions = {}, {}
+    for category, suggestions in generator.generate_grouped_names_stream(
+        name.label,
+        max_related_collections=name.categories.related.max_related_collections,
+        max_labels_per_related_collection=name.categories.related.max_labels_per_related_collection,
+        max_recursive_related_collections=name.categories.related.max_recursive_related_collections,
+        categories_params=name.categories,
+        min_total_suggestions=name.categories.other.min_total_suggestions,
+        params=params,
+        use_cache=generator.config.caches.results.endpoints.suggestions_by_category,
+        deadline=deadline
+    ):
+        if stopped.is_set():
+            logger.info(f'Streaming stopped by the client: {name.label}')
+            return
+
+        if category == 'all_tokenizations':
+            end = {'all_tokenizations': suggestions, 'partial': deadline.exceeded,
+                   'processing_time_ms': (perf_counter() - t_before) * 1000}
+            if trace is not None:
+                end['trace'] = finish_trace(trace)
+            emit('end', end)
+        elif category == 'related':
+            related_suggestions = suggestions
+            with span('convert', category=category):
+                converted = convert_related_to_grouped_suggestions_format(
+                    suggestions, include_metadata=name.params.metadata)
+            for collection_category in converted:
+                emit('category', collection_category)
+        else:
+            grouped_suggestions[category] = suggestions
+            with span('convert', category=category):
+                converted = convert_category_to_grouped_suggestions_format(
+                    category, suggestions, name.params.metadata)
+            emit('category', converted)
+
+    logger.info(json.dumps(
+        log_entry.create_grouped_log_entry(name.model_dump(), {**related_suggestions, **grouped_suggestions})))
+
+
 # ======== Response formatters for collections API ========
 
 def convert_to_collection_format(collections: list[Collection]):
@@ -372,7 +660,8 @@ def convert_related_to_suggestions_from_collection_format(
 
 @app.post("/sample_collection_members", response_model=list[SuggestionFromCollection], tags=['collections'])
 async def sample_collection_members(sample_command: SampleCollectionMembers):
-    result, es_response_metadata = generator_matcher.sample_members_from_collection(
+    result, es_response_metadata = await elasticsearch_executor.run(
+        generator_matcher.sample_members_from_collection,
         sample_command.collection_id,
         sample_command.seed,
         sample_command.max_sample_size
@@ -401,7 +690,8 @@ async def fetch_top_collection_members(fetch_top10_command: Top10CollectionMembe
     """
     * this endpoint returns top 10 members from the collection specified by collection_id
     """
-    result, es_response_metadata = generator_matcher.fetch_top10_members_from_collection(
+    result, es_response_metadata = await elasticsearch_executor.run(
+        generator_matcher.fetch_top10_members_from_collection,
         fetch_top10_command.collection_id, fetch_top10_command.max_recursive_related_collections
     )
 
@@ -429,7 +719,8 @@ async def fetch_top_collection_members(fetch_top10_command: Top10CollectionMembe
 
 @app.post("/scramble_collection_tokens", response_model=list[SuggestionFromCollection], tags=['collections'])
 async def scramble_collection_tokens(scramble_command: ScrambleCollectionTokens):
-    result, es_response_metadata = generator_matcher.scramble_tokens_from_collection(
+    result, es_response_metadata = await elasticsearch_executor.run(
+        generator_matcher.scramble_tokens_from_collection,
         scramble_command.collection_id, scramble_command.method,
         scramble_command.n_top_members, scramble_command.max_suggestions, scramble_command.seed
     )
@@ -463,7 +754,8 @@ async def find_collections_by_string(query: CollectionSearchByString):
         related_collections = []
         es_search_metadata = {'n_total_hits': 0}
     else:
-        related_collections, es_search_metadata = collections_matcher.search_by_string(
+        related_collections, es_search_metadata = await elasticsearch_executor.run(
+            collections_matcher.search_by_string,
             query.query,
             mode=query.mode,
             max_related_collections=query.max_related_collections,
@@ -512,8 +804,8 @@ async def get_collections_count_by_string(query: CollectionCountByStringRequest)
         count = 0
         es_response_metadata = {'n_total_hits': 0}
     else:
-        count, es_response_metadata = collections_matcher.get_collections_count_by_string(query.query,
-                                                                                          mode=query.mode)
+        count, es_response_metadata = await elasticsearch_executor.run(
+            collections_matcher.get_collections_count_by_string, query.query, mode=query.mode)
 
     time_elapsed = (perf_counter() - t_before) * 1000
 
@@ -537,7 +829,8 @@ async def find_collections_by_collection(query: CollectionSearchByCollection):
     if not collections_matcher.active:
         return Response(status_code=503, content='Elasticsearch Unavailable')
 
-    related_collections, es_search_metadata = collections_matcher.search_by_collection(
+    related_collections, es_search_metadata = await elasticsearch_executor.run(
+        collections_matcher.search_by_collection,
         query.collection_id,
         max_related_collections=query.max_related_collections,
         label_diversity_ratio=query.label_diversity_ratio,
@@ -585,7 +878,8 @@ async def get_collections_membership_count(request: CollectionsContainingLabelCo
         count = 0
         es_response_metadata = {'n_total_hits': 0}
     else:
-        count, es_response_metadata = collections_matcher.get_collections_membership_count_for_name(request.label)
+        count, es_response_metadata = await elasticsearch_executor.run(
+            collections_matcher.get_collections_membership_count_for_name, request.label)
 
     time_elapsed = (perf_counter() - t_before) * 1000
 
@@ -610,7 +904,8 @@ async def find_collections_membership_list(request: CollectionsContainingLabelRe
         collections_featuring_label = []
         es_search_metadata = {'n_total_hits': 0}
     else:
-        collections_featuring_label, es_search_metadata = collections_matcher.get_collections_membership_list_for_name(
+        collections_featuring_label, es_search_metadata = await elasticsearch_executor.run(
+            collections_matcher.get_collections_membership_list_for_name,
             request.label,
             limit_names=request.limit_labels,
             sort_order=request.sort_order,
@@ -637,7 +932,8 @@ async def fetch_collection_members(fetch_command: FetchCollectionMembersRequest)
     """
     Fetch members from a collection with pagination support
     """
-    result, es_response_metadata = generator_matcher.fetch_members_from_collection(
+    result, es_response_metadata = await elasticsearch_executor.run(
+        generator_matcher.fetch_members_from_collection,
         fetch_command.collection_id,
         offset=fetch_command.offset,
         limit=fetch_command.limit
@@ -680,7 +976,8 @@ async def get_collection_by_id(request: GetCollectionByIdRequest):
     if not collections_matcher.active:
         return Response(status_code=503, content='Elasticsearch Unavailable')
 
-    collections = collections_matcher.get_collections_by_id_list([request.collection_id])
+    collections = await elasticsearch_executor.run(collections_matcher.get_collections_by_id_list,
+                                                   [request.collection_id])
     
     if not collections:
         return Response(status_code=404, content=f'Collection with id={request.collection_id} not found')
@@ -690,4 +987,49 @@ async def get_collection_by_id(request: GetCollectionByIdRequest):
     return collection
 
 
+# ======== Monitoring endpoints ========
+
+@app.get("/executors", tags=['monitoring'])
+async def executors_stats():
+    """
+    Returns queue depth, wait times, utilization and counters of the thread pools serving the requests.
+    """
+    return [executor.stats() for executor in executors + generator.executors + [generator_matcher.executor]]
+
+
+@app.get("/metrics", tags=['monitoring'], response_class=PlainTextResponse)
+async def metrics():
+    """
+    Returns stage latencies and suggestion counters in the Prometheus text format (per worker process).
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type='text/plain; version=0.0.4')
+
+
+@app.get("/caches", tags=['monitoring'])
+async def caches_stats():
+    """
+    Returns size, hit/miss counters and hit rates of the caches shared between requests.
+    """
+    return {
+        'results': generator.results_cache.stats(),
+        'generator_outputs': GeneratorOutputCache(generator.config).stats(),
+        'tokenizations': WordNinjaModel(generator.config).cache.stats(),
+        'preprocessing': generator.preprocessor.cache.stats(),
+    }
+
+
+@app.get("/domains", tags=['monitoring'])
+async def domains_stats():
+    """
+    Returns the number of names per status and the report of the last reload of the domains (in this worker).
+    """
+    return {
+        'taken': len(domains.taken),
+        'on_sale': len(domains.on_sale),
+        'available': len(domains.available),
+        'snapshot': str(domains.snapshot) if domains.snapshot is not None else None,
+        'last_reload': domains_refresher.last_report,
+    }
+
+
 #TODO gc.freeze() ?